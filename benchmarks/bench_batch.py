@@ -0,0 +1,66 @@
+"""Compare completing many items one request at a time with batch requests.
+
+Usage:
+    python benchmarks/bench_batch.py [--items N] [--latency SECONDS]
+
+Runs against the in-process stub server used by the tests, which delays every
+request by the given latency to stand in for the round trip to a server.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+os.environ['VT_CACHE'] = 'false'
+
+from bench_compression import write_key  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['VT_PRIVATE_KEY'] = write_key(directory)
+
+        from vt import vittlify_request
+        from vt.tests.stub_server import StubServer
+
+        guids = [f'{i:032x}' for i in range(args.items)]
+
+        with StubServer() as stub:
+            stub.latency = args.latency
+            stub.handlers['complete'] = lambda data: {'guid': data['guid']}
+            vittlify_request.VITTLIFY_URL = stub.url
+            vittlify_request.PROXY = None
+
+            print(f'{args.items} items, {args.latency * 1000:.0f} ms latency')
+            for name, capabilities in (('requests', []), ('batch', ['batch'])):
+                stub.capabilities = capabilities
+                stub.requests.clear()
+                vittlify_request._capabilities = None
+
+                start = time.perf_counter()
+                results = vittlify_request.run_bulk_requests(
+                    vittlify_request.complete_item,
+                    vittlify_request.complete_operation,
+                    guids,
+                )
+                elapsed = time.perf_counter() - start
+
+                assert all(result.error is None for result in results)
+                print(
+                    f'{name:>10}: {elapsed:6.3f}s  {len(stub.requests)} HTTP requests'
+                )
+            vittlify_request.close_session()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Compare bytes on the wire and latency with and without gzip over a slow link.
+
+Usage:
+    python benchmarks/bench_compression.py [--items N] [--bandwidth BYTES_PER_SEC]
+
+Runs against the in-process stub server used by the tests, which delays each
+request and response body by its size divided by the bandwidth.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+os.environ['VT_CACHE'] = 'false'
+
+
+def write_key(directory):
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+    filename = os.path.join(directory, 'id_ed25519')
+    with open(filename, 'wb') as f:
+        f.write(
+            Ed25519PrivateKey.generate().private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.OpenSSH,
+                serialization.NoEncryption(),
+            )
+        )
+    return filename
+
+
+def item(i):
+    return {
+        'guid': f'{i:032x}',
+        'name': f'Item number {i}',
+        'comments': 'Some comment text that is long enough to wrap ' * 2,
+        'done': i % 3 == 0,
+        'category_name': 'Produce',
+    }
+
+
+def measure(stub, func):
+    stub.bytes_received = stub.bytes_sent = 0
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    return elapsed, stub.bytes_received, stub.bytes_sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--bandwidth', type=int, default=1024 * 1024)
+    parser.add_argument('--comment-size', type=int, default=64 * 1024)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['VT_PRIVATE_KEY'] = write_key(directory)
+
+        from vt import vittlify_request
+        from vt.tests.stub_server import StubServer
+
+        items = [item(i) for i in range(args.items)]
+        comments = 'A fairly repetitive comment. ' * (args.comment_size // 29)
+
+        with StubServer() as stub:
+            stub.bandwidth = args.bandwidth
+            stub.handlers['list all items'] = lambda data: items
+            stub.handlers['add item'] = lambda data: {'guid': 'guid', 'name': 'name'}
+            vittlify_request.VITTLIFY_URL = stub.url
+            vittlify_request.PROXY = None
+
+            print(
+                f'{args.items} items, {len(comments)} byte comment, '
+                f'{args.bandwidth / 1024:.0f} KiB/s'
+            )
+            for name, compress in (('identity', False), ('gzip', True)):
+                stub.compress_responses = compress
+                vittlify_request.COMPRESS_REQUESTS = compress
+                vittlify_request.ACCEPT_ENCODING = 'gzip' if compress else 'identity'
+                vittlify_request.close_session()
+
+                results = (
+                    (
+                        'list',
+                        measure(
+                            stub,
+                            lambda: list(
+                                vittlify_request.get_all_shopping_list_items(
+                                    'list', stream=True
+                                )
+                            ),
+                        ),
+                    ),
+                    (
+                        'add',
+                        measure(
+                            stub,
+                            lambda: vittlify_request.add_item(
+                                'list', 'item', comments=comments
+                            ),
+                        ),
+                    ),
+                )
+                for command, (elapsed, received, sent) in results:
+                    print(
+                        f'{name:>10} {command:>5}: {elapsed:6.3f}s  '
+                        f'sent {received:>9} B  received {sent:>9} B'
+                    )
+            vittlify_request.close_session()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""Compare rendering a large list the way vt used to vs RowFormatter.
+
+Usage:
+    python benchmarks/bench_render.py [--items N] [--extended] [--repeat N]
+
+The legacy renderer is a copy of the per-row format_row vt used before
+RowFormatter, with the table built by terminaltables. Styling is forced on
+as if writing to an xterm so escape sequences are included in both outputs,
+which are checked to be identical.
+"""
+
+import argparse
+import io
+import os
+import sys
+import textwrap
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from blessings import Terminal  # noqa: E402
+from terminaltables import AsciiTable  # noqa: E402
+
+from vt.render import RowFormatter, stream_table  # noqa: E402
+from vt.utils import term  # noqa: E402
+
+SHOPPING_LIST = {'name': 'Groceries', 'categories': [{'name': 'Produce'}]}
+
+
+def items(count):
+    return [
+        {
+            'guid': f'{i:032x}',
+            'name': f'Item number {i}' + (' with a longer name' * (i % 5)),
+            'comments': 'Some comment text that is long enough to wrap ' * (i % 3),
+            'done': i % 4 == 0,
+            'category_name': 'Produce',
+        }
+        for i in range(count)
+    ]
+
+
+def wrap_text(text, width=70):
+    return '\n'.join(
+        [
+            textwrap.fill(line, width=width, replace_whitespace=False)
+            for line in text.splitlines()
+        ]
+    )
+
+
+def apply_strikethrough(string):
+    return f'{term.dim}{string}{term.normal}'
+
+
+def format_row(
+    item,
+    shopping_list=None,
+    include_comments=False,
+    include_category=False,
+    no_wrap=False,
+    guid_length=8,
+):
+    num_columns = sum([2, include_category, include_comments])
+    wrap_width = (
+        min(int((term.width - 8) / num_columns), 70) if term and term.width else 70
+    )
+    row = []
+
+    comments = item.get('comments')
+    category = item.get('category_name') or 'None'
+
+    if comments or item.get('has_comments'):
+        name = '+ %s' % item['name']
+    else:
+        name = '  %s' % item['name']
+
+    if not no_wrap:
+        name = wrap_text(name, width=wrap_width)
+
+    if item.get('done'):
+        guid = term.blue(apply_strikethrough(item['guid'][:guid_length]))
+        name = term.magenta(apply_strikethrough(name))
+        if comments:
+            comments = apply_strikethrough(comments)
+
+        if category:
+            category = apply_strikethrough(category)
+    else:
+        guid = term.blue(item['guid'][:guid_length])
+        name = term.magenta(name)
+
+    if include_category and shopping_list and shopping_list['categories']:
+        row.extend([guid, category, name])
+    else:
+        row.extend([guid, name])
+
+    if include_comments and comments:
+        if not no_wrap:
+            comments = wrap_text(comments, width=wrap_width)
+        row.append(comments)
+    return row
+
+
+def render_legacy(data, options):
+    rows = [format_row(item, SHOPPING_LIST, **options) for item in data]
+    table = AsciiTable(rows)
+    table.title = term.yellow(SHOPPING_LIST['name'])
+    table.inner_heading_row_border = False
+    return table.table + '\n'
+
+
+def render_engine(data, options):
+    formatter = RowFormatter(SHOPPING_LIST, **options)
+    out = io.StringIO()
+    stream_table(
+        [formatter.format(item) for item in data], title=SHOPPING_LIST['name'], out=out
+    )
+    return out.getvalue()
+
+
+def best_of(func, repeat, *args):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--extended', action='store_true')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    term._terminal = Terminal(kind='xterm-256color', force_styling=True)
+    options = {'include_comments': args.extended, 'include_category': True}
+    data = items(args.items)
+
+    legacy_time, legacy = best_of(render_legacy, args.repeat, data, options)
+    engine_time, engine = best_of(render_engine, args.repeat, data, options)
+
+    if legacy != engine:
+        sys.exit('Rendered tables differ')
+
+    print(f'{args.items} rows, extended={args.extended}')
+    print(f'    legacy: {legacy_time:6.3f}s')
+    print(f'    engine: {engine_time:6.3f}s  ({legacy_time / engine_time:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Compare JSON and MessagePack response size and decode time for large lists.
+
+Usage:
+    python benchmarks/bench_serialization.py [--items N] [--repeat N]
+
+Decodes a synthetic list of items both whole and one item at a time from
+64 KiB chunks, the way streamed responses are read. MessagePack is skipped
+when the msgpack package is not installed.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench_compression import item  # noqa: E402
+
+
+def best_of(repeat, func):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    from vt.json_stream import CHUNK_SIZE
+    from vt.serialization import SERIALIZERS, available, get_serializer
+
+    items = [item(i) for i in range(args.items)]
+
+    print(f'{args.items} items, best of {args.repeat}')
+    for name in SERIALIZERS:
+        if not available(name):
+            print(f'{name:>10}: skipped, {name} is not installed')
+            continue
+
+        serializer = get_serializer(name)
+        body = serializer.dumps(items)
+        chunks = [body[i : i + CHUNK_SIZE] for i in range(0, len(body), CHUNK_SIZE)]
+
+        assert items == serializer.loads(body)
+        whole = best_of(args.repeat, lambda: serializer.loads(body))
+        streamed = best_of(args.repeat, lambda: list(serializer.iter_items(chunks)))
+        print(
+            f'{name:>10}: {len(body):>9} B  decode {whole * 1000:7.2f} ms  '
+            f'streamed {streamed * 1000:7.2f} ms'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Compare the CPU cost of signing every request with authenticating it by HMAC.
+
+Usage:
+    python benchmarks/bench_session_auth.py [--requests N] [--key-size BITS]
+
+Signing uses RSA-PSS/SHA512 like vt.utils.Signer. Session authentication
+signs one handshake and then computes an HMAC-SHA256 per request.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cryptography.hazmat.primitives import hashes  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import padding, rsa  # noqa: E402
+
+from vt.session_auth import Handshake  # noqa: E402
+
+
+def messages(count):
+    for i in range(count):
+        yield json.dumps(
+            {'endpoint': 'complete', 'guid': f'{i:032x}', 'username': 'user'}
+        ).encode('utf-8')
+
+
+def rsa_sign(key, message):
+    return key.sign(
+        message,
+        padding.PSS(
+            mgf=padding.MGF1(hashes.SHA512()), salt_length=padding.PSS.MAX_LENGTH
+        ),
+        hashes.SHA512(),
+    )
+
+
+def run_signatures(key, count):
+    for message in messages(count):
+        rsa_sign(key, message)
+
+
+def run_session(key, count):
+    client, server = Handshake(), Handshake()
+    rsa_sign(key, client.public_key.encode('utf-8'))
+    session = client.complete(
+        {'session': 'session', 'public_key': server.public_key, 'expires_in': 300}
+    )
+    for message in messages(count):
+        session.authenticate(message)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--key-size', type=int, default=4096)
+    args = parser.parse_args()
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=args.key_size)
+
+    print(f'{args.requests} requests, RSA-{args.key_size}')
+    for name, func in (('signature', run_signatures), ('session', run_session)):
+        start = time.process_time()
+        func(key, args.requests)
+        elapsed = time.process_time() - start
+        print(
+            f'{name:>10}: {elapsed * 1000:8.1f} ms CPU  '
+            f'{elapsed / args.requests * 1e6:8.1f} us per request'
+        )
+
+
+if __name__ == '__main__':
+    main()
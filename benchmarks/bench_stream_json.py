@@ -0,0 +1,82 @@
+"""Compare peak memory of decoding a large item response whole vs streamed.
+
+Usage:
+    python benchmarks/bench_stream_json.py [--items N] [--chunk-size BYTES]
+
+Both runs write every item as NDJSON to /dev/null, which is what
+`vt list --format ndjson` does with VT_STREAM_RESPONSES unset and set.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from vt.json_stream import CHUNK_SIZE, iter_json_array  # noqa: E402
+from vt.output import ITEM_FIELDS, write_objects  # noqa: E402
+
+
+def item(i):
+    return {
+        'guid': f'{i:032x}',
+        'name': f'Item number {i}',
+        'comments': 'Some comment text that is long enough to wrap ' * 2,
+        'done': i % 3 == 0,
+        'category_name': 'Produce',
+    }
+
+
+def response_chunks(count, chunk_size):
+    # Generate the body as the server would send it without ever holding all
+    # of it, like requests' iter_content.
+    buffer = bytearray(b'[')
+    for i in range(count):
+        if i:
+            buffer += b', '
+        buffer += json.dumps(item(i)).encode('utf-8')
+        while len(buffer) >= chunk_size:
+            yield bytes(buffer[:chunk_size])
+            del buffer[:chunk_size]
+    buffer += b']'
+    yield bytes(buffer)
+
+
+def decode_whole(count, chunk_size, out):
+    body = b''.join(response_chunks(count, chunk_size))
+    write_objects(json.loads(body), 'ndjson', ITEM_FIELDS, out=out)
+
+
+def decode_streamed(count, chunk_size, out):
+    items = iter_json_array(response_chunks(count, chunk_size))
+    write_objects(items, 'ndjson', ITEM_FIELDS, out=out)
+
+
+def measure(func, count, chunk_size):
+    with open(os.devnull, 'w') as out:
+        tracemalloc.start()
+        start = time.perf_counter()
+        func(count, chunk_size, out)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    print(f'{args.items} items, {args.chunk_size} byte chunks')
+    for name, func in (('whole', decode_whole), ('streamed', decode_streamed)):
+        elapsed, peak = measure(func, args.items, args.chunk_size)
+        print(f'{name:>10}: {elapsed:6.2f}s  peak {peak / 1024 / 1024:8.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Measure the cost of timing spans when timings are disabled and enabled.
+
+Usage:
+    python benchmarks/bench_timings.py [--calls N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from vt import timings  # noqa: E402
+
+
+def bare(calls):
+    for _ in range(calls):
+        pass
+
+
+def spans(calls):
+    for _ in range(calls):
+        with timings.span('phase', endpoint='list'):
+            pass
+
+
+def measure(func, calls):
+    start = time.perf_counter()
+    func(calls)
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=1000000)
+    args = parser.parse_args()
+
+    baseline = measure(bare, args.calls)
+    disabled = measure(spans, args.calls)
+    timings.enable()
+    enabled = measure(spans, args.calls)
+
+    print(f'{args.calls} spans')
+    print(f'{"disabled":>10}: {disabled - baseline:8.1f} ns per span')
+    print(f'{"enabled":>10}: {enabled - baseline:8.1f} ns per span')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Compare encoding a large batch request in the version 1 and 2 wire formats.
+
+Usage:
+    python benchmarks/bench_wire.py [--items N] [--repeat N]
+
+Times building and signing the request body on the client, including the JSON
+encoding requests does for version 1 payloads, and reports the body size.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+os.environ['VT_CACHE'] = 'false'
+
+from bench_compression import write_key  # noqa: E402
+
+
+def encode(vittlify_request, data):
+    body = vittlify_request._encode('POST', dict(data), {})
+    if 'json' in body:
+        return json.dumps(body['json']).encode('utf-8')
+    return body['data']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['VT_PRIVATE_KEY'] = write_key(directory)
+
+        from vt import vittlify_request
+
+        vittlify_request.COMPRESS_REQUESTS = False
+        operations = [
+            vittlify_request.modify_operation(f'{i:032x}', 'A "quoted" comment ' * 4)
+            for i in range(args.items)
+        ]
+        data = {
+            'endpoint': 'batch',
+            'operations': [
+                {'method': operation.method, 'data': operation.data}
+                for operation in operations
+            ],
+        }
+
+        print(f'{args.items} operations, best of {args.repeat}')
+        for wire_format in ('v1', 'v2'):
+            vittlify_request.WIRE_FORMAT = wire_format
+            best = float('inf')
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                body = encode(vittlify_request, data)
+                best = min(best, time.perf_counter() - start)
+            print(f'{wire_format:>10}: {best * 1000:7.2f} ms  {len(body):>9} B')
+
+
+if __name__ == '__main__':
+    main()
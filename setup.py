@@ -27,7 +27,11 @@ setup(
         'terminaltables',
         'cryptography',
         'colorclass',
+        'appdirs',
     ],
+    extras_require={
+        'msgpack': ['msgpack'],
+    },
     test_suite='nose.collector',
     tests_require=[
         'nose',
@@ -0,0 +1,100 @@
+import io
+import shlex
+import sys
+import threading
+
+from .bulk import iter_bulk
+from .utils import term
+
+
+class ThreadLocalStdout:
+    """Send writes to a buffer owned by the current thread when it has one.
+
+    Concurrent batch commands print as usual while their output is still
+    emitted one command at a time.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+
+    def capture(self):
+        self._local.buffer = io.StringIO()
+
+    def release(self):
+        buffer = getattr(self._local, 'buffer', None)
+        self._local.buffer = None
+        return buffer.getvalue() if buffer is not None else ''
+
+    def _target(self):
+        buffer = getattr(self._local, 'buffer', None)
+        return buffer if buffer is not None else self.stream
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    def __getattr__(self, attr):
+        return getattr(self.stream, attr)
+
+
+def read_commands(lines):
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield number, line
+
+
+def run_command(run, line):
+    try:
+        run(shlex.split(line))
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        return 1
+    except Exception as e:
+        print(term.red(f'{e}'))
+        return 1
+    return 0
+
+
+def run_batch(run, lines, jobs=1):
+    """Run each command in lines through run and return the number that failed.
+
+    With more than one job, commands run concurrently and the output of each
+    is held back until every earlier command has been written.
+    """
+    failures = 0
+    stdout = None
+
+    if jobs > 1:
+        stdout = sys.stdout = ThreadLocalStdout(sys.stdout)
+
+    def execute(command):
+        if stdout is None:
+            return run_command(run, command[1]), ''
+
+        stdout.capture()
+        try:
+            return run_command(run, command[1]), stdout.release()
+        except BaseException:
+            stdout.release()
+            raise
+
+    try:
+        for result in iter_bulk(execute, read_commands(lines), max_workers=jobs):
+            number, line = result.target
+            status, output = result.value
+
+            if output:
+                sys.stdout.write(output)
+            if status:
+                failures += 1
+                print(term.red(f'Line {number} failed: {line}'))
+            sys.stdout.flush()
+    finally:
+        if stdout is not None:
+            sys.stdout = stdout.stream
+    return failures
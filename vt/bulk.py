@@ -0,0 +1,47 @@
+import contextvars
+import os
+from collections import namedtuple
+
+MAX_WORKERS = int(os.environ.get('VT_MAX_WORKERS') or 4)
+
+BulkResult = namedtuple('BulkResult', ['target', 'value', 'error'])
+
+
+def _call(func, target):
+    try:
+        return BulkResult(target, func(target), None)
+    except Exception as e:
+        return BulkResult(target, None, e)
+
+
+def iter_bulk(func, targets, max_workers=None):
+    max_workers = max_workers or MAX_WORKERS
+
+    if max_workers <= 1:
+        for target in targets:
+            yield _call(func, target)
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    # Each target runs in a copy of the caller's context so worker threads see
+    # the same command deadline as the caller.
+    calls = ((contextvars.copy_context(), target) for target in targets)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Executor.map yields results in the order targets were submitted
+        yield from executor.map(lambda call: call[0].run(_call, func, call[1]), calls)
+
+
+def run_bulk(func, targets, max_workers=None):
+    max_workers = max(1, min(max_workers or MAX_WORKERS, len(targets)))
+    return list(iter_bulk(func, targets, max_workers=max_workers))
+
+
+def run_concurrently(*funcs):
+    results = run_bulk(lambda func: func(), list(funcs), max_workers=len(funcs))
+
+    for result in results:
+        if result.error is not None:
+            raise result.error
+    return [result.value for result in results]
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+CACHE_ENABLED = os.environ.get('VT_CACHE', 'true').lower() == 'true'
+
+# Seconds a cached response is used without asking the server. Once expired the
+# entry is revalidated with If-None-Match when the server provided an ETag.
+CACHE_TTLS = {
+    'list': 3600,
+    'all lists': 300,
+    'list items': 30,
+    'list all items': 30,
+    'completed': 30,
+    'item': 30,
+    'capabilities': 3600,
+}
+
+# Endpoints whose cached responses may change after each kind of mutation.
+# Item mutations do not say which list the item belongs to so every cached
+# list view is dropped. Added items are not done yet so they only change the
+# views of lists.
+ITEM_VIEWS = ('list items', 'list all items', 'completed')
+MUTATION_INVALIDATES = {
+    'add item': ('list items', 'list all items'),
+    'complete': ITEM_VIEWS,
+    'uncomplete': ITEM_VIEWS,
+    'modify': ITEM_VIEWS,
+    'move': ITEM_VIEWS,
+    'categorize': ITEM_VIEWS,
+}
+
+
+# Fields a projected response can leave out because another field it includes
+# implies them.
+IMPLIED_FIELDS = {'has_comments': 'comments'}
+
+
+def covers(cached_fields, fields):
+    """Return whether a response projected to cached_fields has all of fields.
+
+    None stands for whole objects.
+    """
+    if cached_fields is None:
+        return True
+    if fields is None:
+        return False
+
+    cached_fields = set(cached_fields)
+    return all(
+        field in cached_fields or IMPLIED_FIELDS.get(field) in cached_fields
+        for field in fields
+    )
+
+
+def get_cache_dir():
+    directory = os.environ.get('VT_CACHE_DIR')
+    if not directory:
+        import appdirs
+
+        directory = appdirs.user_cache_dir('vt')
+    return directory
+
+
+def slug(value):
+    return hashlib.sha256(str(value).encode('utf-8')).hexdigest()[:32]
+
+
+def write_atomic(path, content):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    # Write to a temporary file in the same directory and rename it over the
+    # target so concurrent readers only ever see complete files.
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ResponseCache:
+    def __init__(self, directory, namespace=''):
+        self.directory = os.path.join(directory, 'responses', slug(namespace))
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(data):
+        endpoint = data.get('endpoint')
+        if endpoint not in CACHE_TTLS:
+            return None
+
+        # Individual pages are not cached since mutations could not reliably
+        # invalidate every page they shift.
+        if any(key in data for key in ('page', 'page_size', 'cursor')):
+            return None
+        return (endpoint, data.get('guid') or '')
+
+    def _endpoint_dir(self, endpoint):
+        return os.path.join(self.directory, slug(endpoint))
+
+    def _path(self, key):
+        endpoint, guid = key
+        return os.path.join(self._endpoint_dir(endpoint), f'{slug(guid)}.json')
+
+    def _invalidated_at(self, endpoint):
+        try:
+            with open(os.path.join(self._endpoint_dir(endpoint), 'invalidated')) as f:
+                return float(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def get(self, key, fields=None):
+        with self._lock:
+            entry = self._memory.get(key)
+
+        if entry is None:
+            try:
+                with open(self._path(key)) as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                return None
+
+        # Responses requested before another process invalidated the endpoint
+        # may already be stale.
+        if entry['requested'] < self._invalidated_at(key[0]):
+            return None
+        # A response projected to fewer fields than requested cannot be used
+        if not covers(entry.get('fields'), fields):
+            return None
+
+        with self._lock:
+            self._memory[key] = entry
+        return entry
+
+    def is_fresh(self, key, entry):
+        return time.time() - entry['requested'] < CACHE_TTLS[key[0]]
+
+    def set(self, key, body, etag=None, requested=None, fields=None):
+        entry = {
+            'requested': requested if requested is not None else time.time(),
+            'etag': etag,
+            'body': body,
+            'fields': fields,
+        }
+
+        with self._lock:
+            self._memory[key] = entry
+        try:
+            write_atomic(self._path(key), json.dumps(entry))
+        except OSError:
+            pass
+        return entry
+
+    def refresh(self, key, entry, requested):
+        return self.set(
+            key,
+            entry['body'],
+            etag=entry['etag'],
+            requested=requested,
+            fields=entry.get('fields'),
+        )
+
+    def invalidate(self, key):
+        with self._lock:
+            self._memory.pop(key, None)
+        try:
+            os.unlink(self._path(key))
+        except OSError:
+            pass
+
+    def invalidate_endpoint(self, endpoint):
+        with self._lock:
+            for key in [key for key in self._memory if key[0] == endpoint]:
+                del self._memory[key]
+        try:
+            write_atomic(
+                os.path.join(self._endpoint_dir(endpoint), 'invalidated'),
+                repr(time.time()),
+            )
+        except OSError:
+            pass
+
+    def invalidate_mutation(self, data):
+        endpoint = data.get('endpoint')
+        guid = data.get('guid')
+
+        if endpoint in MUTATION_INVALIDATES:
+            self.invalidate(('item', guid))
+            for view in MUTATION_INVALIDATES[endpoint]:
+                self.invalidate_endpoint(view)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        for endpoint in CACHE_TTLS:
+            self.invalidate_endpoint(endpoint)
@@ -0,0 +1,158 @@
+import bisect
+import json
+import os
+import re
+import threading
+import time
+
+from .cache import get_cache_dir, slug, write_atomic
+from .utils import VittlifyError
+from .vittlify_request import USERNAME, VITTLIFY_URL
+
+MIN_GUID_LENGTH = 8
+# Shorter arguments, or ones with other characters, are names rather than
+# GUID prefixes and are passed through unchanged.
+GUID_PREFIX = re.compile(rf'[0-9a-f-]{{{MIN_GUID_LENGTH},}}', re.IGNORECASE)
+
+# GUIDs not shown for this many seconds are forgotten, so deleted items stop
+# lengthening the abbreviations, and at most MAX_GUIDS of the most recently
+# shown are kept. When a GUID was last shown is only updated once a day.
+GUID_TTL = 30 * 24 * 3600
+GUID_REFRESH = 24 * 3600
+MAX_GUIDS = 10000
+
+
+class GuidIndex:
+    def __init__(self, path):
+        self.path = path
+        self._seen = None
+        self._guids = None
+        self._abbrev_length = None
+        self._lock = threading.Lock()
+
+    def _read(self):
+        # Maps each GUID to when it was last shown
+        try:
+            with open(self.path) as f:
+                seen = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        if isinstance(seen, list):
+            # Written before GUIDs expired
+            now = time.time()
+            return {guid: now for guid in seen if isinstance(guid, str)}
+        if not isinstance(seen, dict):
+            return {}
+        return {
+            guid: when for guid, when in seen.items() if isinstance(when, (int, float))
+        }
+
+    def _sorted_guids(self):
+        if self._guids is None:
+            self._seen = self._read()
+            self._guids = sorted(self._seen)
+        return self._guids
+
+    def remember(self, guids):
+        new = {guid.lower() for guid in guids if isinstance(guid, str) and guid}
+        now = time.time()
+
+        with self._lock:
+            self._sorted_guids()
+            if all(self._seen.get(guid, 0) > now - GUID_REFRESH for guid in new):
+                return
+
+            # Merge with the file in case another vt process has added guids
+            # since it was loaded.
+            merged = self._read()
+            for guid, seen in self._seen.items():
+                merged[guid] = max(merged.get(guid, 0), seen)
+            merged.update(dict.fromkeys(new, now))
+
+            recent = sorted(
+                (guid for guid, seen in merged.items() if seen > now - GUID_TTL),
+                key=merged.get,
+                reverse=True,
+            )[:MAX_GUIDS]
+            self._seen = {guid: merged[guid] for guid in recent}
+            self._guids = sorted(self._seen)
+            self._abbrev_length = None
+            data = json.dumps(self._seen)
+
+        try:
+            write_atomic(self.path, data)
+        except OSError:
+            pass
+
+    def matches(self, prefix):
+        prefix = prefix.lower()
+
+        with self._lock:
+            guids = self._sorted_guids()
+            start = bisect.bisect_left(guids, prefix)
+
+            matches = []
+            for guid in guids[start:]:
+                if not guid.startswith(prefix):
+                    break
+                matches.append(guid)
+        return matches
+
+    def resolve(self, prefix):
+        matches = self.matches(prefix)
+
+        if len(matches) == 1:
+            return matches[0]
+
+        if len(matches) > 1 and prefix.lower() not in matches:
+            raise VittlifyError(
+                f'GUID prefix {prefix} is ambiguous. It matches {", ".join(matches)}'
+            )
+        return prefix
+
+    def abbrev_length(self):
+        with self._lock:
+            if self._abbrev_length is None:
+                guids = self._sorted_guids()
+
+                # Like git's abbreviated hashes, use just enough characters to
+                # distinguish each guid from its sorted neighbours.
+                length = MIN_GUID_LENGTH
+                for previous, current in zip(guids, guids[1:]):
+                    common = os.path.commonprefix([previous, current])
+                    length = max(length, len(common) + 1)
+                self._abbrev_length = length
+        return self._abbrev_length
+
+
+_guid_index = None
+_guid_index_lock = threading.Lock()
+
+
+def get_guid_index():
+    global _guid_index
+
+    with _guid_index_lock:
+        if _guid_index is None:
+            path = os.path.join(
+                get_cache_dir(), 'guids', f'{slug(f"{VITTLIFY_URL}|{USERNAME}")}.json'
+            )
+            _guid_index = GuidIndex(path)
+    return _guid_index
+
+
+def remember_guids(objects):
+    index = get_guid_index()
+    index.remember(obj.get('guid') for obj in objects)
+    return index.abbrev_length()
+
+
+def guid_abbrev_length():
+    return get_guid_index().abbrev_length()
+
+
+def resolve_guid(prefix):
+    if not prefix or not GUID_PREFIX.fullmatch(prefix):
+        return prefix
+    return get_guid_index().resolve(prefix)
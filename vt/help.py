@@ -21,15 +21,22 @@ Commands:
     categories  Return a list of valid categories for a given list
     categorize  Provide a category for a given item
     label       Alias for categorize
-    help        Get help on a command
+    batch       Run commands read from a file or stdin
+    shell       Start an interactive vt session
+    help        Get help on a command, or on settings with vt help settings
+
+GUIDs may be abbreviated to any unique prefix of 8 or more characters.
 '''
 
 LISTS_HELP = '''
 Usage:
-    vt lists
+    vt lists [options]
 
 Description:
     Return all lists
+
+Options:
+    --format FORMAT     Write json, ndjson or tsv instead of a table.
 '''
 
 LIST_HELP = '''
@@ -39,7 +46,8 @@ Usage:
 Description:
     Return all items of a specified list. GUID may be either the unique identifier of
     a list or the name of the list if it is unique. If no GUID is provided, use the
-    default list defined in the VT_DEFAULT_LIST environment variable.
+    default list defined in the VT_DEFAULT_LIST environment variable. Comments and
+    categories are only downloaded when --extended and --categories show them.
 
 Options:
     -e, --extended      Show extended information about items.
@@ -47,6 +55,9 @@ Options:
     -c, --categories    Include item categories in output.
     -q, --quiet         Quiet mode. Remove any extraneous output.
     -W, --no-wrap       Do not apply any text wrapping to output.
+    --format FORMAT     Write json, ndjson or tsv instead of a table.
+    --limit N           Show at most N items.
+    --page N            Show the Nth page of items, --limit items per page.
 '''
 
 DONE_HELP = '''
@@ -56,6 +67,13 @@ Usage:
 
 Description:
     Mark an item done. When run without a GUID, display all recently completed items.
+    Multiple GUIDs are sent in batches of up to VT_BATCH_SIZE when the server supports
+    batch requests, or updated concurrently, up to VT_MAX_WORKERS at a time.
+
+Options:
+    --format FORMAT     Write json, ndjson or tsv instead of a table.
+    --limit N           Show at most N items.
+    --page N            Show the Nth page of items, --limit items per page.
 '''
 
 UNDONE_HELP = '''
@@ -65,6 +83,8 @@ Usage:
 
 Description:
     Mark an item undone. When run without a GUID, display all recently completed items.
+    Multiple GUIDs are sent in batches of up to VT_BATCH_SIZE when the server supports
+    batch requests, or updated concurrently, up to VT_MAX_WORKERS at a time.
 '''
 
 COMMENT_HELP = '''
@@ -93,27 +113,93 @@ Description:
 
 MOVE_HELP = '''
 Usage:
-    vt move ITEM LIST
-    vt mv ITEM LIST
+    vt move ITEM [ITEM ...] LIST
+    vt mv ITEM [ITEM ...] LIST
 
 Description:
     Move item to a new list where ITEM is the guid of the item and LIST is the guid of the new list.
+    Multiple items are sent in batches of up to VT_BATCH_SIZE when the server supports
+    batch requests, or moved concurrently, up to VT_MAX_WORKERS at a time.
 '''
 
 CATEGORIES_HELP = '''
 Usage:
-    vt categories [GUID]
+    vt categories [GUID] [options]
 
 Description:
     Display the available categories for a list. GUID is the unique identifier for a list.
     When GUID is not provided, use the default list defined in VT_DEFAULT_LIST environment variable.
+
+Options:
+    --format FORMAT     Write json, ndjson or tsv instead of a table.
 '''
 
 CATEGORIZE_HELP = '''
 Usage:
-    vt categorize GUID CATEGORY
-    vt label GUID CATEGORY
+    vt categorize GUID [GUID ...] CATEGORY
+    vt label GUID [GUID ...] CATEGORY
+
+Description:
+    Assign CATEGORY to the items specified by GUID.
+'''
+
+BATCH_HELP = '''
+Usage:
+    vt batch [FILE] [options]
 
 Description:
-    Assign CATEGORY to the item specified by GUID.
+    Run one vt command per line of FILE, or of stdin when FILE is not provided, in a
+    single process. Blank lines and lines starting with # are ignored. A failing line
+    is reported and the remaining lines still run.
+
+Options:
+    --jobs N            Run up to N lines concurrently. Output is still written in order.
+'''
+
+SHELL_HELP = '''
+Usage:
+    vt shell
+
+Description:
+    Start an interactive session that runs vt commands without the vt prefix. The signing
+    key, server connections and cached responses are reused between commands, and the
+    time taken by each command is shown after its output. Press tab to complete command
+    names, list names and GUID prefixes. Type exit or press Ctrl-D to leave.
+'''
+
+SETTINGS_HELP = '''
+Usage:
+    vt help settings
+
+Description:
+    GUID prefixes are matched against the GUIDs vt has displayed in the last 30 days.
+
+    Output is written without colors when stdout is not a terminal, or when --plain is
+    given or VT_PLAIN=true is set. Set VT_PLAIN=false to keep colors when piping.
+
+    Requests that fail to connect, time out or find the server unavailable are retried
+    up to VT_MAX_RETRIES times. Changes such as adding or completing items are only
+    retried after failing to connect, unless the server supports idempotency keys. A
+    command gives up once VT_COMMAND_DEADLINE seconds have passed.
+
+    Set VT_AUTH_MODE=session to sign a single handshake with the private key and
+    authenticate later requests with a short-lived session secret instead. Sessions
+    are kept in the cache directory until they expire.
+
+    Requests are signed over a hash of the body when the server supports it. Support
+    is checked in the background and cached for an hour, so requests are sent as the
+    older signed payloads until it is known. With VT_CACHE=false it is checked before
+    the first request instead. Set VT_WIRE_FORMAT=v1 to always send the older
+    payloads, or v2 to skip asking.
+
+    Responses are decoded from MessagePack when the msgpack package is installed and
+    the server supports it. Set VT_SERIALIZATION=json to always ask for JSON.
+
+    Add --timings to a command to print how long each phase took to stderr, or set
+    VT_TRACE to a file to append the same timings to it as JSON lines.
+
+    Add --profile cpu or --profile mem, or set VT_PROFILE, to profile a command. cpu
+    writes a pstats file and mem writes the top allocation sites of fetching,
+    decoding, formatting and rendering. Profiles are written to VT_PROFILE_DIR, or the
+    current directory.
 '''
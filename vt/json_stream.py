@@ -0,0 +1,104 @@
+import codecs
+import json
+
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+_DELIMITERS = _WHITESPACE + ',]'
+
+
+class _Reader:
+    def __init__(self, chunks, encoding):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def read_more(self):
+        # Drop consumed text so the buffer only ever holds about one chunk
+        # plus the element currently being decoded.
+        self.buffer = self.buffer[self.pos :]
+        self.pos = 0
+
+        for chunk in self.chunks:
+            text = self.decoder.decode(chunk)
+            if text:
+                self.buffer += text
+                return True
+
+        if not self.eof:
+            self.eof = True
+            self.buffer += self.decoder.decode(b'', final=True)
+            return True
+        return False
+
+    def skip(self, chars=_WHITESPACE):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in chars:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self.read_more():
+                return
+
+    def peek(self):
+        self.skip()
+        return self.buffer[self.pos] if self.pos < len(self.buffer) else ''
+
+    def read_rest(self):
+        while self.read_more():
+            pass
+        return self.buffer[self.pos :]
+
+
+def iter_json_array(chunks, encoding='utf-8'):
+    """Yield the elements of a JSON array read from an iterable of byte chunks.
+
+    Only the element being decoded is held in memory. A body that is not an
+    array is decoded whole and yielded as a single value.
+    """
+    reader = _Reader(chunks, encoding)
+
+    if reader.peek() != '[':
+        yield json.loads(reader.read_rest())
+        return
+    reader.pos += 1
+
+    if reader.peek() == ']':
+        reader.pos += 1
+    else:
+        while True:
+            reader.skip()
+            try:
+                value, end = _decoder.raw_decode(reader.buffer, reader.pos)
+            except json.JSONDecodeError:
+                value, end = None, None
+
+            # Numbers and literals are only complete once the character after
+            # them has arrived, e.g. "4." may be the start of "4.5".
+            complete = end is not None and (
+                reader.eof
+                or reader.buffer[reader.pos] in '{["'
+                or (end < len(reader.buffer) and reader.buffer[end] in _DELIMITERS)
+            )
+            if not complete:
+                if not reader.read_more():
+                    raise json.JSONDecodeError(
+                        'Unterminated array', reader.buffer, reader.pos
+                    )
+                continue
+
+            reader.pos = end
+            yield value
+
+            separator = reader.peek()
+            reader.pos += 1
+            if separator == ']':
+                break
+            if separator != ',':
+                raise json.JSONDecodeError(
+                    "Expecting ',' delimiter", reader.buffer, reader.pos - 1
+                )
+
+    if reader.peek():
+        raise json.JSONDecodeError('Extra data', reader.buffer, reader.pos)
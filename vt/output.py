@@ -0,0 +1,58 @@
+import csv
+import json
+import sys
+
+from . import timings
+from .utils import VittlifyError
+
+FORMATS = ('json', 'ndjson', 'tsv')
+
+ITEM_FIELDS = ('guid', 'name', 'done', 'category_name', 'comments')
+LIST_FIELDS = ('guid', 'name')
+CATEGORY_FIELDS = ('name',)
+
+
+def validate_format(output_format):
+    if output_format not in FORMATS:
+        raise VittlifyError(
+            f'Unknown format {output_format}. Expected one of {", ".join(FORMATS)}'
+        )
+    return output_format
+
+
+def write_objects(objects, output_format, fields, out=None):
+    out = out or sys.stdout
+
+    with timings.span('render', format=output_format):
+        if output_format == 'json':
+            out.write(json.dumps(list(objects)))
+            out.write('\n')
+        elif output_format == 'ndjson':
+            for obj in objects:
+                out.write(json.dumps(obj))
+                out.write('\n')
+        elif output_format == 'tsv':
+            writer = csv.writer(out, delimiter='\t', lineterminator='\n')
+            writer.writerow(fields)
+            for obj in objects:
+                writer.writerow(
+                    [
+                        '' if obj.get(field) is None else obj.get(field)
+                        for field in fields
+                    ]
+                )
+        else:
+            validate_format(output_format)
+
+        out.flush()
+
+
+def write_object(obj, output_format, fields, out=None):
+    out = out or sys.stdout
+
+    if output_format == 'json':
+        out.write(json.dumps(obj))
+        out.write('\n')
+        out.flush()
+    else:
+        write_objects([obj], output_format, fields, out=out)
@@ -0,0 +1,142 @@
+"""CPU and memory profiling of a single vt command.
+
+With VT_PROFILE=cpu, or --profile cpu, the command runs under cProfile and
+the stats are written to a pstats file. With mem, tracemalloc snapshots are
+taken around the fetch, decode, format and render phases recorded by
+vt.timings. The report lists the top allocation sites of each phase and of
+the whole command.
+"""
+
+import os
+import sys
+
+from . import timings
+from .utils import VittlifyError
+
+PROFILE = os.environ.get('VT_PROFILE')
+PROFILE_DIR = os.environ.get('VT_PROFILE_DIR') or '.'
+MODES = ('cpu', 'mem')
+
+MEMORY_PHASES = ('fetch', 'decode', 'format', 'render')
+TOP_ALLOCATIONS = int(os.environ.get('VT_PROFILE_TOP') or 10)
+
+
+def profile_args(args):
+    """Return the profiling mode and args with any --profile option removed."""
+    mode = PROFILE
+    remaining = []
+    args = iter(args)
+    for arg in args:
+        if arg == '--profile':
+            mode = next(args, None)
+        elif arg.startswith('--profile='):
+            mode = arg.split('=', 1)[1]
+        else:
+            remaining.append(arg)
+
+    if mode is not None:
+        mode = mode.lower()
+        if mode not in MODES:
+            raise VittlifyError(
+                f'Unknown profile {mode}. Expected one of {", ".join(MODES)}'
+            )
+    return mode, remaining
+
+
+def profile_path(command, extension):
+    return os.path.join(PROFILE_DIR, f'vt-{command}-{os.getpid()}.{extension}')
+
+
+def _take_snapshot():
+    import tracemalloc
+
+    # Leave out the profiler's own allocations and modules being imported
+    return tracemalloc.take_snapshot().filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        )
+    )
+
+
+def _format_size(size):
+    return f'{size / 1024:.1f} KiB'
+
+
+class MemoryProfiler:
+    """Take a tracemalloc snapshot at the start and end of profiled phases."""
+
+    def __init__(self, top=TOP_ALLOCATIONS):
+        self.top = top
+        self.phases = []
+
+    def enter(self, span):
+        if span.phase in MEMORY_PHASES:
+            import tracemalloc
+
+            span.snapshot = _take_snapshot()
+            span.traced = tracemalloc.get_traced_memory()[0]
+
+    def exit(self, span):
+        snapshot = getattr(span, 'snapshot', None)
+        if snapshot is None:
+            return
+
+        import tracemalloc
+
+        growth = tracemalloc.get_traced_memory()[0] - span.traced
+        stats = _take_snapshot().compare_to(snapshot, 'lineno')
+        self.phases.append((span.phase, span.fields, growth, stats[: self.top]))
+
+    def write_report(self, snapshot, peak, out):
+        out.write(f'Peak traced memory: {_format_size(peak)}\n')
+
+        for phase, fields, growth, stats in self.phases:
+            details = ' '.join(f'{key}={value}' for key, value in fields.items())
+            out.write(f'\n{phase} {details}'.rstrip())
+            out.write(f', {_format_size(growth)} still allocated after it\n')
+            for stat in stats:
+                out.write(f'    {stat}\n')
+
+        out.write('\nTop allocations still held at exit\n')
+        for stat in snapshot.statistics('lineno')[: self.top]:
+            out.write(f'    {stat}\n')
+
+
+def profile_cpu(func, args, path):
+    import cProfile
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(func, args)
+    finally:
+        profiler.dump_stats(path)
+        print(f'Wrote CPU profile to {path}', file=sys.stderr)
+
+
+def profile_memory(func, args, path):
+    import tracemalloc
+
+    profiler = MemoryProfiler()
+    timings.observe(profiler)
+    tracemalloc.start()
+    try:
+        func(args)
+    finally:
+        snapshot = _take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        timings.unobserve(profiler)
+
+        with open(path, 'w') as f:
+            profiler.write_report(snapshot, peak, f)
+        print(f'Wrote memory profile to {path}', file=sys.stderr)
+
+
+def run_profiled(func, args, mode):
+    command = args[0].lower() if args else 'vt'
+    if mode == 'cpu':
+        profile_cpu(func, args, profile_path(command, 'pstats'))
+    else:
+        profile_memory(func, args, profile_path(command, 'mem.txt'))
@@ -0,0 +1,359 @@
+import itertools
+import os
+import re
+import sys
+import textwrap
+import unicodedata
+
+from .utils import term
+
+STREAM_THRESHOLD = int(os.environ.get('VT_STREAM_THRESHOLD') or 500)
+SAMPLE_SIZE = int(os.environ.get('VT_STREAM_SAMPLE') or 1000)
+WRITE_BATCH = 256
+
+# Same escape sequences terminaltables ignores when measuring cells so that
+# streamed tables line up exactly like the ones it builds.
+RE_COLOR_ANSI = re.compile(r'(\033\[[\d;]+m)')
+
+
+def visible_width(string):
+    if '\033' in string:
+        string = RE_COLOR_ANSI.sub('', string)
+
+    if string.isascii():
+        return len(string)
+
+    width = 0
+    for char in string:
+        if unicodedata.east_asian_width(char) in ('F', 'W'):
+            width += 2
+        else:
+            width += 1
+    return width
+
+
+class Cell(str):
+    """A table cell that carries its lines and their visible widths."""
+
+    def __new__(cls, text, lines, widths):
+        cell = super().__new__(cls, text)
+        cell.lines = lines
+        cell.widths = widths
+        return cell
+
+
+def cell_lines(cell):
+    if isinstance(cell, Cell):
+        return cell.lines
+
+    if not isinstance(cell, str):
+        cell = str(cell)
+
+    lines = cell.splitlines() or ['']
+    if cell.endswith('\n'):
+        lines.append('')
+    return lines
+
+
+def cell_widths(cell):
+    if isinstance(cell, Cell):
+        return cell.widths
+    return [visible_width(line) for line in cell_lines(cell)]
+
+
+def make_cell(text):
+    lines = cell_lines(text)
+    return Cell(text, lines, [visible_width(line) for line in lines])
+
+
+def column_widths(rows, widths=None):
+    widths = list(widths or [])
+    for row in rows:
+        if len(row) > len(widths):
+            widths.extend([0] * (len(row) - len(widths)))
+
+        for i, cell in enumerate(row):
+            if not cell:
+                continue
+            widths[i] = max(widths[i], *cell_widths(cell))
+    return widths
+
+
+class TableWriter:
+    """Write an AsciiTable/BorderlessTable lookalike one row at a time.
+
+    Column widths must be known up front. Cells wider than their column are
+    written as is rather than truncated.
+    """
+
+    def __init__(self, widths, title=None, quiet=False, out=None, batch=WRITE_BATCH):
+        self.widths = widths
+        self.title = None if quiet else title
+        self.quiet = quiet
+        self.out = out or sys.stdout
+        self.batch = batch
+        self._buffer = []
+
+    def _border(self, title=None):
+        outer_widths = [width + 2 for width in self.widths]
+        columns = ['-' * width for width in outer_widths]
+
+        if title is not None and outer_widths:
+            length = visible_width(title)
+            if length > sum(outer_widths) + len(outer_widths) - 1:
+                title = None
+
+        if title is None or not outer_widths:
+            return '+' + '+'.join(columns) + '+'
+
+        if length <= outer_widths[0]:
+            columns[0] = title + '-' * (outer_widths[0] - length)
+            return '+' + '+'.join(columns) + '+'
+
+        # The title spills over intersections into the following columns.
+        parts = [title]
+        for i, width in enumerate(outer_widths):
+            if i:
+                if length < 1:
+                    parts.append('+')
+                elif length == 1:
+                    length = 0
+                else:
+                    length -= 1
+            if length < 1:
+                if i:
+                    parts.append('-' * width)
+            elif width >= length:
+                parts[0] += '-' * (width - length)
+                length = 0
+            else:
+                length -= width
+        return '+' + ''.join(parts) + '+'
+
+    def _write(self, line):
+        self._buffer.append(line)
+        self._buffer.append('\n')
+        if self.batch and len(self._buffer) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self.out.write(''.join(self._buffer))
+            self._buffer = []
+
+    def write_header(self):
+        if not self.quiet:
+            self._write(self._border(self.title))
+
+    def write_row(self, row):
+        lines = [cell_lines(cell) if cell else [''] for cell in row]
+        widths = [cell_widths(cell) if cell else [0] for cell in row]
+        lines.extend([['']] * (len(self.widths) - len(lines)))
+        widths.extend([[0]] * (len(self.widths) - len(widths)))
+        height = max(len(cell) for cell in lines)
+
+        for line_number in range(height):
+            cells = []
+            for i, cell in enumerate(lines):
+                if line_number < len(cell):
+                    text = cell[line_number]
+                    text_width = widths[i][line_number]
+                else:
+                    text, text_width = '', 0
+                width = self.widths[i] if i < len(self.widths) else text_width
+                cells.append(' ' + text + ' ' * (width - text_width + 1))
+
+            if self.quiet:
+                self._write(''.join(cells))
+            else:
+                self._write('|' + '|'.join(cells) + '|')
+
+    def write_footer(self):
+        if not self.quiet:
+            self._write(self._border())
+        self.flush()
+        self.out.flush()
+
+
+def stream_table(rows, title=None, quiet=False, out=None, sample_size=None):
+    batch = WRITE_BATCH
+    if isinstance(rows, (list, tuple)):
+        sample, rest = rows, ()
+        # Small tables are written with a single write
+        if len(rows) <= STREAM_THRESHOLD:
+            batch = None
+    else:
+        rows = iter(rows)
+        sample = list(itertools.islice(rows, sample_size or SAMPLE_SIZE))
+        rest = rows
+
+    if not sample:
+        print(term.red("No data found."), file=out or sys.stdout)
+        return
+
+    writer = TableWriter(
+        column_widths(sample),
+        title=term.yellow(title) if title and not quiet else None,
+        quiet=quiet,
+        out=out,
+        batch=batch,
+    )
+    writer.write_header()
+    for row in itertools.chain(sample, rest):
+        writer.write_row(row)
+    writer.write_footer()
+
+
+def split_style(style):
+    # blessings formatting strings return prefix + text + normal when called,
+    # or the text unchanged when the terminal does not support styling.
+    prefix, suffix = style('\0').split('\0')
+    return prefix, suffix
+
+
+def row_fields(include_comments=False, include_category=False):
+    """Return the item fields RowFormatter needs for the given columns.
+
+    Without the comments column only whether an item has comments is needed
+    for the + marker.
+    """
+    fields = [
+        'guid',
+        'name',
+        'done',
+        'comments' if include_comments else 'has_comments',
+    ]
+    if include_category:
+        fields.append('category_name')
+    return fields
+
+
+class RowFormatter:
+    """Format items into table rows.
+
+    The wrap width and styling sequences are worked out once per table rather
+    than once per row, wrapped text is only run through textwrap when it could
+    change, and each cell records its visible widths as it is built so the
+    table writer does not have to measure it again.
+    """
+
+    def __init__(
+        self,
+        shopping_list=None,
+        include_comments=False,
+        include_category=False,
+        no_wrap=False,
+        guid_length=8,
+    ):
+        num_columns = sum([2, include_category, include_comments])
+        self.wrap_width = (
+            min(int((term.width - 8) / num_columns), 70) if term and term.width else 70
+        )
+        self.wrapper = textwrap.TextWrapper(
+            width=self.wrap_width, replace_whitespace=False
+        )
+
+        self.include_comments = include_comments
+        self.category_column = bool(
+            include_category and shopping_list and shopping_list['categories']
+        )
+        self.no_wrap = no_wrap
+        self.guid_length = guid_length
+
+        dim, normal = str(term.dim), str(term.normal)
+        blue_prefix, blue_suffix = split_style(term.blue)
+        magenta_prefix, magenta_suffix = split_style(term.magenta)
+
+        self.dim = dim
+        self.normal = normal
+        self.styles = {
+            'guid': (blue_prefix, blue_suffix),
+            'done guid': (blue_prefix + dim, normal + blue_suffix),
+            'name': (magenta_prefix, magenta_suffix),
+            'done name': (magenta_prefix + dim, normal + magenta_suffix),
+            'done': (dim, normal),
+            'plain': ('', ''),
+        }
+        self._style_widths = {}
+
+    def wrap(self, text):
+        if self.no_wrap:
+            return text
+
+        width = self.wrap_width
+        return '\n'.join(
+            [
+                (
+                    line
+                    # textwrap would return these lines unchanged
+                    if len(line) <= width
+                    and '\t' not in line
+                    and not (line and line[-1].isspace())
+                    else self.wrapper.fill(line)
+                )
+                for line in text.splitlines()
+            ]
+        )
+
+    def _style_width(self, sequence):
+        # terminaltables only ignores some escape sequences when measuring so
+        # count whatever it would count.
+        width = self._style_widths.get(sequence)
+        if width is None:
+            width = self._style_widths[sequence] = visible_width(sequence)
+        return width
+
+    def styled(self, style, text):
+        prefix, suffix = self.styles[style]
+        cell = prefix + text + suffix
+
+        if '\033' in text:
+            return make_cell(cell)
+
+        lines = cell_lines(cell)
+        last = len(lines) - 1
+        widths = []
+        for i, line in enumerate(lines):
+            start = len(prefix) if i == 0 else 0
+            end = len(line) - len(suffix) if i == last else len(line)
+
+            plain = line[start:end]
+            width = len(plain) if plain.isascii() else visible_width(plain)
+            if i == 0:
+                width += self._style_width(prefix)
+            if i == last:
+                width += self._style_width(suffix)
+            widths.append(width)
+        return Cell(cell, lines, widths)
+
+    def format(self, item):
+        comments = item.get('comments')
+        category = item.get('category_name') or 'None'
+        done = item.get('done')
+
+        if comments or item.get('has_comments'):
+            name = '+ %s' % item['name']
+        else:
+            name = '  %s' % item['name']
+
+        guid = item['guid'][: self.guid_length]
+        name = self.wrap(name)
+
+        if done:
+            row = [self.styled('done guid', guid), self.styled('done name', name)]
+            category_style = 'done'
+        else:
+            row = [self.styled('guid', guid), self.styled('name', name)]
+            category_style = 'plain'
+
+        if self.category_column:
+            row.insert(1, self.styled(category_style, category))
+
+        if self.include_comments and comments:
+            if done:
+                # Comments are struck through before wrapping so the escape
+                # sequences count towards the wrap width.
+                row.append(make_cell(self.wrap(self.dim + comments + self.normal)))
+            else:
+                row.append(self.styled('plain', self.wrap(comments)))
+        return row
@@ -0,0 +1,152 @@
+"""Serialization of response bodies.
+
+The client lists the formats it can decode in the Accept header and decodes
+each response according to its Content-Type. JSON is always accepted.
+MessagePack is accepted too when the msgpack package is installed, unless
+VT_SERIALIZATION=json. Both formats decode straight into the dicts and lists
+the rest of vt works with, and both can be decoded one item at a time for
+streamed lists.
+"""
+
+import json
+import os
+
+from .json_stream import iter_json_array
+from .utils import VittlifyError
+
+JSON = 'json'
+MSGPACK = 'msgpack'
+SERIALIZATIONS = ('auto', JSON, MSGPACK)
+SERIALIZATION = (os.environ.get('VT_SERIALIZATION') or 'auto').lower()
+
+
+class JsonSerializer:
+    name = JSON
+    content_type = 'application/json'
+
+    def dumps(self, value):
+        return json.dumps(value).encode('utf-8')
+
+    def loads(self, body):
+        return json.loads(body)
+
+    def load_response(self, resp):
+        # requests detects the charset of JSON bodies
+        return resp.json()
+
+    def iter_items(self, chunks):
+        return iter_json_array(chunks)
+
+
+class MsgpackSerializer:
+    name = MSGPACK
+    content_type = 'application/msgpack'
+
+    def __init__(self):
+        import msgpack
+
+        self._msgpack = msgpack
+
+    def dumps(self, value):
+        return self._msgpack.packb(value)
+
+    def loads(self, body):
+        return self._msgpack.unpackb(body)
+
+    def load_response(self, resp):
+        return self.loads(resp.content)
+
+    def iter_items(self, chunks):
+        """Yield the items of an array read from an iterable of byte chunks.
+
+        Only the item being decoded and the rest of its chunk are held in
+        memory. A body that is not an array is yielded as a single value.
+        """
+        msgpack = self._msgpack
+        chunks = iter(chunks)
+        unpacker = msgpack.Unpacker()
+
+        def read(method):
+            while True:
+                try:
+                    return method()
+                except msgpack.OutOfData:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        raise VittlifyError('Truncated MessagePack response')
+                    unpacker.feed(chunk)
+
+        try:
+            length = read(unpacker.read_array_header)
+        except ValueError:
+            # Not an array. The unpacker is left at the start of the value.
+            yield read(unpacker.unpack)
+            return
+
+        for _ in range(length):
+            yield read(unpacker.unpack)
+
+
+# Content types are matched against these in order, so register additional
+# serializers here.
+SERIALIZERS = {
+    JSON: JsonSerializer,
+    MSGPACK: MsgpackSerializer,
+}
+
+_serializers = {}
+
+
+def validate_serialization(serialization):
+    if serialization not in SERIALIZATIONS:
+        raise VittlifyError(
+            f'Unknown serialization {serialization}. '
+            f'Expected one of {", ".join(SERIALIZATIONS)}'
+        )
+    return serialization
+
+
+def available(name):
+    if name == MSGPACK:
+        import importlib.util
+
+        return importlib.util.find_spec('msgpack') is not None
+    return name in SERIALIZERS
+
+
+def get_serializer(name):
+    serializer = _serializers.get(name)
+    if serializer is None:
+        try:
+            serializer = _serializers[name] = SERIALIZERS[name]()
+        except ImportError:
+            raise VittlifyError(f'Cannot decode {name} responses without {name}')
+    return serializer
+
+
+def accepted(serialization=None):
+    """Return the names of the formats to accept, most preferred first."""
+    serialization = validate_serialization(serialization or SERIALIZATION)
+    if serialization == JSON:
+        return [JSON]
+    if not available(MSGPACK):
+        if serialization == MSGPACK:
+            raise VittlifyError('VT_SERIALIZATION=msgpack requires the msgpack package')
+        return [JSON]
+    return [MSGPACK, JSON]
+
+
+def accept_header(serialization=None):
+    preferred, *others = accepted(serialization)
+    return ', '.join(
+        [SERIALIZERS[preferred].content_type]
+        + [f'{SERIALIZERS[name].content_type};q=0.9' for name in others]
+    )
+
+
+def for_content_type(content_type):
+    media_type = (content_type or '').split(';', 1)[0].strip().lower()
+    for name, serializer in SERIALIZERS.items():
+        if serializer.content_type == media_type:
+            return get_serializer(name)
+    return get_serializer(JSON)
@@ -0,0 +1,141 @@
+"""Session authentication.
+
+Instead of signing every request with the private key, the client signs a
+single handshake that carries an ephemeral X25519 public key. The server
+answers with its own ephemeral public key, a session id and how long the
+session lasts, and both sides derive the session secret from the shared key.
+Later requests carry the session id and an HMAC-SHA256 of their message.
+
+Sessions are stored in the cache directory so later invocations reuse them
+until shortly before they expire.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+from .cache import slug, write_atomic
+from .utils import VittlifyError
+
+SIGNATURE_AUTH = 'signature'
+SESSION_AUTH = 'session'
+AUTH_MODES = (SIGNATURE_AUTH, SESSION_AUTH)
+AUTH_MODE = (os.environ.get('VT_AUTH_MODE') or SIGNATURE_AUTH).lower()
+
+# Sessions are renewed this many seconds before they expire so one does not
+# run out part way through a command.
+EXPIRY_MARGIN = 30
+SECRET_INFO = b'vittlify session'
+
+
+def validate_auth_mode(auth_mode):
+    if auth_mode not in AUTH_MODES:
+        raise VittlifyError(
+            f'Unknown auth mode {auth_mode}. Expected one of {", ".join(AUTH_MODES)}'
+        )
+    return auth_mode
+
+
+def derive_secret(private_key, peer_public_key, session_id):
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PublicKey
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+    shared_key = private_key.exchange(
+        X25519PublicKey.from_public_bytes(peer_public_key)
+    )
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=SECRET_INFO + b'|' + session_id.encode('utf-8'),
+    ).derive(shared_key)
+
+
+class Session:
+    def __init__(self, session_id, secret, expires):
+        self.session_id = session_id
+        self.secret = secret
+        self.expires = expires
+
+    def expired(self):
+        return time.time() >= self.expires - EXPIRY_MARGIN
+
+    def authenticate(self, message):
+        digest = hmac.new(self.secret, message, hashlib.sha256).digest()
+        return {
+            'session': self.session_id,
+            'hmac': base64.b64encode(digest).decode('utf-8'),
+        }
+
+    def to_dict(self):
+        return {
+            'session': self.session_id,
+            'secret': base64.b64encode(self.secret).decode('utf-8'),
+            'expires': self.expires,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['session'], base64.b64decode(data['secret']), data['expires'])
+
+
+class Handshake:
+    def __init__(self):
+        from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+
+        self._key = X25519PrivateKey.generate()
+
+    @property
+    def public_key(self):
+        from cryptography.hazmat.primitives import serialization
+
+        public_bytes = self._key.public_key().public_bytes(
+            serialization.Encoding.Raw, serialization.PublicFormat.Raw
+        )
+        return base64.b64encode(public_bytes).decode('utf-8')
+
+    def complete(self, response):
+        try:
+            session_id = response['session']
+            peer_public_key = base64.b64decode(response['public_key'])
+            expires_in = float(response['expires_in'])
+        except (KeyError, TypeError, ValueError):
+            raise VittlifyError('Server sent an invalid session handshake')
+
+        # The lifetime is relative so clock differences with the server do
+        # not matter.
+        return Session(
+            session_id,
+            derive_secret(self._key, peer_public_key, session_id),
+            time.time() + expires_in,
+        )
+
+
+class SessionStore:
+    def __init__(self, directory, namespace=''):
+        self.path = os.path.join(directory, 'sessions', f'{slug(namespace)}.json')
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return Session.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, session):
+        # write_atomic creates files only the current user can read. Failing
+        # to store the session only means the next run needs a handshake.
+        try:
+            write_atomic(self.path, json.dumps(session.to_dict()))
+        except OSError:
+            pass
+
+    def clear(self):
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,104 @@
+import cmd
+import time
+
+from .batch import run_command
+from .guid_index import get_guid_index
+from .utils import term
+from .vittlify_request import known_shopping_lists
+
+COMMANDS = (
+    'lists',
+    'list',
+    'item',
+    'show',
+    'done',
+    'complete',
+    'undone',
+    'uncomplete',
+    'modify',
+    'edit',
+    'comment',
+    'comments',
+    'add',
+    'move',
+    'mv',
+    'categories',
+    'categorize',
+    'label',
+    'batch',
+    'help',
+    'exit',
+    'quit',
+)
+
+
+class VittlifyShell(cmd.Cmd):
+    """Run vt commands in one process so the signer, HTTP session and response
+    cache stay warm between them.
+    """
+
+    intro = 'Vittlify shell. Type help for commands or exit to quit.'
+    prompt = 'vt> '
+
+    def __init__(self, run, **kwargs):
+        super().__init__(**kwargs)
+        self.run = run
+
+    def emptyline(self):
+        # cmd.Cmd repeats the previous command by default
+        pass
+
+    def default(self, line):
+        start = time.monotonic()
+        try:
+            run_command(self.run, line)
+        except KeyboardInterrupt:
+            print()
+        elapsed = time.monotonic() - start
+        print(term.cyan(f'({elapsed * 1000:.0f} ms)'))
+
+    def do_help(self, arg):
+        self.default(f'help {arg}')
+
+    def do_exit(self, arg):
+        return True
+
+    do_quit = do_exit
+
+    def do_EOF(self, arg):
+        print()
+        return True
+
+    def completenames(self, text, *ignored):
+        return sorted(command for command in COMMANDS if command.startswith(text))
+
+    def completedefault(self, text, line, begidx, endidx):
+        if not text or text.startswith('-'):
+            return []
+
+        # Completion never waits for the server. Names come from lists
+        # already fetched by earlier commands or held in the cache.
+        shopping_lists = known_shopping_lists()
+
+        # readline splits words on spaces so only single word names can be
+        # completed.
+        names = [
+            shopping_list['name']
+            for shopping_list in shopping_lists
+            if shopping_list.get('name', '').lower().startswith(text.lower())
+            and ' ' not in shopping_list['name']
+        ]
+        return sorted(set(names)) + get_guid_index().matches(text)
+
+
+def run_shell(run, **kwargs):
+    shell = VittlifyShell(run, **kwargs)
+
+    while True:
+        try:
+            shell.cmdloop()
+            return
+        except KeyboardInterrupt:
+            # Ctrl-C at the prompt clears the line rather than leaving the shell
+            print('^C')
+            shell.intro = ''
@@ -0,0 +1,152 @@
+import base64
+import os
+import socket
+import struct
+import threading
+
+from .utils import VittlifyError
+
+SSH_AGENT_FAILURE = 5
+SSH_AGENTC_REQUEST_IDENTITIES = 11
+SSH_AGENT_IDENTITIES_ANSWER = 12
+SSH_AGENTC_SIGN_REQUEST = 13
+SSH_AGENT_SIGN_RESPONSE = 14
+
+ED25519_KEY_TYPE = b'ssh-ed25519'
+
+
+def _pack_string(value):
+    return struct.pack('>I', len(value)) + value
+
+
+def _unpack_string(data, offset):
+    (length,) = struct.unpack_from('>I', data, offset)
+    start = offset + 4
+    return data[start : start + length], start + length
+
+
+def _key_type(key_blob):
+    key_type, _ = _unpack_string(key_blob, 0)
+    return key_type
+
+
+class AgentSigner:
+    def __init__(self, socket_path=None, public_key_filename=None):
+        self.socket_path = socket_path or os.environ.get('SSH_AUTH_SOCK')
+        self.public_key_filename = public_key_filename
+        self.key_blob = None
+        self._sock = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if not self.socket_path:
+            raise VittlifyError('SSH_AUTH_SOCK is not set. Is ssh-agent running?')
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise VittlifyError(f'Could not connect to ssh-agent at {self.socket_path}')
+        return sock
+
+    def _recv_exactly(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self._sock.recv(size - len(data))
+            if not chunk:
+                raise VittlifyError('ssh-agent closed the connection')
+            data += chunk
+        return data
+
+    def _request(self, message_type, body=b''):
+        with self._lock:
+            if self._sock is None:
+                self._sock = self._connect()
+
+            message = struct.pack('>B', message_type) + body
+            self._sock.sendall(struct.pack('>I', len(message)) + message)
+
+            (length,) = struct.unpack('>I', self._recv_exactly(4))
+            response = self._recv_exactly(length)
+        return response[0], response[1:]
+
+    def list_identities(self):
+        response_type, body = self._request(SSH_AGENTC_REQUEST_IDENTITIES)
+        if response_type != SSH_AGENT_IDENTITIES_ANSWER:
+            raise VittlifyError('ssh-agent refused to list identities')
+
+        (count,) = struct.unpack_from('>I', body, 0)
+        offset = 4
+        identities = []
+        for _ in range(count):
+            key_blob, offset = _unpack_string(body, offset)
+            comment, offset = _unpack_string(body, offset)
+            identities.append((key_blob, comment.decode('utf-8', 'replace')))
+        return identities
+
+    def _public_key_blob(self):
+        if not self.public_key_filename:
+            return None
+
+        try:
+            with open(self.public_key_filename, 'rb') as f:
+                fields = f.read().split()
+        except IOError:
+            return None
+
+        return base64.b64decode(fields[1]) if len(fields) > 1 else None
+
+    def load(self):
+        identities = self.list_identities()
+        wanted = self._public_key_blob()
+
+        if wanted is not None:
+            candidates = [blob for blob, _ in identities if blob == wanted]
+            if not candidates:
+                raise VittlifyError(
+                    f'The key in {self.public_key_filename} is not loaded in ssh-agent'
+                )
+        else:
+            candidates = [
+                blob for blob, _ in identities if _key_type(blob) == ED25519_KEY_TYPE
+            ]
+            if not candidates:
+                raise VittlifyError('No ed25519 identities found in ssh-agent')
+
+        key_blob = candidates[0]
+        if _key_type(key_blob) != ED25519_KEY_TYPE:
+            # ssh-agent only produces PKCS#1 v1.5 signatures for RSA keys while
+            # Vittlify verifies RSA signatures with PSS.
+            raise VittlifyError(
+                'ssh-agent signing is only supported for ed25519 keys. '
+                'Unset VT_SSH_AGENT to sign with the key file instead.'
+            )
+
+        self.key_blob = key_blob
+        return key_blob
+
+    def sign(self, message):
+        key_blob = self.key_blob if self.key_blob is not None else self.load()
+
+        body = _pack_string(key_blob) + _pack_string(message) + struct.pack('>I', 0)
+        response_type, response = self._request(SSH_AGENTC_SIGN_REQUEST, body)
+        if response_type != SSH_AGENT_SIGN_RESPONSE:
+            raise VittlifyError('ssh-agent refused to sign the request')
+
+        signature_blob, _ = _unpack_string(response, 0)
+        signature_type, offset = _unpack_string(signature_blob, 0)
+        signature, _ = _unpack_string(signature_blob, offset)
+        if signature_type != ED25519_KEY_TYPE:
+            raise VittlifyError(f'Unexpected signature type {signature_type!r}')
+        return signature
+
+    def sign_digest(self, digest):
+        # Only ed25519 keys are supported, which sign the digest as a message
+        return self.sign(digest)
+
+    def close(self):
+        with self._lock:
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
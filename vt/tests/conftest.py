@@ -0,0 +1,94 @@
+import os
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+from vt import guid_index, timings, vittlify_request
+from vt.utils import clear_signers, term
+
+from .stub_server import StubServer
+
+
+@pytest.fixture(autouse=True)
+def response_cache_dir(tmp_path, mocker):
+    cache_dir = tmp_path / 'cache'
+    mocker.patch.dict(os.environ, {'VT_CACHE_DIR': str(cache_dir)})
+    mocker.patch.object(vittlify_request, '_response_cache', None)
+    mocker.patch.object(guid_index, '_guid_index', None)
+    return cache_dir
+
+
+@pytest.fixture(autouse=True)
+def terminal(mocker):
+    # Let blessings decide on styling as it would for a TTY rather than
+    # switching to plain output because pytest captures stdout.
+    mocker.patch.dict(os.environ, {'VT_PLAIN': 'false'})
+    mocker.patch.object(term, '_terminal', None)
+    mocker.patch.object(term, 'plain', None)
+
+
+@pytest.fixture(autouse=True)
+def timings_state(mocker):
+    mocker.patch.object(timings, 'enabled', False)
+    mocker.patch.object(timings, 'show', False)
+    mocker.patch.object(timings, 'TRACE_PATH', None)
+    mocker.patch.object(timings, '_events', [])
+    mocker.patch.object(timings, '_depth', 0)
+    mocker.patch.object(timings, '_startup_recorded', False)
+    mocker.patch.object(timings, '_observers', [])
+
+
+@pytest.fixture(autouse=True)
+def auth_session(mocker):
+    mocker.patch.object(vittlify_request, '_auth_session', None)
+
+
+@pytest.fixture(autouse=True)
+def capabilities(mocker):
+    mocker.patch.object(vittlify_request, '_capabilities', None)
+    mocker.patch.object(vittlify_request, '_capabilities_probe', None)
+    mocker.patch.object(vittlify_request, '_known_lists', {})
+    yield
+    # Let a background probe finish before its globals are restored
+    if vittlify_request._capabilities_probe is not None:
+        vittlify_request._capabilities_probe.join()
+
+
+@pytest.fixture(autouse=True)
+def wire_format(mocker):
+    # Tests of the version 2 format or of negotiating it set this themselves
+    mocker.patch.object(vittlify_request, 'WIRE_FORMAT', 'v1')
+
+
+@pytest.fixture
+def private_key(tmp_path, mocker):
+    key = ed25519.Ed25519PrivateKey.generate()
+    path = tmp_path / 'id_stub'
+    path.write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.OpenSSH,
+            serialization.NoEncryption(),
+        )
+    )
+
+    mocker.patch.dict(os.environ, {'VT_PRIVATE_KEY': str(path)})
+    os.environ.pop('VT_SSH_AGENT', None)
+    clear_signers()
+
+    yield key
+    clear_signers()
+
+
+@pytest.fixture
+def stub_server(private_key, mocker):
+    with StubServer() as server:
+        server.verify_key = private_key.public_key()
+        mocker.patch.object(vittlify_request, 'VITTLIFY_URL', server.url)
+        mocker.patch.object(vittlify_request, 'PROXY', None)
+        vittlify_request.close_session()
+
+        yield server
+
+        vittlify_request.close_session()
@@ -0,0 +1,388 @@
+import base64
+import gzip
+import hashlib
+import hmac
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa, utils
+from cryptography.hazmat.primitives.asymmetric.x25519 import (
+    X25519PrivateKey,
+    X25519PublicKey,
+)
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        self.server.stub.transfer(received=len(body))
+
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        return body
+
+    def _send_json(self, status, body, headers=None):
+        stub = self.server.stub
+        content_type = 'application/json'
+        if stub.msgpack_responses and 'application/msgpack' in (
+            self.headers.get('Accept') or ''
+        ):
+            import msgpack
+
+            content_type = 'application/msgpack'
+            encoded = msgpack.packb(body)
+        else:
+            encoded = json.dumps(body).encode('utf-8')
+
+        compress = stub.compress_responses and 'gzip' in (
+            self.headers.get('Accept-Encoding') or ''
+        )
+        if compress:
+            encoded = gzip.compress(encoded)
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(encoded)))
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+
+        stub.transfer(sent=len(encoded))
+        self.wfile.write(encoded)
+
+    def _handle(self):
+        stub = self.server.stub
+        body = self._read_body()
+
+        if stub.latency:
+            time.sleep(stub.latency)
+
+        if self.headers.get('X-Vittlify-Wire-Version') == '2':
+            # The body is the data itself and the authentication is in headers
+            payload = {}
+            data = json.loads(body) if body else {}
+            message = hashlib.sha512(body).digest()
+            auth = {
+                'prehashed': True,
+                'signature': self.headers.get('X-Vittlify-Signature'),
+                'session': self.headers.get('X-Vittlify-Session'),
+                'hmac': self.headers.get('X-Vittlify-HMAC'),
+            }
+        else:
+            payload = json.loads(body) if body else {}
+            data = json.loads(payload.get('message') or '{}')
+            message = (payload.get('message') or '').encode('utf-8')
+            auth = payload
+        stub.record(self.command, data, payload, self.headers)
+
+        fault = stub.next_fault()
+        if fault == 'drop':
+            # Hang up without answering
+            self.close_connection = True
+            return
+        if isinstance(fault, int):
+            self._send_json(fault, 'Injected fault')
+            return
+
+        auth_error = stub.authenticate(
+            message,
+            auth.get('signature'),
+            auth.get('session'),
+            auth.get('hmac'),
+            prehashed=auth.get('prehashed', False),
+        )
+        if auth_error:
+            self._send_json(401, auth_error)
+            return
+
+        if data.get('endpoint') == 'session':
+            self._send_json(200, stub.start_session(data))
+            return
+
+        handler = stub.get_handler(data.get('endpoint'))
+        if handler is None:
+            self._send_json(404, f'Unknown endpoint {data.get("endpoint")}')
+            return
+
+        key = self.headers.get('Idempotency-Key')
+        result = stub.replay(key)
+        if result is None:
+            result = handler(data)
+            if not isinstance(result, tuple):
+                result = (200, result)
+            if stub.project_fields and 'fields' in data:
+                result = (result[0], project(result[1], data['fields'])) + result[2:]
+            stub.remember(key, result)
+
+        if fault == 'slow':
+            # The request has been handled but the response arrives late
+            time.sleep(stub.fault_delay)
+
+        headers = result[2] if len(result) > 2 else {}
+        etag = headers.get('ETag')
+        if etag and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        try:
+            self._send_json(*result)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up waiting
+            self.close_connection = True
+
+    do_GET = _handle
+    do_PUT = _handle
+    do_POST = _handle
+
+
+def project(body, fields):
+    # has_comments stands in for comments when they were not asked for
+    def project_item(item):
+        if not isinstance(item, dict):
+            return item
+        projected = {field: item[field] for field in fields if field in item}
+        if 'has_comments' in fields:
+            projected['has_comments'] = bool(item.get('comments'))
+        return projected
+
+    if isinstance(body, dict) and 'results' in body:
+        return dict(body, results=[project_item(item) for item in body['results']])
+    if isinstance(body, list):
+        return [project_item(item) for item in body]
+    return body
+
+
+def paged_handler(items):
+    # Serve items in pages of page_size using the offset of the next page as
+    # the cursor. Requests without paging get every item as a plain list.
+    def handler(data):
+        if 'page_size' not in data:
+            return items
+
+        size = data['page_size']
+        start = int(data.get('cursor') or 0) or (data.get('page', 1) - 1) * size
+        end = start + size
+        return {
+            'results': items[start:end],
+            'next': str(end) if end < len(items) else None,
+        }
+
+    return handler
+
+
+class StubServer:
+    """Minimal in-process Vittlify server used to exercise the real transport.
+
+    Handlers are registered per endpoint and receive the decoded message. They
+    may return a body or a (status, body[, headers]) tuple.
+
+    Bodies are gzipped when compress_responses is set and the client accepts
+    gzip, and encoded with MessagePack when msgpack_responses is set and the
+    client accepts application/msgpack. A bandwidth in bytes per second
+    simulates a slow link by delaying each body by its size on the wire.
+
+    Items in list responses are projected to the fields a request asks for
+    unless project_fields is turned off, like a server without projections.
+
+    Faults are injected by adding them to faults, one per request in the order
+    requests arrive: 'drop' closes the connection without a response, 'slow'
+    handles the request but delays the response by fault_delay seconds, and a
+    status code is returned without handling the request. Responses are
+    replayed for repeated Idempotency-Keys like a server that supports them.
+
+    Signatures are checked against verify_key, an Ed25519 or RSA public key,
+    when it is set. Version 2 requests are checked over the SHA-512 digest of
+    their body. The session endpoint implements the handshake described in
+    vt.session_auth independently of the client, and requests made with a
+    session are checked against its HMAC.
+
+    Servers advertise optional features through the capabilities endpoint.
+    With 'batch' among capabilities the batch endpoint runs each operation of
+    the envelope through the registered handlers and returns their results in
+    order.
+    """
+
+    def __init__(self, handler_class=StubRequestHandler):
+        self.handlers = {}
+        self.requests = []
+        self.latency = 0
+        self.bandwidth = None
+        self.compress_responses = False
+        self.msgpack_responses = False
+        self.project_fields = True
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.faults = []
+        self.fault_delay = 1
+        self._responses = {}
+        self.verify_key = None
+        self.session_ttl = 300
+        self.sessions = {}
+        self.capabilities = []
+        self.operations = []
+        self._lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}/vittlify/'
+
+    def record(self, method, data, payload, headers):
+        with self._lock:
+            self.requests.append(
+                {
+                    'method': method,
+                    'data': data,
+                    'payload': payload,
+                    'headers': dict(headers),
+                }
+            )
+
+    def get_handler(self, endpoint):
+        if endpoint in self.handlers:
+            return self.handlers[endpoint]
+        if endpoint == 'capabilities' and self.capabilities:
+            return lambda data: {'capabilities': list(self.capabilities)}
+        if endpoint == 'batch' and 'batch' in self.capabilities:
+            return self.run_batch
+        return None
+
+    def run_batch(self, data):
+        results = []
+        for operation in data['operations']:
+            with self._lock:
+                self.operations.append(operation)
+
+            endpoint = operation['data'].get('endpoint')
+            handler = self.handlers.get(endpoint)
+            if handler is None:
+                results.append({'status': 404, 'body': f'Unknown endpoint {endpoint}'})
+                continue
+
+            result = handler(operation['data'])
+            if not isinstance(result, tuple):
+                result = (200, result)
+            results.append({'status': result[0], 'body': result[1]})
+        return {'results': results}
+
+    def authenticate(
+        self, message, signature=None, session=None, hmac_=None, prehashed=False
+    ):
+        if session:
+            with self._lock:
+                secret, expires = self.sessions.get(session, (None, 0))
+            if secret is None or expires < time.time():
+                return 'Unknown or expired session'
+
+            digest = hmac.new(secret, message, hashlib.sha256).digest()
+            if not hmac.compare_digest(
+                base64.b64encode(digest).decode('utf-8'), hmac_ or ''
+            ):
+                return 'Invalid HMAC'
+            return None
+
+        if self.verify_key is not None:
+            try:
+                self.verify(base64.b64decode(signature or ''), message, prehashed)
+            except (InvalidSignature, ValueError):
+                return 'Invalid signature'
+        return None
+
+    def verify(self, signature, message, prehashed=False):
+        if isinstance(self.verify_key, rsa.RSAPublicKey):
+            self.verify_key.verify(
+                signature,
+                message,
+                padding.PSS(
+                    mgf=padding.MGF1(hashes.SHA512()),
+                    salt_length=padding.PSS.MAX_LENGTH,
+                ),
+                utils.Prehashed(hashes.SHA512()) if prehashed else hashes.SHA512(),
+            )
+        else:
+            self.verify_key.verify(signature, message)
+
+    def start_session(self, data):
+        key = X25519PrivateKey.generate()
+        session_id = uuid.uuid4().hex
+        shared_key = key.exchange(
+            X25519PublicKey.from_public_bytes(base64.b64decode(data['public_key']))
+        )
+        secret = HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=b'vittlify session|' + session_id.encode('utf-8'),
+        ).derive(shared_key)
+
+        with self._lock:
+            self.sessions[session_id] = (secret, time.time() + self.session_ttl)
+
+        public_key = key.public_key().public_bytes(
+            serialization.Encoding.Raw, serialization.PublicFormat.Raw
+        )
+        return {
+            'session': session_id,
+            'public_key': base64.b64encode(public_key).decode('utf-8'),
+            'expires_in': self.session_ttl,
+        }
+
+    def next_fault(self):
+        with self._lock:
+            return self.faults.pop(0) if self.faults else None
+
+    def replay(self, key):
+        with self._lock:
+            return self._responses.get(key) if key else None
+
+    def remember(self, key, result):
+        if key:
+            with self._lock:
+                self._responses[key] = result
+
+    def transfer(self, received=0, sent=0):
+        with self._lock:
+            self.bytes_received += received
+            self.bytes_sent += sent
+
+        if self.bandwidth:
+            time.sleep((received + sent) / self.bandwidth)
+
+    def endpoints(self):
+        return [request['data'].get('endpoint') for request in self.requests]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
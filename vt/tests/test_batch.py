@@ -0,0 +1,105 @@
+import io
+import sys
+import threading
+import time
+
+import pytest
+
+from vt.batch import ThreadLocalStdout, read_commands, run_batch, run_command
+from vt.utils import term
+
+
+class TestReadCommands:
+    def test_skips_blank_lines_and_comments(self):
+        lines = ['list\n', '\n', '# a comment\n', '  done abc  \n']
+
+        assert [(1, 'list'), (4, 'done abc')] == list(read_commands(lines))
+
+
+class TestRunCommand:
+    @pytest.fixture(autouse=True)
+    def setUp(self, mocker):
+        mocker.patch.object(term, 'red', side_effect=lambda text: text)
+
+    def test_success(self):
+        calls = []
+
+        assert 0 == run_command(calls.append, 'add "milk and eggs"')
+        assert [['add', 'milk and eggs']] == calls
+
+    def test_exit_status(self):
+        def run(args):
+            sys.exit(1)
+
+        assert 1 == run_command(run, 'list')
+
+    def test_unexpected_error(self, capsys):
+        def run(args):
+            raise KeyError('guid')
+
+        assert 1 == run_command(run, 'list')
+        assert "'guid'\n" == capsys.readouterr().out
+
+    def test_bad_quoting(self):
+        assert 1 == run_command(lambda args: None, 'add "milk')
+
+
+class TestThreadLocalStdout:
+    def test_capture_per_thread(self):
+        stream = io.StringIO()
+        stdout = ThreadLocalStdout(stream)
+        captured = {}
+
+        def worker():
+            stdout.capture()
+            stdout.write('worker')
+            captured['worker'] = stdout.release()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        stdout.write('main')
+
+        assert 'worker' == captured['worker']
+        assert 'main' == stream.getvalue()
+
+
+class TestRunBatch:
+    @pytest.fixture(autouse=True)
+    def setUp(self, mocker):
+        mocker.patch.object(term, 'red', side_effect=lambda text: text)
+
+    @staticmethod
+    def run(args):
+        # Later lines finish first so concurrent output must be reordered
+        time.sleep(0.01 * (4 - int(args[1])))
+        print(f'start {args[1]}')
+        if args[0] == 'fail':
+            sys.exit(1)
+        print(f'end {args[1]}')
+
+    def test_serial(self, capsys):
+        failures = run_batch(self.run, ['ok 1', 'fail 2', 'ok 3'])
+
+        assert 1 == failures
+        assert (
+            'start 1\nend 1\nstart 2\nLine 2 failed: fail 2\nstart 3\nend 3\n'
+            == capsys.readouterr().out
+        )
+
+    def test_concurrent_output_in_order(self, capsys):
+        stdout = sys.stdout
+        failures = run_batch(self.run, ['ok 1', 'fail 2', 'ok 3'], jobs=3)
+
+        assert 1 == failures
+        assert (
+            'start 1\nend 1\nstart 2\nLine 2 failed: fail 2\nstart 3\nend 3\n'
+            == capsys.readouterr().out
+        )
+        assert stdout is sys.stdout
+
+    def test_concurrent_runs_in_parallel(self):
+        start = time.monotonic()
+        run_batch(lambda args: time.sleep(0.2), ['list'] * 4, jobs=4)
+
+        assert time.monotonic() - start < 0.4
@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from vt.bulk import iter_bulk, run_bulk, run_concurrently
+
+
+class TestRunBulk:
+    def test_results_in_input_order(self):
+        def slow_upper(target):
+            time.sleep(0.01 * (5 - len(target)))
+            return target.upper()
+
+        results = run_bulk(slow_upper, ['a', 'bb', 'ccc', 'dddd'], max_workers=4)
+
+        assert ['a', 'bb', 'ccc', 'dddd'] == [result.target for result in results]
+        assert ['A', 'BB', 'CCC', 'DDDD'] == [result.value for result in results]
+        assert all(result.error is None for result in results)
+
+    def test_failures_reported_per_item(self):
+        error = ValueError('bad target')
+
+        def func(target):
+            if target == 'bad':
+                raise error
+            return target
+
+        results = run_bulk(func, ['good', 'bad', 'also good'], max_workers=2)
+
+        assert ['good', None, 'also good'] == [result.value for result in results]
+        assert [None, error, None] == [result.error for result in results]
+
+    def test_bounded_parallelism(self):
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+
+        def func(target):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+
+        run_bulk(func, list(range(10)), max_workers=3)
+
+        assert 1 < peak[0] <= 3
+
+    def test_serial(self):
+        thread_ids = set()
+        run_bulk(lambda target: thread_ids.add(threading.get_ident()), [1, 2, 3], 1)
+
+        assert {threading.get_ident()} == thread_ids
+
+
+class TestRunConcurrently:
+    def test_results_in_order(self):
+        assert [1, 2] == run_concurrently(lambda: 1, lambda: 2)
+
+    def test_runs_in_parallel(self):
+        start = time.monotonic()
+        run_concurrently(lambda: time.sleep(0.1), lambda: time.sleep(0.1))
+
+        assert time.monotonic() - start < 0.2
+
+    def test_raises_first_error(self):
+        def fail():
+            raise ValueError('failed')
+
+        with pytest.raises(ValueError):
+            run_concurrently(lambda: 1, fail)
+
+
+class TestIterBulk:
+    def test_serial_is_lazy(self):
+        seen = []
+        results = iter_bulk(seen.append, iter([1, 2, 3]), max_workers=1)
+
+        assert [] == seen
+        next(results)
+        assert [1] == seen
+
+    def test_results_in_input_order(self):
+        results = iter_bulk(lambda target: target * 2, iter(range(5)), max_workers=3)
+
+        assert [0, 2, 4, 6, 8] == [result.value for result in results]
@@ -0,0 +1,218 @@
+import os
+
+import mock
+import pytest
+
+from vt import vittlify_request
+from vt.cache import ResponseCache, covers
+from vt.vittlify_request import (
+    complete_item,
+    get_all_shopping_list_items,
+    get_all_shopping_lists,
+    get_item,
+)
+
+
+class TestResponseCache:
+    @pytest.fixture(autouse=True)
+    def setUp(self, tmp_path):
+        self.directory = str(tmp_path)
+        self.cache = ResponseCache(self.directory, namespace='test')
+
+    def test_key_for(self):
+        assert ('item', 'guid') == ResponseCache.key_for(
+            {'endpoint': 'item', 'guid': 'guid'}
+        )
+        assert ('all lists', '') == ResponseCache.key_for({'endpoint': 'all lists'})
+        assert ResponseCache.key_for({'endpoint': 'complete', 'guid': 'guid'}) is None
+        assert (
+            ResponseCache.key_for(
+                {'endpoint': 'list items', 'guid': 'guid', 'page_size': 10}
+            )
+            is None
+        )
+
+    def test_set_and_get(self):
+        self.cache.set(('item', 'guid'), {'name': 'item'}, etag='"v1"')
+
+        # A separate instance has no in-memory copy and reads the file
+        other = ResponseCache(self.directory, namespace='test')
+        entry = other.get(('item', 'guid'))
+
+        assert {'name': 'item'} == entry['body']
+        assert '"v1"' == entry['etag']
+
+    def test_namespaces_are_separate(self):
+        self.cache.set(('item', 'guid'), {'name': 'item'})
+
+        other = ResponseCache(self.directory, namespace='other user')
+        assert other.get(('item', 'guid')) is None
+
+    def test_is_fresh(self):
+        key = ('list items', 'guid')
+
+        with mock.patch('vt.cache.time.time', return_value=1000):
+            entry = self.cache.set(key, [])
+
+        with mock.patch('vt.cache.time.time', return_value=1010):
+            assert self.cache.is_fresh(key, entry)
+
+        with mock.patch('vt.cache.time.time', return_value=1100):
+            assert not self.cache.is_fresh(key, entry)
+
+    def test_categories_live_longer_than_items(self):
+        with mock.patch('vt.cache.time.time', return_value=1000):
+            list_entry = self.cache.set(('list', 'guid'), {'categories': []})
+            items_entry = self.cache.set(('list items', 'guid'), [])
+
+        with mock.patch('vt.cache.time.time', return_value=1100):
+            assert self.cache.is_fresh(('list', 'guid'), list_entry)
+            assert not self.cache.is_fresh(('list items', 'guid'), items_entry)
+
+    def test_no_temporary_files_left(self):
+        self.cache.set(('item', 'guid'), {'name': 'item'})
+
+        for _, _, filenames in os.walk(self.directory):
+            assert not [name for name in filenames if name.startswith('.tmp-')]
+
+    def test_invalidate_mutation(self):
+        self.cache.set(('item', 'guid'), {'name': 'item'})
+        self.cache.set(('list items', 'list_guid'), [])
+        self.cache.set(('list', 'list_guid'), {'name': 'list'})
+
+        self.cache.invalidate_mutation({'endpoint': 'complete', 'guid': 'guid'})
+
+        assert self.cache.get(('item', 'guid')) is None
+        assert self.cache.get(('list items', 'list_guid')) is None
+        assert self.cache.get(('list', 'list_guid')) is not None
+
+    def test_invalidation_seen_by_other_processes(self):
+        other = ResponseCache(self.directory, namespace='test')
+
+        with mock.patch('vt.cache.time.time', return_value=1000):
+            self.cache.set(('list items', 'list_guid'), [])
+            assert other.get(('list items', 'list_guid')) is not None
+
+        with mock.patch('vt.cache.time.time', return_value=1001):
+            self.cache.invalidate_mutation({'endpoint': 'move', 'guid': 'guid'})
+
+        assert other.get(('list items', 'list_guid')) is None
+
+    def test_response_requested_before_invalidation_is_ignored(self):
+        with mock.patch('vt.cache.time.time', return_value=1001):
+            self.cache.invalidate_endpoint('list items')
+
+        # Another process finishes a request it sent before the invalidation
+        self.cache.set(('list items', 'list_guid'), [], requested=1000)
+
+        assert self.cache.get(('list items', 'list_guid')) is None
+
+    def test_add_item_invalidates_lists(self):
+        self.cache.set(('list items', 'list_guid'), [])
+        self.cache.set(('list all items', 'other_guid'), [])
+        self.cache.set(('completed', ''), [])
+
+        self.cache.invalidate_mutation({'endpoint': 'add item', 'guid': 'list_guid'})
+
+        other = ResponseCache(self.directory, namespace='test')
+        for cache in (self.cache, other):
+            assert cache.get(('list items', 'list_guid')) is None
+            assert cache.get(('list all items', 'other_guid')) is None
+            assert cache.get(('completed', '')) is not None
+
+    def test_projected_response(self):
+        key = ('list items', 'list_guid')
+        self.cache.set(key, [], fields=['guid', 'name'])
+
+        other = ResponseCache(self.directory, namespace='test')
+        assert other.get(key, fields=['guid']) is not None
+        assert other.get(key, fields=['guid', 'comments']) is None
+        assert other.get(key) is None
+
+
+class TestCovers:
+    @pytest.mark.parametrize(
+        'cached_fields, fields, expected',
+        [
+            (None, None, True),
+            (None, ['guid'], True),
+            (['guid'], None, False),
+            (['guid', 'name'], ['name'], True),
+            (['guid'], ['guid', 'name'], False),
+            (['guid', 'comments'], ['guid', 'has_comments'], True),
+            (['guid', 'has_comments'], ['guid', 'comments'], False),
+        ],
+    )
+    def test_covers(self, cached_fields, fields, expected):
+        assert expected == covers(cached_fields, fields)
+
+
+class TestSendRequestCache:
+    @pytest.fixture(autouse=True)
+    def setUp(self, stub_server):
+        self.stub_server = stub_server
+        self.version = 1
+
+        self.stub_server.handlers['all lists'] = lambda data: (
+            200,
+            [{'guid': 'list_guid', 'name': f'list v{self.version}'}],
+            {'ETag': f'"{self.version}"'},
+        )
+        self.stub_server.handlers['item'] = lambda data: {
+            'guid': data['guid'],
+            'name': 'item',
+        }
+        self.stub_server.handlers['complete'] = lambda data: {
+            'guid': data['guid'],
+            'name': 'item',
+        }
+
+    def test_fresh_response_served_from_cache(self):
+        assert get_all_shopping_lists() == get_all_shopping_lists()
+        assert ['all lists'] == self.stub_server.endpoints()
+
+    def test_expired_response_revalidated(self):
+        get_all_shopping_lists()
+
+        with mock.patch.dict('vt.cache.CACHE_TTLS', {'all lists': 0}):
+            lists = get_all_shopping_lists()
+
+        assert [{'guid': 'list_guid', 'name': 'list v1'}] == lists
+        assert ['all lists', 'all lists'] == self.stub_server.endpoints()
+        assert '"1"' == self.stub_server.requests[1]['headers']['If-None-Match']
+
+    def test_changed_response_replaces_cache(self):
+        get_all_shopping_lists()
+        self.version = 2
+
+        with mock.patch.dict('vt.cache.CACHE_TTLS', {'all lists': 0}):
+            lists = get_all_shopping_lists()
+
+        assert [{'guid': 'list_guid', 'name': 'list v2'}] == lists
+
+    def test_mutation_invalidates_item(self):
+        get_item('guid')
+        complete_item('guid')
+        get_item('guid')
+
+        assert ['item', 'complete', 'item'] == self.stub_server.endpoints()
+
+    def test_projections(self):
+        self.stub_server.handlers['list all items'] = lambda data: [
+            {'guid': 'item_guid', 'name': 'item', 'comments': 'comment'}
+        ]
+
+        get_all_shopping_list_items('list_guid', fields=['guid', 'has_comments'])
+        comments = get_all_shopping_list_items('list_guid', fields=['comments'])
+        cached = get_all_shopping_list_items('list_guid', fields=['has_comments'])
+
+        # The response with comments replaced the one without them
+        assert [{'comments': 'comment'}] == comments == cached
+        assert 2 == self.stub_server.endpoints().count('list all items')
+
+    def test_disabled(self):
+        with mock.patch.object(vittlify_request, 'CACHE_ENABLED', False):
+            get_all_shopping_lists()
+            get_all_shopping_lists()
+
+        assert ['all lists', 'all lists'] == self.stub_server.endpoints()
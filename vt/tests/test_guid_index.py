@@ -0,0 +1,150 @@
+import json
+
+import pytest
+
+from vt.guid_index import (
+    GUID_TTL,
+    GuidIndex,
+    get_guid_index,
+    remember_guids,
+    resolve_guid,
+)
+from vt.utils import VittlifyError
+
+GUID_A = '1a2b3c4d-0000-4000-8000-000000000001'
+GUID_B = '1a2b3c4d-0000-4000-8000-000000000002'
+GUID_C = '9f8e7d6c-0000-4000-8000-000000000003'
+
+
+class TestGuidIndex:
+    @pytest.fixture(autouse=True)
+    def setUp(self, tmp_path):
+        self.path = str(tmp_path / 'guids.json')
+        self.index = GuidIndex(self.path)
+
+    def test_resolve_unique_prefix(self):
+        self.index.remember([GUID_A, GUID_C])
+
+        assert GUID_C == self.index.resolve('9f8e7d6c')
+        assert GUID_C == self.index.resolve('9F8E')
+
+    def test_resolve_unknown_prefix(self):
+        self.index.remember([GUID_A])
+
+        assert 'shopping' == self.index.resolve('shopping')
+
+    def test_resolve_ambiguous_prefix(self):
+        self.index.remember([GUID_A, GUID_B])
+
+        with pytest.raises(VittlifyError, match='ambiguous'):
+            self.index.resolve('1a2b3c4d')
+
+    def test_resolve_full_guid(self):
+        self.index.remember([GUID_A, GUID_A + 'ff'])
+
+        assert GUID_A == self.index.resolve(GUID_A)
+
+    def test_abbrev_length(self):
+        self.index.remember([GUID_A, GUID_C])
+        assert 8 == self.index.abbrev_length()
+
+        # Grows just enough to tell the closest pair apart
+        self.index.remember([GUID_B])
+        assert len(GUID_A) == self.index.abbrev_length()
+
+        self.index.remember(['9f8e7d6c1'])
+        assert len(GUID_A) == self.index.abbrev_length()
+
+    def test_abbrev_length_for_shared_prefix(self):
+        self.index.remember(['abcdefghij', 'abcdefghkl'])
+        assert 9 == self.index.abbrev_length()
+
+    def test_persisted(self):
+        self.index.remember([GUID_A])
+
+        assert GUID_A == GuidIndex(self.path).resolve('1a2b')
+
+    def test_merges_other_writers(self):
+        other = GuidIndex(self.path)
+        other.remember([GUID_C])
+
+        self.index.remember([GUID_A])
+        other.remember([GUID_B])
+
+        assert [GUID_A, GUID_B, GUID_C] == sorted(GuidIndex(self.path).matches(''))
+
+    def test_forgets_guids_not_shown(self, mocker):
+        now = mocker.patch('time.time', return_value=1000000000.0)
+        self.index.remember([GUID_A, GUID_B])
+
+        now.return_value += GUID_TTL - 1
+        self.index.remember([GUID_C])
+        assert len(GUID_A) == GuidIndex(self.path).abbrev_length()
+
+        now.return_value += 2
+        self.index.remember([GUID_C + 'ff'])
+        assert [GUID_C, GUID_C + 'ff'] == GuidIndex(self.path).matches('')
+        assert len(GUID_C) + 1 == GuidIndex(self.path).abbrev_length()
+
+    def test_keeps_most_recent(self, mocker):
+        mocker.patch('vt.guid_index.MAX_GUIDS', 2)
+        now = mocker.patch('time.time', return_value=1000000000.0)
+
+        for guid in (GUID_A, GUID_B, GUID_C):
+            now.return_value += 1
+            self.index.remember([guid])
+
+        assert [GUID_B, GUID_C] == GuidIndex(self.path).matches('')
+
+    def test_recently_shown_not_rewritten(self, mocker):
+        self.index.remember([GUID_A])
+        write_atomic = mocker.patch('vt.guid_index.write_atomic')
+
+        self.index.remember([GUID_A])
+        assert not write_atomic.called
+
+        self.index.remember([GUID_A, GUID_B])
+        assert write_atomic.called
+
+    def test_reads_guid_list(self):
+        with open(self.path, 'w') as f:
+            json.dump([GUID_A, GUID_C], f)
+
+        assert GUID_C == GuidIndex(self.path).resolve('9f8e')
+
+    def test_ignores_missing_guids(self):
+        self.index.remember([None, '', GUID_A])
+
+        assert [GUID_A] == self.index.matches('')
+
+
+class TestModuleHelpers:
+    def test_remember_and_resolve(self):
+        length = remember_guids([{'guid': GUID_A}, {'guid': GUID_C}, {'name': 'x'}])
+
+        assert 8 == length
+        assert GUID_A == resolve_guid(GUID_A[:8])
+        assert get_guid_index() is get_guid_index()
+
+    def test_resolve_empty(self):
+        assert '' == resolve_guid('')
+
+    @pytest.mark.parametrize(
+        'name', ['1', '1a2b', 'cafe', 'Decade', 'milk', '1a2b3c4d groceries']
+    )
+    def test_names_not_resolved(self, name):
+        remember_guids(
+            [
+                {'guid': GUID_A},
+                {'guid': '1a2b3c4d groceries'},
+                {'guid': 'cafe0123-0000'},
+                {'guid': 'decade01-0000'},
+            ]
+        )
+
+        assert name == resolve_guid(name)
+
+    def test_uppercase_prefix(self):
+        remember_guids([{'guid': GUID_A}, {'guid': GUID_C}])
+
+        assert GUID_C == resolve_guid('9F8E7D6C')
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from vt.json_stream import iter_json_array
+
+
+def chunked(raw, size):
+    return [raw[i : i + size] for i in range(0, len(raw), size)]
+
+
+class TestIterJsonArray:
+    ITEMS = [
+        {'guid': 'guid1', 'name': 'café', 'done': False},
+        {'guid': 'guid2', 'name': '牛乳', 'comments': None},
+        456.5,
+        True,
+        [1, [2, 3]],
+        'string',
+    ]
+
+    @pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 4096])
+    def test_chunk_boundaries(self, size):
+        raw = json.dumps(self.ITEMS, ensure_ascii=False).encode('utf-8')
+
+        assert self.ITEMS == list(iter_json_array(chunked(raw, size)))
+
+    def test_whitespace(self):
+        raw = json.dumps(self.ITEMS, indent=4).encode('utf-8')
+
+        assert self.ITEMS == list(iter_json_array(chunked(raw, 5)))
+
+    def test_empty(self):
+        assert [] == list(iter_json_array([b' [', b' ] ']))
+
+    def test_lazy(self):
+        def chunks():
+            yield b'[{"guid": "guid1"},'
+            raise AssertionError('read past the first item')
+
+        assert {'guid': 'guid1'} == next(iter_json_array(chunks()))
+
+    def test_not_an_array(self):
+        assert [{'results': []}] == list(iter_json_array([b'{"resu', b'lts": []}']))
+
+    @pytest.mark.parametrize(
+        'raw', [b'[1, 2', b'[1 2]', b'[1, 2] 3', b'[{"guid": ', b'', b'[1,]']
+    )
+    def test_invalid(self, raw):
+        with pytest.raises(json.JSONDecodeError):
+            list(iter_json_array(chunked(raw, 2)))
@@ -0,0 +1,77 @@
+import io
+import json
+
+import pytest
+
+from vt.output import (
+    ITEM_FIELDS,
+    LIST_FIELDS,
+    validate_format,
+    write_object,
+    write_objects,
+)
+from vt.utils import VittlifyError
+
+ITEMS = [
+    {'guid': 'guid1', 'name': 'item1', 'done': False, 'comments': 'a\tb'},
+    {'guid': 'guid2', 'name': 'item2', 'done': True, 'category_name': 'dairy'},
+]
+
+
+class TestValidateFormat:
+    @pytest.mark.parametrize('output_format', ['json', 'ndjson', 'tsv'])
+    def test_known(self, output_format):
+        assert validate_format(output_format) == output_format
+
+    def test_unknown(self):
+        with pytest.raises(VittlifyError):
+            validate_format('yaml')
+
+
+class TestWriteObjects:
+    def test_json(self):
+        out = io.StringIO()
+        write_objects(iter(ITEMS), 'json', ITEM_FIELDS, out=out)
+
+        assert json.loads(out.getvalue()) == ITEMS
+
+    def test_ndjson(self):
+        out = io.StringIO()
+        write_objects(ITEMS, 'ndjson', ITEM_FIELDS, out=out)
+
+        lines = out.getvalue().splitlines()
+        assert [json.loads(line) for line in lines] == ITEMS
+
+    def test_tsv(self):
+        out = io.StringIO()
+        write_objects(ITEMS, 'tsv', ITEM_FIELDS, out=out)
+
+        assert out.getvalue() == (
+            'guid\tname\tdone\tcategory_name\tcomments\n'
+            'guid1\titem1\tFalse\t\t"a\tb"\n'
+            'guid2\titem2\tTrue\tdairy\t\n'
+        )
+
+    def test_empty_json(self):
+        out = io.StringIO()
+        write_objects([], 'json', LIST_FIELDS, out=out)
+
+        assert out.getvalue() == '[]\n'
+
+    def test_unknown(self):
+        with pytest.raises(VittlifyError):
+            write_objects(ITEMS, 'yaml', ITEM_FIELDS, out=io.StringIO())
+
+
+class TestWriteObject:
+    def test_json(self):
+        out = io.StringIO()
+        write_object(ITEMS[0], 'json', ITEM_FIELDS, out=out)
+
+        assert json.loads(out.getvalue()) == ITEMS[0]
+
+    def test_tsv(self):
+        out = io.StringIO()
+        write_object({'guid': 'guid1', 'name': 'list1'}, 'tsv', LIST_FIELDS, out=out)
+
+        assert out.getvalue() == 'guid\tname\nguid1\tlist1\n'
@@ -0,0 +1,92 @@
+import pstats
+
+import pytest
+
+from vt import timings
+from vt.profiling import MemoryProfiler, profile_args, run_profiled
+from vt.utils import VittlifyError
+
+
+class TestProfileArgs:
+    def test_no_profile(self):
+        assert (None, ['list', '-e']) == profile_args(['list', '-e'])
+
+    def test_environment(self, mocker):
+        mocker.patch('vt.profiling.PROFILE', 'CPU')
+
+        assert ('cpu', ['list']) == profile_args(['list'])
+
+    @pytest.mark.parametrize(
+        'args',
+        [
+            ['list', '--profile', 'mem', '-e'],
+            ['list', '--profile=mem', '-e'],
+        ],
+    )
+    def test_option(self, args, mocker):
+        mocker.patch('vt.profiling.PROFILE', 'cpu')
+
+        assert ('mem', ['list', '-e']) == profile_args(args)
+
+    def test_unknown_mode(self):
+        with pytest.raises(VittlifyError):
+            profile_args(['list', '--profile', 'disk'])
+
+
+class TestRunProfiled:
+    @pytest.fixture(autouse=True)
+    def setUp(self, tmp_path, mocker):
+        self.tmp_path = tmp_path
+        mocker.patch('vt.profiling.PROFILE_DIR', str(tmp_path))
+        mocker.patch('vt.profiling.os.getpid', return_value=123)
+
+    def test_cpu(self, capsys):
+        calls = []
+
+        def run(args):
+            calls.append(args)
+            sorted(range(1000), key=lambda x: -x)
+
+        run_profiled(run, ['list', '-e'], 'cpu')
+
+        path = self.tmp_path / 'vt-list-123.pstats'
+        assert [['list', '-e']] == calls
+        assert pstats.Stats(str(path)).total_calls > 0
+        assert str(path) in capsys.readouterr().err
+
+    def test_cpu_written_on_exit(self):
+        def run(args):
+            raise SystemExit(1)
+
+        with pytest.raises(SystemExit):
+            run_profiled(run, ['list'], 'cpu')
+
+        assert (self.tmp_path / 'vt-list-123.pstats').exists()
+
+    def test_mem(self):
+        def run(args):
+            with timings.command('list'):
+                with timings.span('fetch'):
+                    items = [{'name': str(i)} for i in range(1000)]
+                with timings.span('render'):
+                    ''.join(item['name'] for item in items)
+
+        run_profiled(run, ['list'], 'mem')
+
+        report = (self.tmp_path / 'vt-list-123.mem.txt').read_text()
+        assert report.startswith('Peak traced memory:')
+        assert '\nfetch' in report
+        assert '\nrender' in report
+        assert 'test_profiling.py' in report
+        assert [] == timings._observers
+
+
+class TestMemoryProfiler:
+    def test_ignores_other_phases(self):
+        profiler = MemoryProfiler()
+        span = timings.Span('sign', {})
+
+        profiler.enter(span)
+        profiler.exit(span)
+
+        assert [] == profiler.phases
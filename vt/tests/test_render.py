@@ -0,0 +1,182 @@
+import io
+
+import mock
+import pytest
+from terminaltables import AsciiTable, BorderlessTable
+
+from vt.render import (
+    RowFormatter,
+    TableWriter,
+    cell_lines,
+    column_widths,
+    stream_table,
+    visible_width,
+)
+from vt.utils import format_row, print_table, term
+
+ROWS = [
+    ['\x1b[34mabcdefgh\x1b[0m', '  first item'],
+    ['ijklmnop', '+ second item\nwrapped onto a second line', 'comment'],
+    ['qrstuvwx', '  日本'],
+]
+
+
+def _terminaltables(rows, title=None, quiet=False):
+    if quiet:
+        table = BorderlessTable(rows)
+    else:
+        table = AsciiTable(rows)
+        if title:
+            table.title = term.yellow(title)
+    table.inner_heading_row_border = False
+    return table.table + '\n'
+
+
+class TestVisibleWidth:
+    def test_ignores_color(self):
+        assert 3 == visible_width('\x1b[34mabc\x1b[0m')
+
+    def test_wide_characters(self):
+        assert 4 == visible_width('日本')
+
+
+class TestColumnWidths:
+    def test_(self):
+        assert [8, 26, 7] == column_widths(ROWS)
+
+
+class TestStreamTable:
+    @pytest.mark.parametrize('title', [None, 'Title', 'A title wider than column one'])
+    def test_matches_ascii_table(self, title):
+        out = io.StringIO()
+        stream_table(ROWS, title=title, out=out)
+
+        assert _terminaltables(ROWS, title=title) == out.getvalue()
+
+    def test_matches_borderless_table(self):
+        out = io.StringIO()
+        stream_table(ROWS, title='Title', quiet=True, out=out)
+
+        assert _terminaltables(ROWS, quiet=True) == out.getvalue()
+
+    def test_generator_sized_from_sample(self):
+        out = io.StringIO()
+        stream_table(iter(ROWS), out=out, sample_size=3)
+
+        assert _terminaltables(ROWS) == out.getvalue()
+
+    def test_rows_after_sample_are_streamed(self):
+        def rows():
+            yield ['a', 'b']
+            yield ['c', 'longer']
+
+        out = io.StringIO()
+        stream_table(rows(), out=out, sample_size=1)
+
+        assert '+---+---+\n| a | b |\n| c | longer|\n+---+---+\n' == out.getvalue()
+
+    def test_no_data(self, mocker):
+        mocker.patch.object(term, 'red', autospec=True)
+        term.red.return_value = 'No data found.'
+
+        out = io.StringIO()
+        stream_table(iter([]), out=out)
+
+        term.red.assert_called_once_with('No data found.')
+        assert 'No data found.\n' == out.getvalue()
+
+    def test_small_tables_written_at_once(self):
+        out = mock.MagicMock()
+        stream_table(ROWS, out=out)
+
+        assert out.write.call_count == 1
+
+    def test_writes_in_batches(self):
+        out = mock.MagicMock()
+        writer = TableWriter([1], out=out)
+
+        writer.write_header()
+        for _ in range(1000):
+            writer.write_row(['a'])
+        writer.write_footer()
+
+        assert out.write.call_count < 20
+
+
+class TestPrintTableStreaming:
+    def test_large_tables_are_streamed(self, mocker, capsys):
+        mocker.patch('vt.render.STREAM_THRESHOLD', 2)
+        mock_AsciiTable = mocker.patch('terminaltables.AsciiTable')
+
+        print_table(ROWS, title='Title')
+
+        assert not mock_AsciiTable.called
+        assert _terminaltables(ROWS, title='Title') == capsys.readouterr().out
+
+
+class TestRowFormatter:
+    ITEMS = [
+        {'guid': 'abcdefghijkl', 'name': 'milk'},
+        {'guid': 'bcdefghijklm', 'name': 'eggs', 'comments': 'a dozen', 'done': True},
+        {'guid': 'cdefghijklmn', 'name': '日本 ' * 30, 'category_name': 'Dairy'},
+        {
+            'guid': 'defghijklmno',
+            'name': 'tab\tand trailing space ',
+            'comments': 'x\ny',
+        },
+        {
+            'guid': 'efghijklmnop',
+            'name': 'word ' * 40,
+            'comments': 'long comment ' * 10,
+            'done': True,
+        },
+        {'guid': 'fghijklmnopq', 'name': 'bread', 'has_comments': True},
+    ]
+    SHOPPING_LIST = {'name': 'list', 'categories': [{'name': 'Dairy'}]}
+
+    @pytest.fixture(autouse=True, params=[True, False], ids=['styled', 'plain'])
+    def terminal(self, request, mocker):
+        from blessings import Terminal
+
+        mocker.patch.object(
+            term,
+            '_terminal',
+            Terminal(kind='xterm-256color', force_styling=request.param or None),
+        )
+
+    @pytest.mark.parametrize(
+        'options',
+        [
+            {},
+            {'include_comments': True},
+            {'include_category': True, 'include_comments': True},
+            {'no_wrap': True, 'include_comments': True, 'guid_length': 10},
+        ],
+    )
+    def test_cells_measured(self, options):
+        formatter = RowFormatter(self.SHOPPING_LIST, **options)
+
+        for item in self.ITEMS:
+            row = formatter.format(item)
+
+            for cell in row:
+                assert cell_lines(str(cell)) == cell.lines
+                assert [visible_width(line) for line in cell.lines] == cell.widths
+
+    def test_has_comments(self):
+        formatter = RowFormatter(self.SHOPPING_LIST)
+
+        assert '+ bread' in str(formatter.format(self.ITEMS[-1])[1])
+
+    def test_table_matches_terminaltables(self):
+        formatter = RowFormatter(self.SHOPPING_LIST, include_comments=True)
+        out = io.StringIO()
+        stream_table(
+            [formatter.format(item) for item in self.ITEMS], title='list', out=out
+        )
+
+        rows = [
+            format_row(item, self.SHOPPING_LIST, include_comments=True)
+            for item in self.ITEMS
+        ]
+        assert _terminaltables(rows, title='list') == out.getvalue()
@@ -0,0 +1,141 @@
+import pytest
+
+from vt import serialization
+from vt.serialization import (
+    JsonSerializer,
+    accept_header,
+    accepted,
+    for_content_type,
+    get_serializer,
+)
+from vt.utils import VittlifyError
+
+
+def chunked(raw, size):
+    return [raw[i : i + size] for i in range(0, len(raw), size)]
+
+
+ITEMS = [
+    {'guid': 'guid1', 'name': 'café', 'done': False},
+    {'guid': 'guid2', 'name': '牛乳', 'comments': None},
+    456.5,
+    [1, [2, 3]],
+    'string',
+]
+
+
+class TestAccept:
+    @pytest.fixture(autouse=True)
+    def setUp(self, mocker):
+        self.mocker = mocker
+        self.available = mocker.patch('vt.serialization.available', return_value=True)
+
+    def test_auto(self):
+        assert ['msgpack', 'json'] == accepted('auto')
+        assert 'application/msgpack, application/json;q=0.9' == accept_header('auto')
+
+    def test_auto_without_msgpack(self):
+        self.available.return_value = False
+
+        assert ['json'] == accepted('auto')
+        assert 'application/json' == accept_header('auto')
+
+    def test_json(self):
+        assert 'application/json' == accept_header('json')
+
+    def test_msgpack_required(self):
+        self.available.return_value = False
+
+        with pytest.raises(VittlifyError):
+            accepted('msgpack')
+
+    def test_unknown(self):
+        with pytest.raises(VittlifyError):
+            accepted('xml')
+
+    def test_default(self):
+        self.mocker.patch('vt.serialization.SERIALIZATION', 'json')
+
+        assert ['json'] == accepted()
+
+
+class TestForContentType:
+    def test_json(self):
+        assert isinstance(
+            for_content_type('application/json; charset=utf-8'), JsonSerializer
+        )
+
+    @pytest.mark.parametrize('content_type', [None, '', 'text/html'])
+    def test_defaults_to_json(self, content_type):
+        assert isinstance(for_content_type(content_type), JsonSerializer)
+
+    def test_msgpack(self):
+        pytest.importorskip('msgpack')
+
+        assert 'msgpack' == for_content_type('Application/MsgPack').name
+
+    def test_missing_package(self, mocker):
+        mocker.patch.dict(serialization._serializers, clear=True)
+        mocker.patch.dict('sys.modules', {'msgpack': None})
+
+        with pytest.raises(VittlifyError):
+            get_serializer('msgpack')
+
+
+class TestJsonSerializer:
+    def test_round_trip(self):
+        serializer = get_serializer('json')
+
+        assert ITEMS == serializer.loads(serializer.dumps(ITEMS))
+
+    def test_iter_items(self):
+        raw = get_serializer('json').dumps(ITEMS)
+
+        assert ITEMS == list(get_serializer('json').iter_items(chunked(raw, 3)))
+
+
+class TestMsgpackSerializer:
+    @pytest.fixture(autouse=True)
+    def setUp(self):
+        pytest.importorskip('msgpack')
+        self.serializer = get_serializer('msgpack')
+
+    def test_round_trip(self):
+        assert ITEMS == self.serializer.loads(self.serializer.dumps(ITEMS))
+
+    @pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 4096])
+    def test_chunk_boundaries(self, size):
+        raw = self.serializer.dumps(ITEMS)
+
+        assert ITEMS == list(self.serializer.iter_items(chunked(raw, size)))
+
+    def test_large_array(self):
+        items = [{'guid': f'guid{i}'} for i in range(70000)]
+        raw = self.serializer.dumps(items)
+
+        assert items == list(self.serializer.iter_items(chunked(raw, 4096)))
+
+    def test_empty(self):
+        assert [] == list(self.serializer.iter_items([self.serializer.dumps([])]))
+
+    def test_not_an_array(self):
+        raw = self.serializer.dumps({'guid': 'guid1'})
+
+        assert [{'guid': 'guid1'}] == list(self.serializer.iter_items(chunked(raw, 2)))
+
+    def test_lazy(self):
+        first = self.serializer.dumps([{'guid': 'guid1'}, {'guid': 'guid2'}])
+        split = len(first) - len(self.serializer.dumps({'guid': 'guid2'}))
+
+        def chunks():
+            yield first[:split]
+            raise AssertionError('read past the first item')
+
+        items = self.serializer.iter_items(chunks())
+        assert {'guid': 'guid1'} == next(items)
+
+    def test_truncated(self):
+        raw = self.serializer.dumps(ITEMS)
+
+        with pytest.raises(VittlifyError):
+            list(self.serializer.iter_items([raw[:-3]]))
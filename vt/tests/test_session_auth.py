@@ -0,0 +1,98 @@
+import base64
+import hashlib
+import hmac
+import os
+import stat
+import time
+
+import pytest
+
+from vt.session_auth import (
+    EXPIRY_MARGIN,
+    Handshake,
+    Session,
+    SessionStore,
+    validate_auth_mode,
+)
+from vt.utils import VittlifyError
+
+
+class TestSession:
+    def test_authenticate(self):
+        session = Session('session_id', b'secret', time.time() + 300)
+
+        expected = base64.b64encode(
+            hmac.new(b'secret', b'message', hashlib.sha256).digest()
+        ).decode('utf-8')
+        assert {'session': 'session_id', 'hmac': expected} == session.authenticate(
+            b'message'
+        )
+
+    def test_expired(self):
+        assert not Session('id', b'secret', time.time() + EXPIRY_MARGIN + 60).expired()
+        assert Session('id', b'secret', time.time() + EXPIRY_MARGIN - 1).expired()
+
+
+class TestHandshake:
+    def test_both_sides_derive_the_same_secret(self):
+        client = Handshake()
+        server = Handshake()
+
+        client_session = client.complete(
+            {'session': 'id', 'public_key': server.public_key, 'expires_in': 300}
+        )
+        server_session = server.complete(
+            {'session': 'id', 'public_key': client.public_key, 'expires_in': 300}
+        )
+
+        assert 32 == len(client_session.secret)
+        assert client_session.secret == server_session.secret
+        assert not client_session.expired()
+
+    def test_invalid_response(self):
+        with pytest.raises(VittlifyError):
+            Handshake().complete({'session': 'id'})
+
+
+class TestSessionStore:
+    def test_round_trip(self, tmp_path):
+        store = SessionStore(str(tmp_path), namespace='namespace')
+        store.save(Session('id', b'secret', 1234.5))
+
+        session = store.load()
+        assert ('id', b'secret', 1234.5) == (
+            session.session_id,
+            session.secret,
+            session.expires,
+        )
+        assert 0o600 == stat.S_IMODE(os.stat(store.path).st_mode)
+
+    def test_namespaces(self, tmp_path):
+        SessionStore(str(tmp_path), namespace='one').save(Session('id', b'secret', 1))
+
+        assert SessionStore(str(tmp_path), namespace='two').load() is None
+
+    def test_corrupt(self, tmp_path):
+        store = SessionStore(str(tmp_path))
+        os.makedirs(os.path.dirname(store.path))
+        with open(store.path, 'w') as f:
+            f.write('{"session": ')
+
+        assert store.load() is None
+
+    def test_clear(self, tmp_path):
+        store = SessionStore(str(tmp_path))
+        store.save(Session('id', b'secret', 1))
+        store.clear()
+        store.clear()
+
+        assert store.load() is None
+
+
+class TestValidateAuthMode:
+    def test_valid(self):
+        assert 'session' == validate_auth_mode('session')
+
+    def test_invalid(self):
+        with pytest.raises(VittlifyError):
+            validate_auth_mode('password')
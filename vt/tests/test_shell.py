@@ -0,0 +1,110 @@
+import io
+
+import pytest
+
+from vt.guid_index import remember_guids
+from vt.shell import VittlifyShell
+from vt.utils import term
+from vt.vittlify_request import get_all_shopping_lists, get_shopping_list_info
+
+
+class TestVittlifyShell:
+    @pytest.fixture(autouse=True)
+    def setUp(self, mocker):
+        mocker.patch.object(term, 'cyan', side_effect=lambda text: text)
+        mocker.patch.object(term, 'red', side_effect=lambda text: text)
+        self.mock_known_shopping_lists = mocker.patch('vt.shell.known_shopping_lists')
+        self.mock_known_shopping_lists.return_value = [
+            {'guid': 'list_guid', 'name': 'Groceries'},
+            {'guid': 'other_guid', 'name': 'Garden party'},
+        ]
+        self.calls = []
+
+    def run(self, args):
+        self.calls.append(args)
+        print(' '.join(args))
+
+    def shell(self, commands):
+        return VittlifyShell(
+            self.run, stdin=io.StringIO(commands), stdout=io.StringIO()
+        )
+
+    def test_runs_commands_until_eof(self, capsys):
+        shell = self.shell('list groceries\n\nhelp done\n')
+        shell.use_rawinput = False
+        shell.cmdloop(intro='')
+
+        assert [['list', 'groceries'], ['help', 'done']] == self.calls
+
+        out = capsys.readouterr().out.splitlines()
+        assert 'list groceries' == out[0]
+        assert out[1].startswith('(') and out[1].endswith(' ms)')
+        assert 'help done' == out[2]
+
+    def test_exit(self):
+        shell = self.shell('exit\nlists\n')
+        shell.use_rawinput = False
+        shell.cmdloop(intro='')
+
+        assert [] == self.calls
+
+    def test_command_exit_does_not_leave_shell(self, capsys):
+        def run(args):
+            raise SystemExit(1)
+
+        shell = VittlifyShell(run, stdin=io.StringIO('done abc\nlists\n'))
+        shell.use_rawinput = False
+        shell.cmdloop(intro='')
+
+        assert 2 == capsys.readouterr().out.count(' ms)')
+
+    def test_complete_command_names(self):
+        assert ['categories', 'categorize', 'comment', 'comments', 'complete'] == (
+            self.shell('').completenames('c')
+        )
+
+    def test_complete_list_names_and_guids(self):
+        remember_guids([{'guid': 'gabcdef12'}, {'guid': 'abcdef34'}])
+
+        assert ['Groceries', 'gabcdef12'] == self.shell('').completedefault(
+            'g', 'list g', 5, 6
+        )
+
+    def test_complete_skips_options(self):
+        assert [] == self.shell('').completedefault('-', 'list -', 5, 6)
+        assert not self.mock_known_shopping_lists.called
+
+
+class TestCompletionStubServer:
+    @pytest.fixture(autouse=True)
+    def setUp(self, stub_server):
+        self.stub_server = stub_server
+        self.stub_server.handlers['all lists'] = lambda data: [
+            {'guid': 'list_guid', 'name': 'Groceries'}
+        ]
+        self.stub_server.handlers['list'] = lambda data: {
+            'guid': 'other_guid',
+            'name': 'Gifts',
+            'categories': [],
+        }
+        self.shell = VittlifyShell(lambda args: None)
+
+    def test_completes_without_requests(self):
+        assert [] == self.shell.completedefault('g', 'list g', 5, 6)
+        assert [] == self.stub_server.requests
+
+    def test_completes_lists_already_fetched(self, mocker):
+        get_all_shopping_lists()
+        get_shopping_list_info('other_guid')
+        count = len(self.stub_server.requests)
+
+        assert ['Gifts', 'Groceries'] == self.shell.completedefault('g', 'list g', 5, 6)
+        assert count == len(self.stub_server.requests)
+
+    def test_completes_expired_cached_lists(self, mocker):
+        get_all_shopping_lists()
+        mocker.patch('vt.vittlify_request._known_lists', {})
+        mocker.patch.dict('vt.cache.CACHE_TTLS', {'all lists': 0})
+
+        assert ['Groceries'] == self.shell.completedefault('g', 'list g', 5, 6)
+        assert 1 == len(self.stub_server.requests)
@@ -0,0 +1,123 @@
+import base64
+import os
+import shutil
+import subprocess
+import time
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+from vt.ssh_agent import AgentSigner
+from vt.utils import VittlifyError, clear_signers, get_encoded_signature
+
+pytestmark = pytest.mark.skipif(
+    not (shutil.which('ssh-agent') and shutil.which('ssh-add')),
+    reason='OpenSSH agent tools are not installed',
+)
+
+
+def _write_key(path, key):
+    path.write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.OpenSSH,
+            serialization.NoEncryption(),
+        )
+    )
+    path.chmod(0o600)
+
+    public_path = path.with_name(path.name + '.pub')
+    public_path.write_bytes(
+        key.public_key().public_bytes(
+            serialization.Encoding.OpenSSH, serialization.PublicFormat.OpenSSH
+        )
+    )
+    return public_path
+
+
+class TestAgentSigner:
+    @pytest.fixture(autouse=True)
+    def setUp(self, tmp_path, mocker):
+        self.tmp_path = tmp_path
+        self.socket_path = str(tmp_path / 'agent.sock')
+        self.agent = subprocess.Popen(
+            ['ssh-agent', '-D', '-a', self.socket_path],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        for _ in range(50):
+            if os.path.exists(self.socket_path):
+                break
+            time.sleep(0.05)
+
+        mocker.patch.dict(os.environ, {'SSH_AUTH_SOCK': self.socket_path})
+        clear_signers()
+
+        yield
+
+        clear_signers()
+        self.agent.terminate()
+        self.agent.wait()
+
+    def _add_key(self, key, name='id_test'):
+        path = self.tmp_path / name
+        public_path = _write_key(path, key)
+        subprocess.run(
+            ['ssh-add', str(path)],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        return path, public_path
+
+    def test_list_identities(self):
+        key = ed25519.Ed25519PrivateKey.generate()
+        _, public_path = self._add_key(key)
+
+        identities = AgentSigner().list_identities()
+
+        assert len(identities) == 1
+        assert identities[0][0] == base64.b64decode(public_path.read_bytes().split()[1])
+
+    def test_sign_ed25519(self):
+        key = ed25519.Ed25519PrivateKey.generate()
+        path, _ = self._add_key(key)
+
+        # The agent holds the key so the private key file is never needed.
+        path.unlink()
+        os.environ['VT_PRIVATE_KEY'] = str(path)
+        os.environ['VT_SSH_AGENT'] = 'true'
+
+        signature = base64.b64decode(get_encoded_signature(b'test message'))
+        key.public_key().verify(signature, b'test message')
+
+    def test_selects_matching_public_key(self):
+        other_key = ed25519.Ed25519PrivateKey.generate()
+        self._add_key(other_key, name='id_other')
+
+        key = ed25519.Ed25519PrivateKey.generate()
+        _, public_path = self._add_key(key)
+
+        signer = AgentSigner(public_key_filename=str(public_path))
+        key.public_key().verify(signer.sign(b'test message'), b'test message')
+
+    def test_missing_public_key_in_agent(self):
+        self._add_key(ed25519.Ed25519PrivateKey.generate())
+        public_path = _write_key(
+            self.tmp_path / 'id_missing', ed25519.Ed25519PrivateKey.generate()
+        )
+
+        with pytest.raises(VittlifyError):
+            AgentSigner(public_key_filename=str(public_path)).load()
+
+    def test_rsa_not_supported(self):
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        _, public_path = self._add_key(key)
+
+        with pytest.raises(VittlifyError):
+            AgentSigner(public_key_filename=str(public_path)).load()
+
+    def test_no_agent(self):
+        with pytest.raises(VittlifyError):
+            AgentSigner(socket_path=str(self.tmp_path / 'missing.sock')).load()
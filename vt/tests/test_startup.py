@@ -0,0 +1,99 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ('requests', 'urllib3', 'cryptography', 'terminaltables')
+# Importing vt for help or an argument error must cost less than this fraction
+# of importing the modules it defers, measured alongside it so that machine
+# load affects both.
+IMPORT_BUDGET_RATIO = float(os.environ.get('VT_IMPORT_BUDGET_RATIO') or 1)
+DEFERRED_MODULES = (
+    'requests',
+    'cryptography.hazmat.primitives.asymmetric.rsa',
+    'terminaltables',
+    'blessings',
+)
+
+
+def _import_times(args, script=None):
+    script = script or (
+        'from vt.vt import run\n'
+        'try:\n'
+        f'    run({args!r})\n'
+        'except SystemExit:\n'
+        '    pass\n'
+    )
+    env = dict(os.environ)
+    env.pop('VT_DEFAULT_LIST', None)
+    env.pop('VT_PLAIN', None)
+
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', script],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+        env=env,
+    )
+
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        times[name.strip()] = int(cumulative)
+    return proc.stdout, times
+
+
+def _import_budget():
+    script = ''.join(f'import {name}\n' for name in DEFERRED_MODULES)
+    _, times = _import_times(None, script=script)
+    return sum(times[name] for name in DEFERRED_MODULES) * IMPORT_BUDGET_RATIO
+
+
+class TestStartup:
+    @pytest.mark.parametrize(
+        'args',
+        [
+            ['help'],
+            ['help', 'list'],
+            ['unknown'],
+        ],
+    )
+    def test_help_does_not_load_heavy_modules(self, args):
+        stdout, times = _import_times(args)
+
+        assert 'Usage:' in stdout
+        loaded = [name for name in times if name.split('.')[0] in HEAVY_MODULES]
+        assert not loaded
+        assert 'blessings' not in times
+        assert times['vt.vt'] < _import_budget()
+
+    @pytest.mark.parametrize(
+        'args',
+        [
+            ['move'],
+            ['categorize', 'guid'],
+            ['list'],
+        ],
+    )
+    def test_argument_errors_do_not_load_heavy_modules(self, args):
+        stdout, times = _import_times(args)
+
+        assert 'Usage:' in stdout
+        loaded = [name for name in times if name.split('.')[0] in HEAVY_MODULES]
+        assert not loaded
+        assert times['vt.vt'] < _import_budget()
+
+    def test_piped_output_does_not_load_blessings(self):
+        script = (
+            'from vt.utils import print_table, term\n'
+            'print_table([["guid", "name"]], title="title")\n'
+            'print(term.red("error"))\n'
+        )
+        stdout, times = _import_times(None, script=script)
+
+        assert 'blessings' not in times
+        assert '\x1b' not in stdout
+        assert '| guid | name |' in stdout
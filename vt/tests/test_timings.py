@@ -0,0 +1,92 @@
+import json
+import threading
+
+import pytest
+
+from vt import timings
+
+
+class TestSpan:
+    def test_disabled(self):
+        with timings.span('phase', key='value') as span:
+            span.update(other='value')
+
+        assert timings.NULL_SPAN is span
+        assert timings.NULL_SPAN is timings.command('list')
+        assert [] == timings._events
+
+    def test_enabled(self):
+        timings.enable()
+
+        with timings.span('phase', key='value') as span:
+            span.update(other='other value')
+
+        (event,) = timings._events
+        assert 'phase' == event['phase']
+        assert 'value' == event['key']
+        assert 'other value' == event['other']
+        assert event['duration_ms'] >= 0
+        assert threading.current_thread().name == event['thread']
+
+    def test_records_errors(self):
+        timings.enable()
+
+        with pytest.raises(KeyError):
+            with timings.span('phase'):
+                raise KeyError('key')
+
+        assert 'KeyError' == timings._events[0]['error']
+
+
+class TestCommand:
+    @pytest.fixture(autouse=True)
+    def setUp(self, tmp_path, mocker):
+        self.trace_path = tmp_path / 'trace.jsonl'
+        mocker.patch.object(timings, 'TRACE_PATH', str(self.trace_path))
+        timings.enable()
+
+    def _trace(self):
+        return [json.loads(line) for line in self.trace_path.read_text().splitlines()]
+
+    def test_writes_trace_when_command_finishes(self):
+        with timings.command('list'):
+            with timings.span('sign'):
+                pass
+            assert not self.trace_path.exists()
+
+        phases = [event['phase'] for event in self._trace()]
+        assert 'import' in phases
+        assert ['sign', 'command'] == phases[-2:]
+        assert [] == timings._events
+
+    def test_nested_commands_reported_once(self):
+        with timings.command('batch'):
+            with timings.command('list'):
+                pass
+            assert not self.trace_path.exists()
+
+        commands = [
+            event['command'] for event in self._trace() if event['phase'] == 'command'
+        ]
+        assert ['list', 'batch'] == commands
+
+    def test_startup_recorded_once(self):
+        with timings.command('list'):
+            pass
+        with timings.command('list'):
+            pass
+
+        phases = [event['phase'] for event in self._trace()]
+        assert 1 == phases.count('import')
+        assert 2 == phases.count('command')
+
+    def test_report_to_stderr(self, capsys):
+        timings.enable(show_timings=True)
+
+        with timings.command('list'):
+            pass
+
+        out, err = capsys.readouterr()
+        assert '' == out
+        assert 'phase' in err.splitlines()[0]
+        assert 'command=list' in err
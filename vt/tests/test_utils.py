@@ -1,30 +1,40 @@
+import base64
+import hashlib
 import os
-import sys
+import textwrap
 import unittest
 
-import mock
 import pytest
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, padding, rsa
 
 from vt.utils import (
+    LazyTerminal,
+    PlainTerminal,
+    Signer,
+    VittlifyError,
     apply_strikethrough,
+    clear_signers,
     format_row,
+    get_encoded_digest_signature,
     get_encoded_signature,
+    get_signer,
     parse_options,
+    positional_args,
     print_table,
     term,
+    use_plain_output,
 )
 
-PY3 = sys.version_info[0] == 3
-
 
 class TestFormatRow:
     @pytest.fixture(autouse=True)
     def setUp(self, mocker):
-        mocker.patch.object(term, 'blue', autospec=True)
-        mocker.patch.object(term, 'magenta', autospec=True)
+        from blessings import Terminal
 
-        term.blue.return_value = 'guid_Color'
-        term.magenta.return_value = 'name_Color'
+        mocker.patch.object(
+            term, '_terminal', Terminal(kind='xterm-256color', force_styling=True)
+        )
 
         self.mock_shopping_list = {
             'categories': [{'name': 'Type A'}, {'name': 'Type B'}],
@@ -34,42 +44,37 @@ class TestFormatRow:
     def test_no_comments(self):
         item = {'guid': 'asdf', 'name': 'test_name'}
 
-        expected = ['guid_Color', 'name_Color']
+        expected = [term.blue('asdf'), term.magenta('  test_name')]
         actual = format_row(item, self.mock_shopping_list)
 
         assert expected == actual
-        term.blue.assert_called_once_with('asdf')
-        term.magenta.assert_called_once_with('  test_name')
 
     def test_item_with_comments(self):
         item = {'guid': 'asdf', 'name': 'test_name', 'comments': 'test_comments'}
 
-        expected = ['guid_Color', 'name_Color']
+        expected = [term.blue('asdf'), term.magenta('+ test_name')]
         actual = format_row(item, self.mock_shopping_list)
 
         assert expected == actual
-        term.blue.assert_called_once_with('asdf')
-        term.magenta.assert_called_once_with('+ test_name')
 
     def test_item_with_comments_include_comments(self):
         item = {'guid': 'asdf', 'name': 'test_name', 'comments': 'test_comments'}
 
-        expected = ['guid_Color', 'name_Color', 'test_comments']
+        expected = [term.blue('asdf'), term.magenta('+ test_name'), 'test_comments']
         actual = format_row(item, self.mock_shopping_list, include_comments=True)
 
         assert expected == actual
-        term.blue.assert_called_once_with('asdf')
-        term.magenta.assert_called_once_with('+ test_name')
 
     def test_no_comments_done(self):
         item = {'guid': 'asdf', 'name': 'test_name', 'done': True}
 
-        expected = ['guid_Color', 'name_Color']
+        expected = [
+            term.blue(f'{term.dim}asdf{term.normal}'),
+            term.magenta(f'{term.dim}  test_name{term.normal}'),
+        ]
         actual = format_row(item, self.mock_shopping_list)
 
         assert expected == actual
-        term.blue.assert_called_once_with(f'{term.dim}asdf{term.normal}')
-        term.magenta.assert_called_once_with(f'  {term.dim}test_name{term.normal}')
 
     def test_item_with_comments_done(self):
         item = {
@@ -79,12 +84,13 @@ class TestFormatRow:
             'done': True,
         }
 
-        expected = ['guid_Color', 'name_Color']
+        expected = [
+            term.blue(f'{term.dim}asdf{term.normal}'),
+            term.magenta(f'{term.dim}+ test_name{term.normal}'),
+        ]
         actual = format_row(item, self.mock_shopping_list)
 
         assert expected == actual
-        term.blue.assert_called_once_with(f'{term.dim}asdf{term.normal}')
-        term.magenta.assert_called_once_with(f'+ {term.dim}test_name{term.normal}')
 
     def test_item_with_comments_include_comments_done(self):
         item = {
@@ -94,12 +100,14 @@ class TestFormatRow:
             'done': True,
         }
 
-        expected = ['guid_Color', 'name_Color', 'test_comments']
+        expected = [
+            term.blue(f'{term.dim}asdf{term.normal}'),
+            term.magenta(f'{term.dim}+ test_name{term.normal}'),
+            f'{term.dim}test_comments{term.normal}',
+        ]
         actual = format_row(item, self.mock_shopping_list, include_comments=True)
 
         assert expected == actual
-        term.blue.assert_called_once_with(f'{term.dim}asdf{term.normal}')
-        term.magenta.assert_called_once_with(f'+ {term.dim}test_name{term.normal}')
 
     def test_categories(self):
         self.mock_shopping_list['categories'] = ['type A', 'type B']
@@ -112,45 +120,56 @@ class TestFormatRow:
             'done': True,
         }
 
-        expected = ['guid_Color', 'type A', 'name_Color']
+        expected = [
+            term.blue(f'{term.dim}asdf{term.normal}'),
+            f'{term.dim}type A{term.normal}',
+            term.magenta(f'{term.dim}+ test_name{term.normal}'),
+        ]
         actual = format_row(
             item, self.mock_shopping_list, include_comments=False, include_category=True
         )
 
         assert expected == actual
-        term.blue.assert_called_once_with(f'{term.dim}asdf{term.normal}')
-        term.magenta.assert_called_once_with(f'+ {term.dim}test_name{term.normal}')
+
+    def test_no_category_column(self):
+        self.mock_shopping_list['categories'] = []
+        item = {'guid': 'asdfghjkl', 'name': 'test_name', 'category_name': 'type A'}
+
+        expected = [term.blue('asdfghjk'), term.magenta('  test_name')]
+        actual = format_row(item, self.mock_shopping_list, include_category=True)
+
+        assert expected == actual
 
 
 class TestPrintTable:
     @pytest.fixture(autouse=True)
     def setUp(self, mocker):
         mocker.patch.object(term, 'red', autospec=True)
-        mocker.patch.object(term, 'yellow', autospec=True)
-
-        self.AsciiTable_patcher = mock.patch('vt.utils.AsciiTable')
-        self.mock_AsciiTable = self.AsciiTable_patcher.start()
-
-        yield
-        self.AsciiTable_patcher.stop()
+        mocker.patch.object(term, 'yellow', side_effect=lambda text: text)
 
     def test_no_data(self):
         print_table([])
         term.red.assert_called_once_with("No data found.")
 
-    def test_data_no_title(self):
-        print_table(['test_data'])
+    def test_data_no_title(self, capsys):
+        print_table([['test', 'data']])
 
-        self.mock_AsciiTable.assert_called_once_with(['test_data'])
-        assert self.mock_AsciiTable.return_value.inner_heading_row_border is False
+        assert capsys.readouterr().out == (
+            '+------+------+\n' '| test | data |\n' '+------+------+\n'
+        )
+
+    def test_data_with_title(self, capsys):
+        print_table([['test', 'data']], title='test_title')
+
+        term.yellow.assert_called_once_with('test_title')
+        assert capsys.readouterr().out == (
+            '+test_title---+\n' '| test | data |\n' '+------+------+\n'
+        )
 
-    def test_data_with_title(self):
-        print_table(['test_data'], title='test_title')
+    def test_quiet(self, capsys):
+        print_table([['test', 'data']], title='test_title', quiet=True)
 
-        self.mock_AsciiTable.assert_called_once_with(['test_data'])
-        assert self.mock_AsciiTable.return_value.inner_heading_row_border is False
-        term.yellow.assert_called_once_with("test_title")
-        assert self.mock_AsciiTable.return_value.title == term.yellow.return_value
+        assert capsys.readouterr().out == ' test  data \n'
 
 
 class TestParseOptions(unittest.TestCase):
@@ -161,6 +180,27 @@ class TestParseOptions(unittest.TestCase):
 
         assert expected == actual
 
+    def test_format(self):
+        raw_options = ['asdf', '--format', 'JSON']
+        expected = {'output_format': 'json'}
+        actual = parse_options(raw_options)
+
+        assert expected == actual
+
+        raw_options = ['--format=tsv', 'asdf']
+        expected = {'output_format': 'tsv'}
+        actual = parse_options(raw_options)
+
+        assert expected == actual
+
+    def test_paging(self):
+        raw_options = ['--limit', '10', 'asdf', '--page=2']
+        expected = {'limit': '10', 'page': '2'}
+        actual = parse_options(raw_options)
+
+        assert expected == actual
+        assert ['asdf'] == positional_args(raw_options)
+
     def test_extended(self):
         raw_options = ['asdf', '-e']
         expected = {'extended': True}
@@ -326,6 +366,63 @@ class TestParseOptions(unittest.TestCase):
         assert expected == actual
 
 
+class TestPositionalArgs:
+    def test_skips_flags(self):
+        assert positional_args(['-e', 'asdf', '--quiet', 'qwer']) == ['asdf', 'qwer']
+
+    def test_skips_format_value(self):
+        assert positional_args(['--format', 'json', 'asdf']) == ['asdf']
+        assert positional_args(['--format=json', 'asdf']) == ['asdf']
+
+
+class TestPlainOutput:
+    @pytest.fixture(autouse=True)
+    def setUp(self, mocker):
+        mocker.patch.dict(os.environ)
+        os.environ.pop('VT_PLAIN', None)
+        # pytest swaps sys.stdout while capturing so patch the module utils sees
+        self.mock_stdout = mocker.patch('vt.utils.sys').stdout
+        self.mock_stdout.isatty.return_value = False
+
+    def test_not_a_tty(self):
+        assert use_plain_output()
+
+    def test_tty(self):
+        self.mock_stdout.isatty.return_value = True
+
+        assert not use_plain_output()
+
+    def test_env(self):
+        os.environ['VT_PLAIN'] = 'false'
+        assert not use_plain_output()
+
+        self.mock_stdout.isatty.return_value = True
+        os.environ['VT_PLAIN'] = 'True'
+        assert use_plain_output()
+
+    def test_plain_terminal(self):
+        terminal = LazyTerminal()
+
+        assert terminal.width is None
+        assert '' == terminal.normal
+        assert 'text' == terminal.blue('text')
+
+    def test_set_plain(self):
+        self.mock_stdout.isatty.return_value = True
+        terminal = LazyTerminal()
+        terminal.set_plain(True)
+
+        assert isinstance(terminal._get_terminal(), PlainTerminal)
+
+    def test_format_row(self, mocker):
+        mocker.patch.object(term, '_terminal', PlainTerminal())
+        item = {'guid': 'abcdefghij', 'name': 'word ' * 20, 'done': True}
+
+        assert ['abcdefgh', textwrap.fill('  ' + 'word ' * 20, width=70)] == format_row(
+            item
+        )
+
+
 @pytest.mark.skip('Not sure what to do about strikethroughs yet')
 class TestApplyStrikethrough:
     def test_plain_string(self):
@@ -350,68 +447,130 @@ class TestApplyStrikethrough:
         assert expected == actual
 
 
-class TestGetEncodedSignature(unittest.TestCase):
-    def setUp(self):
-        mock_environ = dict(os.environ)
-        mock_environ['VT_PRIVATE_KEY'] = 'test_key_location'
-
-        self.environ_patcher = mock.patch('vt.utils.os.environ', mock_environ)
-        self.environ_patcher.start()
+class TestSigner:
+    @pytest.fixture(autouse=True)
+    def setUp(self, tmp_path, mocker):
+        self.tmp_path = tmp_path
+        self.rsa_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.ed25519_key = ed25519.Ed25519PrivateKey.generate()
 
-        self.open_patcher = mock.patch('builtins.open' if PY3 else '__builtin__.open')
-        self.mock_open = self.open_patcher.start()
+        mocker.patch.dict(os.environ)
+        clear_signers()
 
-        self.b64encode_patcher = mock.patch('vt.utils.base64.b64encode')
-        self.mock_b64encode = self.b64encode_patcher.start()
+        yield
+        clear_signers()
+
+    def _write_key(self, key, private_format):
+        path = self.tmp_path / 'id_test'
+        path.write_bytes(
+            key.private_bytes(
+                serialization.Encoding.PEM,
+                private_format,
+                serialization.NoEncryption(),
+            )
+        )
+        os.environ['VT_PRIVATE_KEY'] = str(path)
+        return path
+
+    def _verify_rsa(self, signature, message):
+        self.rsa_key.public_key().verify(
+            signature,
+            message,
+            padding.PSS(
+                mgf=padding.MGF1(hashes.SHA512()), salt_length=padding.PSS.MAX_LENGTH
+            ),
+            hashes.SHA512(),
+        )
 
-        self.load_pem_private_key_patcher = mock.patch(
-            'vt.utils.serialization.load_pem_private_key'
+    @pytest.mark.parametrize(
+        'key_name, private_format, key_type',
+        [
+            ('rsa_key', serialization.PrivateFormat.TraditionalOpenSSL, Signer.RSA),
+            ('rsa_key', serialization.PrivateFormat.PKCS8, Signer.RSA),
+            ('rsa_key', serialization.PrivateFormat.OpenSSH, Signer.RSA),
+            ('ed25519_key', serialization.PrivateFormat.PKCS8, Signer.ED25519),
+            ('ed25519_key', serialization.PrivateFormat.OpenSSH, Signer.ED25519),
+        ],
+    )
+    def test_key_type(self, key_name, private_format, key_type):
+        path = self._write_key(getattr(self, key_name), private_format)
+        signer = Signer(str(path))
+
+        signer.load()
+
+        assert key_type == signer.key_type
+
+    def test_unsupported_key(self):
+        path = self._write_key(
+            ec.generate_private_key(ec.SECP256R1()), serialization.PrivateFormat.PKCS8
         )
-        self.mock_load_pem_private_key = self.load_pem_private_key_patcher.start()
 
-        self.default_backend_patcher = mock.patch('vt.utils.default_backend')
-        self.mock_default_backend = self.default_backend_patcher.start()
+        with pytest.raises(VittlifyError, match='Unsupported private key'):
+            Signer(str(path)).load()
 
-        self.padding_patcher = mock.patch('vt.utils.padding')
-        self.mock_padding = self.padding_patcher.start()
+    def test_invalid_key(self):
+        path = self.tmp_path / 'id_test'
+        path.write_bytes(b'not a key')
 
-        self.hashes_patcher = mock.patch('vt.utils.hashes')
-        self.mock_hashes = self.hashes_patcher.start()
+        with pytest.raises(VittlifyError, match='Could not load private key'):
+            Signer(str(path)).load()
 
-    def tearDown(self):
-        self.environ_patcher.stop()
-        self.open_patcher.stop()
-        self.b64encode_patcher.stop()
-        self.load_pem_private_key_patcher.stop()
-        self.default_backend_patcher.stop()
-        self.padding_patcher.stop()
-        self.hashes_patcher.stop()
+    def test_rsa_pem(self):
+        self._write_key(self.rsa_key, serialization.PrivateFormat.TraditionalOpenSSL)
 
-    def test_(self):
-        test_message = 'tests message'
+        signature = base64.b64decode(get_encoded_signature(b'test message'))
+        self._verify_rsa(signature, b'test message')
 
-        expected = self.mock_b64encode.return_value
-        actual = get_encoded_signature(test_message)
+    def test_openssh_rsa(self):
+        self._write_key(self.rsa_key, serialization.PrivateFormat.OpenSSH)
 
-        assert expected == actual
-        self.mock_b64encode.assert_called_once_with(
-            self.mock_load_pem_private_key.return_value.sign.return_value
-        )
-        self.mock_load_pem_private_key.assert_called_once_with(
-            self.mock_open.return_value.__enter__.return_value.read.return_value,
-            None,
-            self.mock_default_backend.return_value,
-        )
+        signature = base64.b64decode(get_encoded_signature(b'test message'))
+        self._verify_rsa(signature, b'test message')
 
-        self.mock_load_pem_private_key.return_value.sign.assert_called_once_with(
-            test_message,
-            self.mock_padding.PSS.return_value,
-            self.mock_hashes.SHA512.return_value,
-        )
-        self.mock_padding.PSS.assert_called_once_with(
-            mgf=self.mock_padding.MGF1.return_value,
-            salt_length=self.mock_padding.PSS.MAX_LENGTH,
-        )
-        self.mock_padding.MGF1.assert_called_once_with(
-            self.mock_hashes.SHA512.return_value
-        )
+    @pytest.mark.parametrize(
+        'private_format',
+        [serialization.PrivateFormat.OpenSSH, serialization.PrivateFormat.PKCS8],
+    )
+    def test_ed25519(self, private_format):
+        self._write_key(self.ed25519_key, private_format)
+
+        signature = base64.b64decode(get_encoded_signature(b'test message'))
+        self.ed25519_key.public_key().verify(signature, b'test message')
+
+    @pytest.mark.parametrize(
+        'private_format',
+        [
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.PrivateFormat.OpenSSH,
+        ],
+    )
+    def test_rsa_digest(self, private_format):
+        self._write_key(self.rsa_key, private_format)
+        digest = hashlib.sha512(b'test message').digest()
+
+        signature = base64.b64decode(get_encoded_digest_signature(digest))
+        # A prehashed signature verifies against the message itself
+        self._verify_rsa(signature, b'test message')
+
+    def test_ed25519_digest(self):
+        self._write_key(self.ed25519_key, serialization.PrivateFormat.OpenSSH)
+        digest = hashlib.sha512(b'test message').digest()
+
+        signature = base64.b64decode(get_encoded_digest_signature(digest))
+        self.ed25519_key.public_key().verify(signature, digest)
+
+    def test_key_loaded_once(self, mocker):
+        self._write_key(self.ed25519_key, serialization.PrivateFormat.OpenSSH)
+        mock_load = mocker.spy(Signer, 'load')
+
+        get_encoded_signature(b'first message')
+        get_encoded_signature(b'second message')
+
+        assert mock_load.call_count == 1
+        assert get_signer() is get_signer()
+
+    def test_missing_key(self):
+        os.environ['VT_PRIVATE_KEY'] = str(self.tmp_path / 'missing')
+
+        with pytest.raises(VittlifyError):
+            get_encoded_signature(b'test message')
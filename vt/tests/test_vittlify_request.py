@@ -1,21 +1,41 @@
+import json
+import time
 import unittest
 
 import mock
+import pytest
+import requests
 
+from vt import vittlify_request
+from vt.bulk import run_bulk
+from vt.tests.stub_server import paged_handler
 from vt.vittlify_request import (
     VittlifyError,
     _get_proxy_dict,
+    _remaining,
     _send_request,
     add_item,
+    clear_auth_session,
+    close_session,
+    command_deadline,
     complete_item,
+    complete_operation,
+    get_capabilities,
     get_all_shopping_list_items,
     get_all_shopping_lists,
     get_completed,
     get_item,
+    get_page,
+    get_session,
+    get_session_store,
     get_shopping_list_info,
     get_shopping_list_items,
+    iter_items,
+    iter_pages,
     modify_item,
     move_item,
+    run_bulk_requests,
+    send_batch,
 )
 
 
@@ -56,19 +76,57 @@ class TestGetProxy(unittest.TestCase):
         self.assertEqual(expected, actual)
 
 
-class TestSendRequest(unittest.TestCase):
+class TestGetSession(unittest.TestCase):
     def setUp(self):
-        self.PROXY_patcher = mock.patch('vt.vittlify_request.PROXY', 'PROXY')
+        self._session_patcher = mock.patch('vt.vittlify_request._session', None)
+        self._session_patcher.start()
+
+        self.PROXY_patcher = mock.patch('vt.vittlify_request.PROXY', None)
         self.PROXY_patcher.start()
 
+    def tearDown(self):
+        self._session_patcher.stop()
+        self.PROXY_patcher.stop()
+
+    def test_reuses_session(self):
+        session = get_session()
+
+        self.assertIs(session, get_session())
+        self.assertEqual('keep-alive', session.headers['Connection'])
+
+    def test_pool_size(self):
+        with mock.patch('vt.vittlify_request.POOL_SIZE', 3):
+            session = get_session()
+
+        adapter = session.get_adapter('https://www.example.com')
+        self.assertEqual(3, adapter._pool_maxsize)
+
+    def test_proxy(self):
+        with mock.patch('vt.vittlify_request.PROXY', 'socks5://www.example.com:80'):
+            session = get_session()
+
+        self.assertEqual(
+            {
+                'http': 'socks5://www.example.com:80',
+                'https': 'socks5://www.example.com:80',
+            },
+            session.proxies,
+        )
+
+    def test_close_session(self):
+        session = get_session()
+        close_session()
+
+        self.assertIsNot(session, get_session())
+
+
+class TestSendRequest(unittest.TestCase):
+    def setUp(self):
         self.REQUEST_TIMEOUT_patcher = mock.patch(
             'vt.vittlify_request.REQUEST_TIMEOUT', 'REQUEST_TIMEOUT'
         )
         self.REQUEST_TIMEOUT_patcher.start()
 
-        self._get_proxy_dict_patcher = mock.patch('vt.vittlify_request._get_proxy_dict')
-        self.mock_get_proxy_dict = self._get_proxy_dict_patcher.start()
-
         self.VITTLIFY_URL_patcher = mock.patch(
             'vt.vittlify_request.VITTLIFY_URL', 'VITTLIFY_URL/'
         )
@@ -85,98 +143,88 @@ class TestSendRequest(unittest.TestCase):
         )
         self.mock_get_encoded_signature = self.get_encoded_signature_patcher.start()
 
-        self.requests_patcher = mock.patch('vt.vittlify_request.requests')
-        self.mock_requests = self.requests_patcher.start()
+        self.get_session_patcher = mock.patch('vt.vittlify_request.get_session')
+        self.mock_get_session = self.get_session_patcher.start()
+        self.mock_request = self.mock_get_session.return_value.request
+        self.mock_request.return_value.status_code = 200
+
+        self.uuid4_patcher = mock.patch('uuid.uuid4')
+        self.mock_uuid4 = self.uuid4_patcher.start()
+        self.mock_uuid4.return_value.hex = 'idempotency_key'
 
     def tearDown(self):
+        self.uuid4_patcher.stop()
         self.json_patcher.stop()
         self.get_encoded_signature_patcher.stop()
-        self.requests_patcher.stop()
+        self.get_session_patcher.stop()
         self.VITTLIFY_URL_patcher.stop()
         self.USERNAME_patcher.stop()
-        self._get_proxy_dict_patcher.stop()
-        self.PROXY_patcher.stop()
         self.REQUEST_TIMEOUT_patcher.stop()
 
-    def test_get(self):
-        test_data = {'data': 'test_data'}
-        expected = self.mock_requests.get.return_value.json.return_value
-        actual = _send_request('get', test_data)
-
-        self.assertEqual(expected, actual)
+    def _assert_request(self, method, headers=None):
         self.mock_json.dumps.assert_called_once_with(
             {'data': 'test_data', 'username': 'USERNAME'}
         )
         self.mock_get_encoded_signature.assert_called_once_with(
             self.mock_json.dumps.return_value.encode.return_value
         )
-        self.mock_get_proxy_dict.assert_called_once_with('PROXY')
-        self.mock_requests.get.assert_called_once_with(
+        self.mock_request.assert_called_once_with(
+            method,
             'VITTLIFY_URL/vt/',
             json={
                 'message': self.mock_json.dumps.return_value,
                 'signature': self.mock_get_encoded_signature.return_value.decode.return_value,
             },
-            proxies=self.mock_get_proxy_dict.return_value,
+            headers=headers or {},
             timeout='REQUEST_TIMEOUT',
+            stream=False,
         )
 
+    def test_get(self):
+        test_data = {'data': 'test_data'}
+        expected = self.mock_request.return_value.json.return_value
+        actual = _send_request('get', test_data)
+
+        self.assertEqual(expected, actual)
+        self._assert_request('GET')
+
     def test_put(self):
         test_data = {'data': 'test_data'}
-        expected = self.mock_requests.put.return_value.json.return_value
+        expected = self.mock_request.return_value.json.return_value
         actual = _send_request('put', test_data)
 
         self.assertEqual(expected, actual)
-        self.mock_json.dumps.assert_called_once_with(
-            {'data': 'test_data', 'username': 'USERNAME'}
-        )
-        self.mock_get_encoded_signature.assert_called_once_with(
-            self.mock_json.dumps.return_value.encode.return_value
-        )
-        self.mock_get_proxy_dict.assert_called_once_with('PROXY')
-        self.mock_requests.put.assert_called_once_with(
-            'VITTLIFY_URL/vt/',
-            json={
-                'message': self.mock_json.dumps.return_value,
-                'signature': self.mock_get_encoded_signature.return_value.decode.return_value,
-            },
-            proxies=self.mock_get_proxy_dict.return_value,
-            timeout='REQUEST_TIMEOUT',
-        )
+        self._assert_request('PUT', {'Idempotency-Key': 'idempotency_key'})
 
     def test_post(self):
         test_data = {'data': 'test_data'}
-        expected = self.mock_requests.post.return_value.json.return_value
+        expected = self.mock_request.return_value.json.return_value
         actual = _send_request('post', test_data)
 
         self.assertEqual(expected, actual)
-        self.mock_json.dumps.assert_called_once_with(
-            {'data': 'test_data', 'username': 'USERNAME'}
-        )
-        self.mock_get_encoded_signature.assert_called_once_with(
-            self.mock_json.dumps.return_value.encode.return_value
-        )
-        self.mock_get_proxy_dict.assert_called_once_with('PROXY')
-        self.mock_requests.post.assert_called_once_with(
-            'VITTLIFY_URL/vt/',
-            json={
-                'message': self.mock_json.dumps.return_value,
-                'signature': self.mock_get_encoded_signature.return_value.decode.return_value,
-            },
-            proxies=self.mock_get_proxy_dict.return_value,
-            timeout='REQUEST_TIMEOUT',
-        )
+        self._assert_request('POST', {'Idempotency-Key': 'idempotency_key'})
+
+    def test_reuses_session(self):
+        _send_request('get', {'data': 'test_data'})
+        _send_request('put', {'data': 'test_data'})
+
+        self.assertEqual(2, self.mock_request.call_count)
+        self.assertEqual(2, self.mock_get_session.call_count)
+
+    def test_unsupported_method(self):
+        self.assertRaises(VittlifyError, _send_request, 'delete', {})
+        self.assertFalse(self.mock_request.called)
 
     def test_raises_vittlify_error_for_404(self):
         test_data = {'data': 'test_data'}
 
-        self.mock_requests.get.return_value.status_code = 404
+        self.mock_request.return_value.status_code = 404
         self.assertRaises(VittlifyError, _send_request, 'get', test_data)
 
     def test_raises_vittlify_error_for_409(self):
         test_data = {'data': 'test_data'}
 
-        self.mock_requests.get.return_value.status_code = 409
+        self.mock_request.return_value.status_code = 409
         self.assertRaises(VittlifyError, _send_request, 'get', test_data)
 
 
@@ -250,6 +298,19 @@ class TestGetShoppingListItems(unittest.TestCase):
             'GET', {'endpoint': 'list items', 'guid': 'test_guid'}
         )
 
+    def test_page_params(self):
+        get_shopping_list_items('test_guid', page_size=50, cursor='abc')
+
+        self.mock_send_request.assert_called_once_with(
+            'GET',
+            {
+                'endpoint': 'list items',
+                'guid': 'test_guid',
+                'page_size': 50,
+                'cursor': 'abc',
+            },
+        )
+
 
 class TestGetAllShoppingListItems(unittest.TestCase):
     def setUp(self):
@@ -482,3 +543,737 @@ class TestMoveItem(unittest.TestCase):
                 'to_list_guid': test_to_guid,
             },
         )
+
+
+class TestPagingStubServer:
+    ITEMS = [{'guid': f'guid{i}', 'name': f'item{i}'} for i in range(10)]
+
+    @pytest.fixture(autouse=True)
+    def setUp(self, stub_server):
+        self.stub_server = stub_server
+        self.stub_server.handlers['list all items'] = paged_handler(self.ITEMS)
+        self.stub_server.handlers['completed'] = lambda data: self.ITEMS
+
+    def fetch(self, **kwargs):
+        return get_all_shopping_list_items('test_guid', **kwargs)
+
+    def test_iter_pages(self):
+        pages = list(iter_pages(self.fetch, page_size=4))
+
+        assert [4, 4, 2] == [len(page) for page in pages]
+        assert [None, '4', '8'] == [
+            request['data'].get('cursor') for request in self.stub_server.requests
+        ]
+
+    def test_iter_items_unpaged(self):
+        assert self.ITEMS == list(iter_items(self.fetch))
+        assert 'page_size' not in self.stub_server.requests[0]['data']
+
+    def test_prefetches_next_page(self):
+        self.stub_server.latency = 0.2
+
+        start = time.monotonic()
+        for page in iter_pages(self.fetch, page_size=5):
+            # Stand in for rendering the page while the next one downloads
+            time.sleep(0.2)
+        elapsed = time.monotonic() - start
+
+        # Without prefetching this takes four latencies
+        assert elapsed < 3.5 * 0.2
+
+    def test_stops_prefetch_when_closed(self):
+        pages = iter_pages(self.fetch, page_size=2)
+        next(pages)
+        pages.close()
+        time.sleep(0.05)
+
+        # Only the first page and the prefetched second page were requested
+        assert len(self.stub_server.requests) <= 2
+
+    def test_get_page(self):
+        assert self.ITEMS[3:6] == get_page(self.fetch, page=2, page_size=3)
+        assert {'page': 2, 'page_size': 3} == {
+            key: self.stub_server.requests[0]['data'][key]
+            for key in ('page', 'page_size')
+        }
+
+    def test_get_page_without_server_paging(self):
+        assert self.ITEMS[3:6] == get_page(get_completed, page=2, page_size=3)
+
+
+class TestStreamRequestStubServer:
+    ITEMS = [{'guid': f'guid{i}', 'name': f'item{i}'} for i in range(100)]
+
+    @pytest.fixture(autouse=True)
+    def setUp(self, stub_server):
+        self.stub_server = stub_server
+        self.stub_server.handlers['completed'] = lambda data: self.ITEMS
+        self.stub_server.handlers['list items'] = lambda data: (404, 'List not found')
+
+    def test_streams_items(self):
+        items = get_completed(stream=True)
+
+        assert not isinstance(items, list)
+        assert self.ITEMS == list(items)
+
+    def test_not_cached(self):
+        list(get_completed(stream=True))
+        list(get_completed(stream=True))
+
+        assert ['completed', 'completed'] == self.stub_server.endpoints()
+
+    def test_error(self):
+        with pytest.raises(VittlifyError):
+            get_shopping_list_items('test_guid', stream=True)
+
+
+class TestCompressionStubServer:
+    ITEMS = [{'guid': f'guid{i}', 'name': f'item{i}'} for i in range(200)]
+
+    @pytest.fixture(autouse=True)
+    def setUp(self, stub_server, mocker):
+        self.stub_server = stub_server
+        self.stub_server.handlers['list all items'] = lambda data: self.ITEMS
+        self.stub_server.handlers['add item'] = lambda data: {
+            'guid': 'item_guid',
+            'name': data['name'],
+            'comments': data['comments'],
+        }
+        self.mocker = mocker
+
+    def test_requests_uncompressed_by_default(self):
+        add_item('list_guid', 'item', comments='x' * 5000)
+
+        request = self.stub_server.requests[0]
+        assert 'Content-Encoding' not in request['headers']
+        assert self.stub_server.bytes_received > 5000
+
+    def test_large_requests_compressed(self):
+        self.mocker.patch('vt.vittlify_request.COMPRESS_REQUESTS', True)
+
+        item = add_item('list_guid', 'item', comments='x' * 5000)
+
+        request = self.stub_server.requests[0]
+        assert 'gzip' == request['headers']['Content-Encoding']
+        assert 'x' * 5000 == request['data']['comments'] == item['comments']
+        assert self.stub_server.bytes_received < 1000
+
+    def test_small_requests_not_compressed(self):
+        self.mocker.patch('vt.vittlify_request.COMPRESS_REQUESTS', True)
+
+        add_item('list_guid', 'item')
+
+        assert 'Content-Encoding' not in self.stub_server.requests[0]['headers']
+
+    @pytest.mark.parametrize('stream', [False, True])
+    def test_compressed_responses(self, stream):
+        self.stub_server.compress_responses = True
+
+        items = get_all_shopping_list_items('list_guid', stream=stream)
+
+        assert self.ITEMS == list(items)
+        assert self.stub_server.bytes_sent < len(json.dumps(self.ITEMS)) / 4
+
+    def test_accept_encoding(self):
+        self.mocker.patch('vt.vittlify_request.ACCEPT_ENCODING', 'identity')
+        close_session()
+        self.stub_server.compress_responses = True
+
+        assert self.ITEMS == get_all_shopping_list_items('list_guid')
+        assert 'identity' == self.stub_server.requests[0]['headers']['Accept-Encoding']
+        assert len(json.dumps(self.ITEMS)) == self.stub_server.bytes_sent
+
+
+class TestRetryStubServer:
+    @pytest.fixture(autouse=True)
+    def setUp(self, stub_server, mocker):
+        self.stub_server = stub_server
+        self.stub_server.fault_delay = 0.5
+        self.stub_server.handlers['all lists'] = lambda data: [{'guid': 'list_guid'}]
+
+        self.completed = []
+
+        def complete(data):
+            self.completed.append(data['guid'])
+            return {'guid': data['guid'], 'done': True}
+
+        self.stub_server.handlers['complete'] = complete
+
+        mocker.patch('vt.vittlify_request.REQUEST_TIMEOUT', (1, 0.2))
+        mocker.patch('vt.vittlify_request.RETRY_BACKOFF', 0.01)
+        mocker.patch('vt.vittlify_request.MAX_RETRIES', 3)
+
+    def test_retries_dropped_connection(self):
+        self.stub_server.faults = ['drop']
+
+        assert [{'guid': 'list_guid'}] == get_all_shopping_lists()
+        assert ['all lists', 'all lists'] == self.stub_server.endpoints()
+
+    def test_retries_unavailable(self):
+        self.stub_server.faults = [503, 502]
+
+        assert [{'guid': 'list_guid'}] == get_all_shopping_lists()
+        assert 3 == len(self.stub_server.requests)
+
+    def test_retries_stream_request(self):
+        self.stub_server.handlers['list all items'] = lambda data: [{'guid': 'a'}]
+        self.stub_server.faults = [503]
+
+        assert [{'guid': 'a'}] == list(get_all_shopping_list_items('g', stream=True))
+        assert 2 == len(self.stub_server.requests)
+
+    def test_gives_up_after_max_retries(self):
+        self.stub_server.faults = [503] * 5
+
+        with pytest.raises(requests.exceptions.HTTPError):
+            get_all_shopping_lists()
+        assert 4 == len(self.stub_server.requests)
+
+    def test_does_not_retry_client_errors(self):
+        self.stub_server.faults = [400]
+
+        with pytest.raises(requests.exceptions.HTTPError):
+            get_all_shopping_lists()
+        assert 1 == len(self.stub_server.requests)
+
+    def test_timed_out_mutation_applied_once(self):
+        self.stub_server.capabilities = ['idempotency']
+        self.stub_server.faults = ['slow']
+
+        assert {'guid': 'item_guid', 'done': True} == complete_item('item_guid')
+        assert ['item_guid'] == self.completed
+
+        first, second = [
+            request
+            for request in self.stub_server.requests
+            if request['data']['endpoint'] == 'complete'
+        ]
+        assert first['headers']['Idempotency-Key']
+        assert (
+            first['headers']['Idempotency-Key'] == second['headers']['Idempotency-Key']
+        )
+
+    def test_timed_out_mutation_not_retried_without_idempotency(self):
+        self.stub_server.replay = lambda key: None
+        self.stub_server.faults = ['slow']
+
+        with pytest.raises(requests.exceptions.Timeout):
+            complete_item('item_guid')
+
+        # The server applied the mutation but the client cannot know that
+        assert ['item_guid'] == self.completed
+        assert ['complete', 'capabilities'] == self.stub_server.endpoints()
+
+    @pytest.mark.parametrize('fault', ['drop', 502])
+    def test_mutation_not_retried_without_idempotency(self, fault):
+        self.stub_server.replay = lambda key: None
+        self.stub_server.faults = [fault]
+
+        with pytest.raises(requests.exceptions.RequestException):
+            complete_item('item_guid')
+
+        assert ['complete', 'capabilities'] == self.stub_server.endpoints()
+
+    def test_mutation_retried_when_connection_refused(self, mocker):
+        import socket
+
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        mocker.patch('vt.vittlify_request.VITTLIFY_URL', f'http://127.0.0.1:{port}/')
+        mock_get_capabilities = mocker.patch('vt.vittlify_request.get_capabilities')
+        retry_delay = mocker.spy(vittlify_request, '_retry_delay')
+
+        with pytest.raises(requests.exceptions.ConnectionError):
+            complete_item('item_guid')
+
+        assert 4 == retry_delay.call_count
+        assert not mock_get_capabilities.called
+
+    def test_mutations_use_new_keys(self):
+        complete_item('item_guid1')
+        complete_item('item_guid2')
+
+        first, second = self.stub_server.requests
+        assert (
+            first['headers']['Idempotency-Key'] != second['headers']['Idempotency-Key']
+        )
+        assert ['item_guid1', 'item_guid2'] == self.completed
+
+    def test_gets_have_no_idempotency_key(self):
+        get_all_shopping_lists()
+
+        assert 'Idempotency-Key' not in self.stub_server.requests[0]['headers']
+
+    def test_deadline(self):
+        self.stub_server.faults = ['slow'] * 10
+
+        start = time.monotonic()
+        with command_deadline(0.5):
+            with pytest.raises((requests.exceptions.Timeout, VittlifyError)):
+                get_all_shopping_lists()
+        elapsed = time.monotonic() - start
+
+        assert elapsed < 1
+        assert len(self.stub_server.requests) < 10
+
+    def test_deadline_shared_with_workers(self):
+        with command_deadline(10):
+            results = run_bulk(lambda target: _remaining(), [1, 2], max_workers=2)
+
+        assert all(0 < result.value <= 10 for result in results)
+        assert _remaining() is None
+
+
+class TestSessionAuthStubServer:
+    @pytest.fixture(autouse=True)
+    def setUp(self, stub_server, mocker):
+        self.stub_server = stub_server
+        self.stub_server.handlers['all lists'] = lambda data: [{'guid': 'list_guid'}]
+        self.stub_server.handlers['complete'] = lambda data: {'guid': data['guid']}
+        self.mocker = mocker
+        mocker.patch('vt.vittlify_request.AUTH_MODE', 'session')
+        mocker.patch('vt.vittlify_request.CACHE_ENABLED', False)
+
+    def _handshakes(self):
+        return self.stub_server.endpoints().count('session')
+
+    def test_signs_only_the_handshake(self):
+        for _ in range(3):
+            assert [{'guid': 'list_guid'}] == get_all_shopping_lists()
+        complete_item('item_guid')
+
+        handshake, *requests = self.stub_server.requests
+        assert 'session' == handshake['data']['endpoint']
+        assert 'signature' in handshake['payload']
+        assert 4 == len(requests)
+        for request in requests:
+            assert 'signature' not in request['payload']
+            assert handshake['payload'] != request['payload']
+            assert request['payload']['hmac']
+
+    def test_session_reused_across_invocations(self, mocker):
+        get_all_shopping_lists()
+        mocker.patch('vt.vittlify_request._auth_session', None)
+        get_all_shopping_lists()
+
+        assert 1 == self._handshakes()
+
+    def test_expired_session_renewed(self):
+        get_all_shopping_lists()
+        session = get_session_store().load()
+        session.expires = time.time()
+        get_session_store().save(session)
+        self.mocker.patch('vt.vittlify_request._auth_session', None)
+
+        get_all_shopping_lists()
+
+        assert 2 == self._handshakes()
+
+    def test_rejected_session_renewed(self):
+        get_all_shopping_lists()
+        self.stub_server.sessions.clear()
+
+        assert [{'guid': 'list_guid'}] == get_all_shopping_lists()
+        assert ['session', 'all lists', 'all lists', 'session', 'all lists'] == (
+            self.stub_server.endpoints()
+        )
+
+    def test_one_handshake_for_concurrent_requests(self):
+        results = run_bulk(lambda target: get_all_shopping_lists(), list(range(8)))
+
+        assert all(result.error is None for result in results)
+        assert 1 == self._handshakes()
+
+    def test_rejected_handshake(self):
+        self.stub_server.verify_key = mock.MagicMock()
+        self.stub_server.verify_key.verify.side_effect = ValueError()
+
+        with pytest.raises(VittlifyError):
+            get_all_shopping_lists()
+
+    def test_clear_auth_session(self):
+        get_all_shopping_lists()
+        clear_auth_session()
+
+        assert get_session_store().load() is None
+
+    def test_unknown_auth_mode(self):
+        self.mocker.patch('vt.vittlify_request.AUTH_MODE', 'password')
+
+        with pytest.raises(VittlifyError):
+            get_all_shopping_lists()
+        assert [] == self.stub_server.requests
+
+
+class TestBatchRequestsStubServer:
+    @pytest.fixture(autouse=True)
+    def setUp(self, stub_server, mocker):
+        self.stub_server = stub_server
+        self.stub_server.capabilities = ['batch']
+        self.stub_server.handlers['list all items'] = lambda data: [{'guid': 'item1'}]
+
+        self.completed = []
+
+        def complete(data):
+            if data['guid'] == 'missing':
+                return 404, 'Item not found'
+            self.completed.append(data['guid'])
+            return {'guid': data['guid'], 'name': data['guid'].upper()}
+
+        self.stub_server.handlers['complete'] = complete
+        self.mocker = mocker
+
+    def _run(self, targets):
+        return run_bulk_requests(
+            lambda guid: complete_item(guid),
+            lambda guid: complete_operation(guid),
+            targets,
+        )
+
+    def test_capabilities(self):
+        assert ('batch',) == get_capabilities()
+        assert ('batch',) == get_capabilities()
+        assert ['capabilities'] == self.stub_server.endpoints()
+
+    def test_no_capabilities(self):
+        self.stub_server.capabilities = []
+
+        assert () == get_capabilities()
+
+    @pytest.mark.parametrize('status', [401, 403, 429])
+    def test_capabilities_errors_not_cached(self, status):
+        self.mocker.patch('vt.vittlify_request.MAX_RETRIES', 0)
+        self.stub_server.faults = [status]
+
+        with pytest.raises(requests.exceptions.HTTPError):
+            get_capabilities()
+
+        assert ('batch',) == get_capabilities()
+        assert ['capabilities', 'capabilities'] == self.stub_server.endpoints()
+
+    @pytest.mark.parametrize('body', [[], 'batch', {'capabilities': 'batch'}])
+    def test_invalid_capabilities(self, body):
+        self.stub_server.handlers['capabilities'] = lambda data: body
+
+        assert () == get_capabilities()
+
+    def test_no_capabilities_cached(self):
+        self.stub_server.capabilities = []
+
+        get_capabilities()
+        self.mocker.patch('vt.vittlify_request._capabilities', None)
+
+        assert () == get_capabilities()
+        assert ['capabilities'] == self.stub_server.endpoints()
+
+    def test_batched(self):
+        results = self._run(['guid1', 'missing', 'guid2'])
+
+        assert ['capabilities', 'batch'] == self.stub_server.endpoints()
+        assert ['guid1', 'guid2'] == self.completed
+        assert ['guid1', 'missing', 'guid2'] == [result.target for result in results]
+        assert {'guid': 'guid1', 'name': 'GUID1'} == results[0].value
+        assert isinstance(results[1].error, VittlifyError)
+        assert 'Item not found' == str(results[1].error)
+        assert results[2].error is None
+
+        operations = self.stub_server.requests[1]['data']['operations']
+        assert {'method': 'PUT', 'data': {'endpoint': 'complete', 'guid': 'guid1'}} == (
+            operations[0]
+        )
+
+    def test_batch_size(self):
+        self.mocker.patch('vt.vittlify_request.BATCH_SIZE', 2)
+        targets = [f'guid{i}' for i in range(5)]
+
+        results = self._run(targets)
+
+        assert 3 == self.stub_server.endpoints().count('batch')
+        assert targets == [result.target for result in results]
+        assert targets == [result.value['guid'] for result in results]
+
+    @pytest.mark.parametrize('fault', [500, 401, 'drop'])
+    def test_falls_back_when_capabilities_fail(self, fault):
+        self.mocker.patch('vt.vittlify_request.MAX_RETRIES', 0)
+        self.stub_server.faults = [fault]
+
+        results = self._run(['guid1', 'guid2'])
+
+        assert ['guid1', 'guid2'] == sorted(self.completed)
+        assert all(result.error is None for result in results)
+        assert ['capabilities', 'complete', 'complete'] == (
+            self.stub_server.endpoints()
+        )
+
+    def test_falls_back_without_batch_support(self):
+        self.stub_server.capabilities = []
+
+        results = self._run(['guid1', 'guid2'])
+
+        assert ['capabilities', 'complete', 'complete'] == sorted(
+            self.stub_server.endpoints()
+        )
+        assert ['guid1', 'guid2'] == [result.value['guid'] for result in results]
+
+    def test_single_target_not_batched(self):
+        self._run(['guid1'])
+
+        assert ['complete'] == self.stub_server.endpoints()
+
+    def test_disabled(self):
+        self.mocker.patch('vt.vittlify_request.BATCH_REQUESTS', False)
+
+        self._run(['guid1', 'guid2'])
+
+        assert 'capabilities' not in self.stub_server.endpoints()
+
+    def test_invalid_batch_response(self):
+        self.stub_server.handlers['batch'] = lambda data: {'results': []}
+
+        results = self._run(['guid1', 'guid2'])
+
+        assert all(isinstance(result.error, VittlifyError) for result in results)
+
+    def test_invalidates_cached_views(self):
+        get_all_shopping_list_items('list_guid')
+        send_batch([complete_operation('guid1'), complete_operation('guid2')])
+        get_all_shopping_list_items('list_guid')
+
+        assert 2 == self.stub_server.endpoints().count('list all items')
+
+
+class TestWireFormatStubServer:
+    @pytest.fixture(autouse=True)
+    def setUp(self, stub_server, mocker):
+        self.stub_server = stub_server
+        self.stub_server.capabilities = ['v2']
+        self.stub_server.handlers['list all items'] = lambda data: [{'guid': 'item1'}]
+        self.stub_server.handlers['add item'] = lambda data: {
+            'guid': 'item_guid',
+            'name': data['name'],
+            'comments': data['comments'],
+        }
+        self.mocker = mocker
+        mocker.patch('vt.vittlify_request.WIRE_FORMAT', 'auto')
+
+    def _request(self, endpoint):
+        return next(
+            request
+            for request in self.stub_server.requests
+            if request['data'].get('endpoint') == endpoint
+        )
+
+    def _negotiate(self):
+        get_capabilities()
+        self.stub_server.requests.clear()
+
+    def _join_probe(self):
+        vittlify_request._capabilities_probe.join()
+
+    def test_negotiated(self):
+        add_item('list_guid', 'item', comments='comment')
+        self._join_probe()
+
+        # The first request does not wait for the capabilities
+        assert ['add item', 'capabilities'] == sorted(self.stub_server.endpoints())
+        assert 'X-Vittlify-Wire-Version' not in self._request('add item')['headers']
+        capabilities = self._request('capabilities')
+        assert 'X-Vittlify-Wire-Version' not in capabilities['headers']
+        assert 'signature' in capabilities['payload']
+
+        self.stub_server.requests.clear()
+        add_item('list_guid', 'item', comments='comment')
+
+        assert ['add item'] == self.stub_server.endpoints()
+        request = self._request('add item')
+        assert '2' == request['headers']['X-Vittlify-Wire-Version']
+        assert request['headers']['X-Vittlify-Signature']
+        assert {} == request['payload']
+        assert {
+            'endpoint': 'add item',
+            'guid': 'list_guid',
+            'name': 'item',
+            'comments': 'comment',
+            'username': mock.ANY,
+        } == request['data']
+
+    def test_negotiated_once_without_cache(self):
+        self.mocker.patch('vt.vittlify_request.CACHE_ENABLED', False)
+
+        add_item('list_guid', 'item')
+        add_item('list_guid', 'item')
+
+        assert ['capabilities', 'add item', 'add item'] == self.stub_server.endpoints()
+        for request in self.stub_server.requests[1:]:
+            assert '2' == request['headers']['X-Vittlify-Wire-Version']
+        assert vittlify_request._capabilities_probe is None
+
+    def test_capabilities_cached_across_runs(self):
+        get_capabilities()
+        self.mocker.patch('vt.vittlify_request._capabilities', None)
+
+        add_item('list_guid', 'item')
+
+        assert ['capabilities', 'add item'] == self.stub_server.endpoints()
+        assert '2' == self._request('add item')['headers']['X-Vittlify-Wire-Version']
+        assert vittlify_request._capabilities_probe is None
+
+    def test_one_probe_for_concurrent_requests(self):
+        results = run_bulk(
+            lambda guid: get_all_shopping_list_items(guid),
+            [f'list{i}' for i in range(8)],
+        )
+        self._join_probe()
+        get_capabilities()
+
+        assert all(result.error is None for result in results)
+        assert 1 == self.stub_server.endpoints().count('capabilities')
+
+    def test_old_server(self):
+        self.stub_server.capabilities = []
+        self._negotiate()
+
+        add_item('list_guid', 'item')
+
+        request = self._request('add item')
+        assert 'X-Vittlify-Wire-Version' not in request['headers']
+        assert {'message', 'signature'} == set(request['payload'])
+
+    @pytest.mark.parametrize('wire_format, version', [('v1', None), ('v2', '2')])
+    def test_forced(self, wire_format, version):
+        self.mocker.patch('vt.vittlify_request.WIRE_FORMAT', wire_format)
+
+        add_item('list_guid', 'item')
+
+        assert ['add item'] == self.stub_server.endpoints()
+        assert version == self.stub_server.requests[0]['headers'].get(
+            'X-Vittlify-Wire-Version'
+        )
+
+    def test_unknown_wire_format(self):
+        self.mocker.patch('vt.vittlify_request.WIRE_FORMAT', 'v3')
+
+        with pytest.raises(VittlifyError):
+            add_item('list_guid', 'item')
+
+    def test_rejected_signature(self):
+        self.mocker.patch('vt.vittlify_request.WIRE_FORMAT', 'v2')
+        self.stub_server.verify_key = mock.MagicMock()
+        self.stub_server.verify_key.verify.side_effect = ValueError()
+
+        with pytest.raises(requests.HTTPError):
+            add_item('list_guid', 'item')
+
+    def test_rsa_key(self, tmp_path):
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+
+        from vt.utils import clear_signers
+
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        path = tmp_path / 'id_rsa'
+        path.write_bytes(
+            key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.OpenSSH,
+                serialization.NoEncryption(),
+            )
+        )
+        self.mocker.patch.dict('os.environ', {'VT_PRIVATE_KEY': str(path)})
+        clear_signers()
+        self.stub_server.verify_key = key.public_key()
+        self._negotiate()
+
+        assert 'item' == add_item('list_guid', 'item')['name']
+        assert '2' == self._request('add item')['headers']['X-Vittlify-Wire-Version']
+
+    def test_compressed(self):
+        self.mocker.patch('vt.vittlify_request.COMPRESS_REQUESTS', True)
+        self._negotiate()
+
+        item = add_item('list_guid', 'item', comments='x' * 5000)
+
+        request = self._request('add item')
+        assert 'gzip' == request['headers']['Content-Encoding']
+        assert 'x' * 5000 == request['data']['comments'] == item['comments']
+        assert self.stub_server.bytes_received < 1000
+
+    def test_stream_request(self):
+        self._negotiate()
+        assert [{'guid': 'item1'}] == list(
+            get_all_shopping_list_items('list_guid', stream=True)
+        )
+        assert (
+            '2' == self._request('list all items')['headers']['X-Vittlify-Wire-Version']
+        )
+
+    def test_session_auth(self):
+        self.mocker.patch('vt.vittlify_request.AUTH_MODE', 'session')
+        self._negotiate()
+
+        add_item('list_guid', 'item')
+
+        assert ['add item'] == self.stub_server.endpoints()
+        headers = self._request('add item')['headers']
+        assert headers['X-Vittlify-Session']
+        assert headers['X-Vittlify-HMAC']
+        assert 'X-Vittlify-Signature' not in headers
+
+    def test_rejected_session_renewed(self):
+        self.mocker.patch('vt.vittlify_request.AUTH_MODE', 'session')
+        self._negotiate()
+        add_item('list_guid', 'item')
+        self.stub_server.sessions.clear()
+
+        assert 'item' == add_item('list_guid', 'item')['name']
+        assert ['add item', 'add item', 'session', 'add item'] == (
+            self.stub_server.endpoints()
+        )
+
+
+class TestSerializationStubServer:
+    ITEMS = [{'guid': f'guid{i}', 'name': f'item{i}'} for i in range(200)]
+
+    @pytest.fixture(autouse=True)
+    def setUp(self, stub_server, mocker):
+        self.stub_server = stub_server
+        self.stub_server.handlers['list all items'] = lambda data: self.ITEMS
+        self.stub_server.handlers['item'] = lambda data: (404, 'Item not found')
+        self.mocker = mocker
+
+    def test_json_only(self):
+        self.mocker.patch('vt.serialization.SERIALIZATION', 'json')
+        self.stub_server.msgpack_responses = True
+
+        assert self.ITEMS == get_all_shopping_list_items('list_guid')
+        assert 'application/json' == self.stub_server.requests[0]['headers']['Accept']
+
+    @pytest.mark.parametrize('stream', [False, True])
+    def test_msgpack(self, stream):
+        pytest.importorskip('msgpack')
+        self.mocker.patch('vt.serialization.SERIALIZATION', 'msgpack')
+        self.stub_server.msgpack_responses = True
+
+        items = get_all_shopping_list_items('list_guid', stream=stream)
+
+        assert self.ITEMS == list(items)
+        assert self.stub_server.requests[0]['headers']['Accept'].startswith(
+            'application/msgpack'
+        )
+        assert self.stub_server.bytes_sent < len(json.dumps(self.ITEMS))
+
+    def test_msgpack_errors(self):
+        pytest.importorskip('msgpack')
+        self.mocker.patch('vt.serialization.SERIALIZATION', 'msgpack')
+        self.stub_server.msgpack_responses = True
+
+        with pytest.raises(VittlifyError, match='Item not found'):
+            get_item('item_guid')
+
+    def test_server_without_msgpack(self):
+        pytest.importorskip('msgpack')
+        self.mocker.patch('vt.serialization.SERIALIZATION', 'msgpack')
+
+        assert self.ITEMS == get_all_shopping_list_items('list_guid')
+        assert len(json.dumps(self.ITEMS)) == self.stub_server.bytes_sent
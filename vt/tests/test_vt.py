@@ -1,21 +1,29 @@
+import json
 import shlex
+import time
 import unittest
 
 import mock
 import pytest
 import requests
 
+from vt.help import GENERAL_HELP, SETTINGS_HELP
+from vt.output import ITEM_FIELDS
+from vt.tests.stub_server import paged_handler
 from vt.utils import VittlifyError
+from vt.vittlify_request import _remaining
 from vt.vt import (
     Status,
     add,
     categories,
+    categorize,
     complete,
     display_all_shopping_lists,
     display_item,
     display_shopping_list,
     display_shopping_list_categories,
     help,
+    main,
     modify,
     move,
     run,
@@ -25,6 +33,9 @@ from vt.vt import (
 
 
 class TestDisplayShoppingList(unittest.TestCase):
+    FIELDS = ['guid', 'name', 'done', 'has_comments']
+    FIELDS_EXTENDED = ['guid', 'name', 'done', 'comments']
+
     def setUp(self):
         self.get_shopping_list_info_patcher = mock.patch('vt.vt.get_shopping_list_info')
         self.mock_get_shopping_list_info = self.get_shopping_list_info_patcher.start()
@@ -44,8 +55,9 @@ class TestDisplayShoppingList(unittest.TestCase):
             self.get_all_shopping_list_items_patcher.start()
         )
 
-        self.format_row_patcher = mock.patch('vt.vt.format_row')
-        self.mock_format_row = self.format_row_patcher.start()
+        self.RowFormatter_patcher = mock.patch('vt.vt.RowFormatter')
+        self.mock_RowFormatter = self.RowFormatter_patcher.start()
+        self.mock_format = self.mock_RowFormatter.return_value.format
 
         self.print_table_patcher = mock.patch('vt.vt.print_table')
         self.mock_print_table = self.print_table_patcher.start()
@@ -63,7 +75,7 @@ class TestDisplayShoppingList(unittest.TestCase):
         self.mock_get_all_shopping_list_items.return_value = test_items
         self.mock_get_completed.return_value = test_items
 
-        self.mock_format_row.side_effect = [
+        self.mock_format.side_effect = [
             'formatted_row_1',
             'formatted_row_2',
             'formatted_row_3',
@@ -74,7 +86,7 @@ class TestDisplayShoppingList(unittest.TestCase):
         self.get_shopping_list_items_patcher.stop()
         self.get_completed_patcher.stop()
         self.get_all_shopping_list_items_patcher.stop()
-        self.format_row_patcher.stop()
+        self.RowFormatter_patcher.stop()
         self.print_table_patcher.stop()
 
     def test_not_completed(self):
@@ -82,30 +94,21 @@ class TestDisplayShoppingList(unittest.TestCase):
         display_shopping_list(guid=guid, mode=Status.NOT_COMPLETED)
 
         self.mock_get_shopping_list_info.assert_called_once_with(guid)
-        self.mock_get_shopping_list_items.assert_called_once_with(guid)
-        self.mock_format_row.assert_has_calls(
+        self.mock_get_shopping_list_items.assert_called_once_with(
+            guid, fields=self.FIELDS
+        )
+        self.mock_RowFormatter.assert_called_once_with(
+            {'name': 'test_list'},
+            include_category=False,
+            include_comments=False,
+            no_wrap=False,
+            guid_length=8,
+        )
+        self.mock_format.assert_has_calls(
             [
-                mock.call(
-                    {'name': 'item1'},
-                    {'name': 'test_list'},
-                    include_category=False,
-                    include_comments=False,
-                    no_wrap=False,
-                ),
-                mock.call(
-                    {'name': 'item2'},
-                    {'name': 'test_list'},
-                    include_category=False,
-                    include_comments=False,
-                    no_wrap=False,
-                ),
-                mock.call(
-                    {'name': 'item3'},
-                    {'name': 'test_list'},
-                    include_category=False,
-                    include_comments=False,
-                    no_wrap=False,
-                ),
+                mock.call({'name': 'item1'}),
+                mock.call({'name': 'item2'}),
+                mock.call({'name': 'item3'}),
             ]
         )
         self.mock_print_table.assert_called_once_with(
@@ -119,30 +122,21 @@ class TestDisplayShoppingList(unittest.TestCase):
         display_shopping_list(guid=guid, mode=Status.ALL)
 
         self.mock_get_shopping_list_info.assert_called_once_with(guid)
-        self.mock_get_all_shopping_list_items.assert_called_once_with(guid)
-        self.mock_format_row.assert_has_calls(
+        self.mock_get_all_shopping_list_items.assert_called_once_with(
+            guid, fields=self.FIELDS
+        )
+        self.mock_RowFormatter.assert_called_once_with(
+            {'name': 'test_list'},
+            include_category=False,
+            include_comments=False,
+            no_wrap=False,
+            guid_length=8,
+        )
+        self.mock_format.assert_has_calls(
             [
-                mock.call(
-                    {'name': 'item1'},
-                    {'name': 'test_list'},
-                    include_category=False,
-                    include_comments=False,
-                    no_wrap=False,
-                ),
-                mock.call(
-                    {'name': 'item2'},
-                    {'name': 'test_list'},
-                    include_category=False,
-                    include_comments=False,
-                    no_wrap=False,
-                ),
-                mock.call(
-                    {'name': 'item3'},
-                    {'name': 'test_list'},
-                    include_category=False,
-                    include_comments=False,
-                    no_wrap=False,
-                ),
+                mock.call({'name': 'item1'}),
+                mock.call({'name': 'item2'}),
+                mock.call({'name': 'item3'}),
             ]
         )
         self.mock_print_table.assert_called_once_with(
@@ -156,30 +150,19 @@ class TestDisplayShoppingList(unittest.TestCase):
         display_shopping_list(guid=guid, mode=Status.COMPLETED)
 
         self.assertFalse(self.mock_get_shopping_list_info.called)
-        self.mock_get_completed.assert_called_once_with()
-        self.mock_format_row.assert_has_calls(
+        self.mock_get_completed.assert_called_once_with(fields=self.FIELDS)
+        self.mock_RowFormatter.assert_called_once_with(
+            None,
+            include_category=False,
+            include_comments=False,
+            no_wrap=False,
+            guid_length=8,
+        )
+        self.mock_format.assert_has_calls(
             [
-                mock.call(
-                    {'name': 'item1'},
-                    None,
-                    include_category=False,
-                    include_comments=False,
-                    no_wrap=False,
-                ),
-                mock.call(
-                    {'name': 'item2'},
-                    None,
-                    include_category=False,
-                    include_comments=False,
-                    no_wrap=False,
-                ),
-                mock.call(
-                    {'name': 'item3'},
-                    None,
-                    include_category=False,
-                    include_comments=False,
-                    no_wrap=False,
-                ),
+                mock.call({'name': 'item1'}),
+                mock.call({'name': 'item2'}),
+                mock.call({'name': 'item3'}),
             ]
         )
         self.mock_print_table.assert_called_once_with(
@@ -193,30 +176,21 @@ class TestDisplayShoppingList(unittest.TestCase):
         display_shopping_list(guid=guid, mode=Status.NOT_COMPLETED, extended=True)
 
         self.mock_get_shopping_list_info.assert_called_once_with(guid)
-        self.mock_get_shopping_list_items.assert_called_once_with(guid)
-        self.mock_format_row.assert_has_calls(
+        self.mock_get_shopping_list_items.assert_called_once_with(
+            guid, fields=self.FIELDS_EXTENDED
+        )
+        self.mock_RowFormatter.assert_called_once_with(
+            {'name': 'test_list'},
+            include_category=False,
+            include_comments=True,
+            no_wrap=False,
+            guid_length=8,
+        )
+        self.mock_format.assert_has_calls(
             [
-                mock.call(
-                    {'name': 'item1'},
-                    {'name': 'test_list'},
-                    include_category=False,
-                    include_comments=True,
-                    no_wrap=False,
-                ),
-                mock.call(
-                    {'name': 'item2'},
-                    {'name': 'test_list'},
-                    include_category=False,
-                    include_comments=True,
-                    no_wrap=False,
-                ),
-                mock.call(
-                    {'name': 'item3'},
-                    {'name': 'test_list'},
-                    include_category=False,
-                    include_comments=True,
-                    no_wrap=False,
-                ),
+                mock.call({'name': 'item1'}),
+                mock.call({'name': 'item2'}),
+                mock.call({'name': 'item3'}),
             ]
         )
         self.mock_print_table.assert_called_once_with(
@@ -230,30 +204,21 @@ class TestDisplayShoppingList(unittest.TestCase):
         display_shopping_list(guid=guid, mode=Status.ALL, extended=True)
 
         self.mock_get_shopping_list_info.assert_called_once_with(guid)
-        self.mock_get_all_shopping_list_items.assert_called_once_with(guid)
-        self.mock_format_row.assert_has_calls(
+        self.mock_get_all_shopping_list_items.assert_called_once_with(
+            guid, fields=self.FIELDS_EXTENDED
+        )
+        self.mock_RowFormatter.assert_called_once_with(
+            {'name': 'test_list'},
+            include_category=False,
+            include_comments=True,
+            no_wrap=False,
+            guid_length=8,
+        )
+        self.mock_format.assert_has_calls(
             [
-                mock.call(
-                    {'name': 'item1'},
-                    {'name': 'test_list'},
-                    include_category=False,
-                    include_comments=True,
-                    no_wrap=False,
-                ),
-                mock.call(
-                    {'name': 'item2'},
-                    {'name': 'test_list'},
-                    include_category=False,
-                    include_comments=True,
-                    no_wrap=False,
-                ),
-                mock.call(
-                    {'name': 'item3'},
-                    {'name': 'test_list'},
-                    include_category=False,
-                    include_comments=True,
-                    no_wrap=False,
-                ),
+                mock.call({'name': 'item1'}),
+                mock.call({'name': 'item2'}),
+                mock.call({'name': 'item3'}),
             ]
         )
         self.mock_print_table.assert_called_once_with(
@@ -267,30 +232,19 @@ class TestDisplayShoppingList(unittest.TestCase):
         display_shopping_list(guid=guid, mode=Status.COMPLETED, extended=True)
 
         self.assertFalse(self.mock_get_shopping_list_info.called)
-        self.mock_get_completed.assert_called_once_with()
-        self.mock_format_row.assert_has_calls(
+        self.mock_get_completed.assert_called_once_with(fields=self.FIELDS_EXTENDED)
+        self.mock_RowFormatter.assert_called_once_with(
+            None,
+            include_category=False,
+            include_comments=True,
+            no_wrap=False,
+            guid_length=8,
+        )
+        self.mock_format.assert_has_calls(
             [
-                mock.call(
-                    {'name': 'item1'},
-                    None,
-                    include_category=False,
-                    include_comments=True,
-                    no_wrap=False,
-                ),
-                mock.call(
-                    {'name': 'item2'},
-                    None,
-                    include_category=False,
-                    include_comments=True,
-                    no_wrap=False,
-                ),
-                mock.call(
-                    {'name': 'item3'},
-                    None,
-                    include_category=False,
-                    include_comments=True,
-                    no_wrap=False,
-                ),
+                mock.call({'name': 'item1'}),
+                mock.call({'name': 'item2'}),
+                mock.call({'name': 'item3'}),
             ]
         )
         self.mock_print_table.assert_called_once_with(
@@ -299,6 +253,412 @@ class TestDisplayShoppingList(unittest.TestCase):
             quiet=False,
         )
 
+    def test_include_category(self):
+        guid = 'test_guid'
+        display_shopping_list(guid=guid, mode=Status.ALL, include_category=True)
+
+        self.mock_get_all_shopping_list_items.assert_called_once_with(
+            guid, fields=self.FIELDS + ['category_name']
+        )
+
+    def test_completed_include_category(self):
+        display_shopping_list(mode=Status.COMPLETED, include_category=True)
+
+        self.mock_get_completed.assert_called_once_with(fields=self.FIELDS)
+
+    @mock.patch('vt.vt.write_objects')
+    def test_output_format(self, mock_write_objects):
+        mock_write_objects.side_effect = lambda objects, *args: list(objects)
+        guid = 'test_guid'
+
+        for output_format, fields in [
+            ('json', None),
+            ('ndjson', None),
+            ('tsv', ITEM_FIELDS),
+        ]:
+            with self.subTest(output_format=output_format):
+                self.mock_get_all_shopping_list_items.reset_mock()
+                display_shopping_list(
+                    guid=guid, mode=Status.ALL, output_format=output_format
+                )
+
+                self.mock_get_all_shopping_list_items.assert_called_once_with(
+                    guid, fields=fields
+                )
+
+
+class TestDisplayShoppingListStubServer:
+    LATENCY = 0.3
+
+    @pytest.fixture(autouse=True)
+    def setUp(self, stub_server, mocker):
+        self.stub_server = stub_server
+        self.stub_server.handlers['list'] = lambda data: {
+            'name': 'test_list',
+            'categories': [],
+        }
+        self.stub_server.handlers['list all items'] = lambda data: [
+            {'guid': 'item_guid', 'name': 'item1'}
+        ]
+        self.stub_server.latency = self.LATENCY
+
+        self.mock_print_table = mocker.patch('vt.vt.print_table')
+
+    def test_info_and_items_fetched_concurrently(self):
+        start = time.monotonic()
+        display_shopping_list(guid='test_guid', mode=Status.ALL)
+        elapsed = time.monotonic() - start
+
+        # Sequential requests would take at least twice the injected latency
+        assert elapsed < 2 * self.LATENCY
+        assert sorted(self.stub_server.endpoints()) == ['list', 'list all items']
+        assert self.mock_print_table.call_args[1]['title'] == 'test_list'
+
+
+class TestFieldProjectionStubServer:
+    ITEMS = [
+        {
+            'guid': f'item_guid{i}',
+            'name': f'item{i}',
+            'done': False,
+            'category_name': 'Produce',
+            'comments': 'A long comment ' * 100 if i % 2 else '',
+        }
+        for i in range(20)
+    ]
+
+    @pytest.fixture(autouse=True)
+    def setUp(self, stub_server, mocker):
+        self.stub_server = stub_server
+        self.stub_server.handlers['list'] = lambda data: {
+            'name': 'test_list',
+            'categories': [{'name': 'Produce'}],
+        }
+        self.stub_server.handlers['list all items'] = lambda data: self.ITEMS
+        mocker.patch('vt.vittlify_request.CACHE_ENABLED', False)
+
+        self.mock_print_table = mocker.patch('vt.vt.print_table')
+
+    def _items_request(self):
+        return next(
+            request
+            for request in self.stub_server.requests
+            if request['data']['endpoint'] == 'list all items'
+        )
+
+    def _rows(self):
+        return [
+            [str(cell) for cell in row] for row in self.mock_print_table.call_args[0][0]
+        ]
+
+    def test_comments_and_categories_not_fetched(self):
+        display_shopping_list(guid='test_guid')
+
+        assert ['guid', 'name', 'done', 'has_comments'] == (
+            self._items_request()['data']['fields']
+        )
+        assert self.stub_server.bytes_sent < 2000
+
+        rows = self._rows()
+        assert 2 == len(rows[0])
+        assert '  item0' in rows[0][1]
+        assert '+ item1' in rows[1][1]
+
+    def test_extended(self):
+        display_shopping_list(guid='test_guid', extended=True)
+
+        assert 'comments' in self._items_request()['data']['fields']
+        assert 'A long comment' in self._rows()[1][-1]
+
+    def test_include_category(self):
+        display_shopping_list(guid='test_guid', include_category=True)
+
+        assert 'category_name' in self._items_request()['data']['fields']
+        assert 'Produce' in self._rows()[0][1]
+
+    def test_server_without_projections(self):
+        self.stub_server.project_fields = False
+
+        display_shopping_list(guid='test_guid')
+
+        assert self.stub_server.bytes_sent > 10000
+        assert '+ item1' in self._rows()[1][1]
+
+
+class TestMachineOutputStubServer:
+    @pytest.fixture(autouse=True)
+    def setUp(self, stub_server, mocker, capsys):
+        self.stub_server = stub_server
+        self.stub_server.handlers['list'] = lambda data: {
+            'name': 'test_list',
+            'categories': [{'name': 'dairy'}],
+        }
+        self.stub_server.handlers['list all items'] = lambda data: [
+            {'guid': 'item_guid1', 'name': 'item1', 'done': False},
+            {'guid': 'item_guid2', 'name': 'item2', 'done': True},
+        ]
+        self.stub_server.handlers['all lists'] = lambda data: [
+            {'guid': 'list_guid', 'name': 'test_list'}
+        ]
+        self.stub_server.handlers['item'] = lambda data: {
+            'guid': 'item_guid1',
+            'name': 'item1',
+        }
+        self.capsys = capsys
+
+        self.mock_print_table = mocker.patch('vt.vt.print_table')
+        mocker.patch.object(
+            term, '_get_terminal', side_effect=AssertionError('terminal used')
+        )
+
+    def test_list_json(self):
+        display_shopping_list(guid='test_guid', mode=Status.ALL, output_format='json')
+
+        assert json.loads(self.capsys.readouterr().out) == [
+            {'guid': 'item_guid1', 'name': 'item1', 'done': False},
+            {'guid': 'item_guid2', 'name': 'item2', 'done': True},
+        ]
+        # The title is not needed so the list info is never requested
+        assert self.stub_server.endpoints() == ['list all items']
+        assert not self.mock_print_table.called
+
+    def test_list_json_keeps_every_field(self):
+        item = {
+            'guid': 'item_guid1',
+            'name': 'item1',
+            'done': False,
+            'quantity': 2,
+            'modified': '2021-01-01T00:00:00Z',
+        }
+        self.stub_server.handlers['list all items'] = lambda data: [item]
+
+        show(shlex.split('list test_guid --format json'))
+
+        assert [item] == json.loads(self.capsys.readouterr().out)
+        assert 'fields' not in self.stub_server.requests[0]['data']
+
+    def test_list_ndjson(self):
+        show(shlex.split('list test_guid --format ndjson'))
+
+        lines = self.capsys.readouterr().out.splitlines()
+        assert [json.loads(line)['guid'] for line in lines] == [
+            'item_guid1',
+            'item_guid2',
+        ]
+        assert not self.mock_print_table.called
+
+    def test_lists_tsv(self):
+        show(shlex.split('lists --format=tsv'))
+
+        assert self.capsys.readouterr().out == 'guid\tname\nlist_guid\ttest_list\n'
+        assert not self.mock_print_table.called
+
+    def test_item_json(self):
+        show(shlex.split('item --format json item_guid1'))
+
+        assert json.loads(self.capsys.readouterr().out) == {
+            'guid': 'item_guid1',
+            'name': 'item1',
+        }
+
+    def test_categories_tsv(self):
+        categories(shlex.split('test_guid --format tsv'))
+
+        assert self.capsys.readouterr().out == 'name\ndairy\n'
+
+    def test_unknown_format(self):
+        with pytest.raises(VittlifyError):
+            display_all_shopping_lists(output_format='yaml')
+
+        assert self.stub_server.endpoints() == []
+
+
+class TestDisplayShoppingListPagingStubServer:
+    @pytest.fixture(autouse=True)
+    def setUp(self, stub_server, capsys):
+        self.stub_server = stub_server
+        self.stub_server.handlers['list'] = lambda data: {
+            'name': 'test_list',
+            'categories': [],
+        }
+        self.stub_server.handlers['list all items'] = paged_handler(
+            [{'guid': f'guid{i}', 'name': f'item{i}'} for i in range(10)]
+        )
+        self.capsys = capsys
+
+    def test_limit_and_page(self):
+        show(shlex.split('list test_guid --limit 3 --page 2 --format ndjson'))
+
+        lines = self.capsys.readouterr().out.splitlines()
+        assert [json.loads(line)['guid'] for line in lines] == [
+            'guid3',
+            'guid4',
+            'guid5',
+        ]
+        data = self.stub_server.requests[0]['data']
+        assert (data['page'], data['page_size']) == (2, 3)
+
+    def test_all_pages(self, mocker):
+        mocker.patch('vt.vt.PAGE_SIZE', 4)
+        mock_print_table = mocker.patch('vt.vt.print_table')
+
+        display_shopping_list(guid='test_guid')
+
+        assert len(mock_print_table.call_args[0][0]) == 10
+        assert sorted(self.stub_server.endpoints()) == ['list'] + ['list all items'] * 3
+
+    def test_streamed(self, mocker):
+        mocker.patch('vt.vt.STREAM_RESPONSES', True)
+        mock_print_table = mocker.patch('vt.vt.print_table')
+
+        display_shopping_list(guid='test_guid')
+
+        rows = mock_print_table.call_args[0][0]
+        assert not isinstance(rows, list)
+        assert [row[0] for row in rows] == [f'guid{i}' for i in range(10)]
+        assert 'page_size' not in self.stub_server.requests[-1]['data']
+
+    def test_streamed_ndjson(self, mocker):
+        mocker.patch('vt.vt.STREAM_RESPONSES', True)
+
+        display_shopping_list(guid='test_guid', output_format='ndjson')
+
+        lines = self.capsys.readouterr().out.splitlines()
+        assert len(lines) == 10
+        assert self.stub_server.endpoints() == ['list all items']
+
+    def test_invalid_limit(self):
+        with pytest.raises(VittlifyError):
+            display_shopping_list(guid='test_guid', limit='none')
+
+
+class TestPlainOutputStubServer:
+    @pytest.fixture(autouse=True)
+    def setUp(self, stub_server, mocker, capsys):
+        self.stub_server = stub_server
+        self.stub_server.handlers['list'] = lambda data: {
+            'name': 'test_list',
+            'categories': [],
+        }
+        self.stub_server.handlers['list all items'] = lambda data: [
+            {'guid': 'item_guid1', 'name': 'item1', 'done': True},
+            {'guid': 'item_guid2', 'name': 'item2'},
+        ]
+        self.capsys = capsys
+
+    def test_plain_flag(self, mocker):
+        mock_Terminal = mocker.patch('blessings.Terminal')
+
+        run(['list', '--plain', 'test_guid'])
+
+        assert not mock_Terminal.called
+        assert self.capsys.readouterr().out == (
+            '+test_list---+---------+\n'
+            '| item_guid1 |   item1 |\n'
+            '| item_guid2 |   item2 |\n'
+            '+------------+---------+\n'
+        )
+
+    def test_long_tables_fit_every_row(self):
+        self.stub_server.handlers['list all items'] = lambda data: [
+            {'guid': f'item_guid{i}', 'name': 'x' * (60 if i > 1200 else 5)}
+            for i in range(1300)
+        ]
+
+        run(['list', '--plain', 'test_guid'])
+
+        lines = self.capsys.readouterr().out.splitlines()
+        assert 1302 == len(lines)
+        assert {len(lines[0])} == {len(line) for line in lines}
+
+
+class TestTimingsStubServer:
+    @pytest.fixture(autouse=True)
+    def setUp(self, stub_server, capsys):
+        self.stub_server = stub_server
+        self.stub_server.handlers['all lists'] = lambda data: [
+            {'guid': 'list_guid', 'name': 'list1'}
+        ]
+        self.capsys = capsys
+
+    def test_timings_flag(self):
+        run(['lists', '--timings', '--format', 'json'])
+
+        out, err = self.capsys.readouterr()
+        assert [{'guid': 'list_guid', 'name': 'list1'}] == json.loads(out)
+
+        phases = [line.split()[2] for line in err.splitlines()[1:]]
+        for phase in (
+            'import',
+            'command',
+            'key',
+            'sign',
+            'request',
+            'decode',
+            'render',
+        ):
+            assert phase in phases
+        assert 'endpoint=all lists' in err
+        assert 'status=200' in err
+
+    def test_disabled(self):
+        run(['lists', '--format', 'json'])
+
+        assert '' == self.capsys.readouterr().err
+
+
+class TestBulkStubServer:
+    @pytest.fixture(autouse=True)
+    def setUp(self, stub_server, capsys):
+        self.stub_server = stub_server
+        self.stub_server.capabilities = ['batch']
+        self.stub_server.handlers['move'] = lambda data: {'guid': data['guid']}
+        self.capsys = capsys
+
+    def test_move_batched(self):
+        run(['move', 'item1', 'item2', 'item3', 'list_guid'])
+
+        assert ['capabilities', 'batch'] == self.stub_server.endpoints()
+        assert ['item1', 'item2', 'item3'] == [
+            operation['data']['guid'] for operation in self.stub_server.operations
+        ]
+        out = self.capsys.readouterr().out
+        for guid in ('item1', 'item2', 'item3'):
+            assert f'Moved item {guid} to list list_guid' in out
+
+
+class TestMain:
+    @pytest.fixture(autouse=True)
+    def setUp(self, mocker):
+        self.mock_run = mocker.patch('vt.vt.run')
+        self.mock_run_profiled = mocker.patch('vt.vt.run_profiled')
+        mocker.patch('vt.profiling.PROFILE', None)
+
+    def test_run(self, mocker):
+        mocker.patch('sys.argv', ['vt', 'list', '-e'])
+
+        main()
+
+        self.mock_run.assert_called_once_with(['list', '-e'])
+        assert not self.mock_run_profiled.called
+
+    def test_profile(self, mocker):
+        mocker.patch('sys.argv', ['vt', 'list', '--profile', 'cpu', '-e'])
+
+        main()
+
+        self.mock_run_profiled.assert_called_once_with(
+            self.mock_run, ['list', '-e'], 'cpu'
+        )
+        assert not self.mock_run.called
+
+    def test_unknown_profile(self, mocker):
+        mocker.patch('sys.argv', ['vt', 'list', '--profile', 'disk'])
+
+        with pytest.raises(SystemExit):
+            main()
+        assert not self.mock_run.called
+
 
 class TestDisplayItem(unittest.TestCase):
     def setUp(self):
@@ -322,7 +682,11 @@ class TestDisplayItem(unittest.TestCase):
         display_item(self.test_guid)
         self.mock_get_item.assert_called_once_with(self.test_guid)
         self.mock_format_row.assert_called_once_with(
-            self.mock_get_item.return_value, None, include_comments=True, no_wrap=False
+            self.mock_get_item.return_value,
+            None,
+            include_comments=True,
+            no_wrap=False,
+            guid_length=8,
         )
         self.mock_print_table.assert_called_once_with(
             [self.mock_format_row.return_value]
@@ -334,8 +698,9 @@ class TestDisplayAllShoppingLists(unittest.TestCase):
         self.get_all_shopping_lists_patcher = mock.patch('vt.vt.get_all_shopping_lists')
         self.mock_get_all_shopping_lists = self.get_all_shopping_lists_patcher.start()
 
-        self.format_row_patcher = mock.patch('vt.vt.format_row')
-        self.mock_format_row = self.format_row_patcher.start()
+        self.RowFormatter_patcher = mock.patch('vt.vt.RowFormatter')
+        self.mock_RowFormatter = self.RowFormatter_patcher.start()
+        self.mock_format = self.mock_RowFormatter.return_value.format
 
         self.print_table_patcher = mock.patch('vt.vt.print_table')
         self.mock_print_table = self.print_table_patcher.start()
@@ -346,7 +711,7 @@ class TestDisplayAllShoppingLists(unittest.TestCase):
             {'name': 'list3'},
         ]
 
-        self.mock_format_row.side_effect = [
+        self.mock_format.side_effect = [
             'formatted_row_1',
             'formatted_row_2',
             'formatted_row_3',
@@ -354,16 +719,19 @@ class TestDisplayAllShoppingLists(unittest.TestCase):
 
     def tearDown(self):
         self.get_all_shopping_lists_patcher.stop()
-        self.format_row_patcher.stop()
+        self.RowFormatter_patcher.stop()
 
     def test_(self):
         display_all_shopping_lists()
         self.mock_get_all_shopping_lists.assert_called_once_with()
-        self.mock_format_row.assert_has_calls(
+        self.mock_RowFormatter.assert_called_once_with(
+            None, no_wrap=False, guid_length=8
+        )
+        self.mock_format.assert_has_calls(
             [
-                mock.call({'name': 'list1'}, None, no_wrap=False),
-                mock.call({'name': 'list2'}, None, no_wrap=False),
-                mock.call({'name': 'list3'}, None, no_wrap=False),
+                mock.call({'name': 'list1'}),
+                mock.call({'name': 'list2'}),
+                mock.call({'name': 'list3'}),
             ]
         )
         self.mock_print_table.assert_called_once_with(
@@ -614,6 +982,7 @@ class TestComplete:
     def setUp(self, mocker):
         self.complete_item_patcher = mock.patch('vt.vt.complete_item')
         self.mock_complete_item = self.complete_item_patcher.start()
+        mocker.patch('vt.vittlify_request.get_capabilities', return_value=())
 
         self.mock_print = mocker.patch('builtins.print')
 
@@ -650,6 +1019,54 @@ class TestComplete:
             f'Marked {term.magenta}test_name{term.normal} undone.'
         )
 
+    def test_complete_multiple(self):
+        self.mock_complete_item.side_effect = lambda guid, uncomplete: {'name': guid}
+        self.mock_apply_strikethrough.side_effect = lambda name: name
+
+        args = shlex.split("guid1 guid2 guid3")
+        complete(args)
+
+        self.mock_complete_item.assert_has_calls(
+            [
+                mock.call('guid1', uncomplete=False),
+                mock.call('guid2', uncomplete=False),
+                mock.call('guid3', uncomplete=False),
+            ],
+            any_order=True,
+        )
+        self.mock_print.assert_has_calls(
+            [
+                mock.call(f'Marked {term.magenta}guid1{term.normal} as done.'),
+                mock.call(f'Marked {term.magenta}guid2{term.normal} as done.'),
+                mock.call(f'Marked {term.magenta}guid3{term.normal} as done.'),
+            ]
+        )
+
+    def test_complete_multiple_with_failure(self, mocker):
+        mocker.patch.object(term, 'red', autospec=True)
+
+        def complete_item(guid, uncomplete):
+            if guid == 'guid2':
+                raise VittlifyError('Item not found')
+            return {'name': guid}
+
+        self.mock_complete_item.side_effect = complete_item
+        self.mock_apply_strikethrough.side_effect = lambda name: name
+
+        args = shlex.split("guid1 guid2 guid3")
+        with pytest.raises(VittlifyError):
+            complete(args)
+
+        term.red.assert_called_once_with('guid2: Item not found')
+        assert self.mock_print.call_count == 3
+
+    def test_complete_single_failure_raises_original(self):
+        self.mock_complete_item.side_effect = VittlifyError('Item not found')
+
+        args = shlex.split("test_guid")
+        with pytest.raises(VittlifyError, match='Item not found'):
+            complete(args)
+
     def test_done_extended(self):
         args = shlex.split("-e")
         complete(args)
@@ -733,7 +1150,7 @@ class TestAddDefaultList(unittest.TestCase):
         add(args)
         self.mock_add_item.assert_called_once_with('default_list', 'this is a new item')
         self.mock_format_row.assert_called_once_with(
-            self.mock_add_item.return_value, no_wrap=False
+            self.mock_add_item.return_value, no_wrap=False, guid_length=8
         )
         self.mock_print_table.assert_called_once_with(
             [self.mock_format_row.return_value]
@@ -744,7 +1161,7 @@ class TestAddDefaultList(unittest.TestCase):
         add(args)
         self.mock_add_item.assert_called_once_with('test_guid', 'this is a new item')
         self.mock_format_row.assert_called_once_with(
-            self.mock_add_item.return_value, no_wrap=False
+            self.mock_add_item.return_value, no_wrap=False, guid_length=8
         )
         self.mock_print_table.assert_called_once_with(
             [self.mock_format_row.return_value]
@@ -780,7 +1197,7 @@ class TestAddNoDefaultList(unittest.TestCase):
         add(args)
         self.mock_add_item.assert_called_once_with('test_guid', 'this is a new item')
         self.mock_format_row.assert_called_once_with(
-            self.mock_add_item.return_value, no_wrap=False
+            self.mock_add_item.return_value, no_wrap=False, guid_length=8
         )
         self.mock_print_table.assert_called_once_with(
             [self.mock_format_row.return_value]
@@ -792,6 +1209,7 @@ class TestMove:
     def setUp(self, mocker):
         self.move_item_patcher = mock.patch('vt.vt.move_item')
         self.mock_move_item = self.move_item_patcher.start()
+        mocker.patch('vt.vittlify_request.get_capabilities', return_value=())
 
         self.mock_print = mocker.patch('builtins.print')
 
@@ -806,6 +1224,75 @@ class TestMove:
             f'Moved item {term.blue}test_guid{term.normal} to list {term.blue}to_list_guid{term.normal}'
         )
 
+    def test_multiple(self):
+        args = shlex.split('guid1 guid2 to_list_guid')
+        move(args)
+        self.mock_move_item.assert_has_calls(
+            [
+                mock.call('guid1', 'to_list_guid'),
+                mock.call('guid2', 'to_list_guid'),
+            ],
+            any_order=True,
+        )
+        self.mock_print.assert_has_calls(
+            [
+                mock.call(
+                    f'Moved item {term.blue}guid1{term.normal} to list {term.blue}to_list_guid{term.normal}'
+                ),
+                mock.call(
+                    f'Moved item {term.blue}guid2{term.normal} to list {term.blue}to_list_guid{term.normal}'
+                ),
+            ]
+        )
+
+    def test_missing_list(self):
+        args = shlex.split('test_guid')
+        with pytest.raises(IndexError):
+            move(args)
+
+
+class TestCategorize:
+    @pytest.fixture(autouse=True)
+    def setUp(self, mocker):
+        self.mock_categorize_item = mocker.patch('vt.vt.categorize_item')
+        mocker.patch('vt.vittlify_request.get_capabilities', return_value=())
+        self.mock_categorize_item.side_effect = lambda guid, category_name: {
+            'name': f'{guid}_name'
+        }
+
+        self.mock_print = mocker.patch('builtins.print')
+
+    def test_(self):
+        args = shlex.split('test_guid Produce')
+        categorize(args)
+        self.mock_categorize_item.assert_called_once_with('test_guid', 'produce')
+        self.mock_print.assert_called_once_with(
+            f'Set item {term.blue}test_guid_name{term.normal} to category {term.blue}Produce{term.normal}'
+        )
+
+    def test_multiple(self):
+        args = shlex.split('guid1 guid2 produce')
+        categorize(args)
+        self.mock_categorize_item.assert_has_calls(
+            [mock.call('guid1', 'produce'), mock.call('guid2', 'produce')],
+            any_order=True,
+        )
+        self.mock_print.assert_has_calls(
+            [
+                mock.call(
+                    f'Set item {term.blue}guid1_name{term.normal} to category {term.blue}Produce{term.normal}'
+                ),
+                mock.call(
+                    f'Set item {term.blue}guid2_name{term.normal} to category {term.blue}Produce{term.normal}'
+                ),
+            ]
+        )
+
+    def test_missing_category(self):
+        args = shlex.split('test_guid')
+        with pytest.raises(IndexError):
+            categorize(args)
+
 
 class TestRun:
     @pytest.fixture(autouse=True)
@@ -1029,6 +1516,25 @@ class TestRun:
             'Unable to connect to Vittlify instance at vittlify_url'
         )
 
+    def test_command_deadline(self):
+        self.mock_add.side_effect = lambda args: remaining.append(_remaining())
+        remaining = []
+
+        run(shlex.split("add 'this is a new item'"))
+
+        assert remaining[0] is not None
+        assert _remaining() is None
+
+    def test_timeout(self):
+        self.mock_add.side_effect = requests.exceptions.ReadTimeout()
+
+        test_args = shlex.split("add 'this is a new item'")
+        with pytest.raises(SystemExit):
+            run(test_args)
+        term.red.assert_called_once_with(
+            'Timed out waiting for Vittlify instance at vittlify_url'
+        )
+
     def test_http_error(self):
         self.mock_add.side_effect = requests.exceptions.HTTPError('500 Message')
 
@@ -1049,6 +1555,51 @@ class TestRun:
         self.mock_help.assert_called_once_with(expected)
 
 
+class TestBatchStubServer:
+    @pytest.fixture(autouse=True)
+    def setUp(self, stub_server, mocker, tmp_path):
+        self.stub_server = stub_server
+        self.stub_server.handlers['all lists'] = lambda data: [
+            {'guid': 'list_guid', 'name': 'test_list'}
+        ]
+        self.stub_server.handlers['complete'] = lambda data: (
+            (200, {'name': 'item1'})
+            if data['guid'] == 'item_guid'
+            else (404, 'Item not found')
+        )
+        self.path = tmp_path / 'commands'
+
+        mocker.patch.object(term, 'red', side_effect=lambda text: text)
+
+    def test_runs_each_line(self, capsys):
+        self.path.write_text(
+            'lists --format ndjson\n' 'done bad_guid\n' '# comment\n' 'done item_guid\n'
+        )
+
+        with pytest.raises(SystemExit):
+            run(['batch', str(self.path), '--jobs', '2'])
+
+        out = capsys.readouterr().out.splitlines()
+        assert json.loads(out[0]) == {'guid': 'list_guid', 'name': 'test_list'}
+        assert out[1:] == [
+            'Item not found',
+            'Line 2 failed: done bad_guid',
+            'Marked item1 as done.',
+            '1 batch commands failed',
+        ]
+        assert sorted(self.stub_server.endpoints()) == [
+            'all lists',
+            'complete',
+            'complete',
+        ]
+
+    def test_missing_file(self, capsys):
+        with pytest.raises(SystemExit):
+            run(['batch', str(self.path)])
+
+        assert capsys.readouterr().out.startswith(f'Unable to read {self.path}')
+
+
 class TestDisplayShoppingListCategories:
     @pytest.fixture(autouse=True)
     def setUp(self, mocker):
@@ -1228,3 +1779,11 @@ class TestHelp(unittest.TestCase):
         actual = help(['label'])
 
         self.assertEqual(expected, actual)
+
+    def test_settings(self):
+        expected = SETTINGS_HELP
+        actual = help(['settings'])
+
+        self.assertEqual(expected, actual)
+        self.assertIn('VT_WIRE_FORMAT', actual)
+        self.assertNotIn('VT_WIRE_FORMAT', GENERAL_HELP)
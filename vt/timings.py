@@ -0,0 +1,202 @@
+"""Timing of the phases of a command.
+
+Spans are only recorded once timings have been enabled with --timings or
+VT_TRACE, otherwise span returns a shared no-op so instrumented code pays for
+little more than a function call. Events are reported when the outermost
+command finishes, as a table on stderr and/or as JSON lines appended to the
+VT_TRACE file.
+"""
+
+import os
+import sys
+import threading
+import time
+
+STARTED = time.perf_counter()
+TRACE_PATH = os.environ.get('VT_TRACE')
+
+enabled = bool(TRACE_PATH)
+show = False
+
+_events = []
+_lock = threading.Lock()
+_depth = 0
+_startup_recorded = False
+_observers = []
+
+EVENT_KEYS = ('phase', 'start_ms', 'duration_ms', 'thread')
+
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def update(self, **fields):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    def __init__(self, phase, fields):
+        self.phase = phase
+        self.fields = fields
+        self.start = None
+
+    def __enter__(self):
+        for observer in _observers:
+            observer.enter(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.fields.setdefault('error', exc_type.__name__)
+        record(self.phase, self.start, end, **self.fields)
+        for observer in _observers:
+            observer.exit(self)
+
+    def update(self, **fields):
+        self.fields.update(fields)
+
+
+class CommandSpan(Span):
+    def __enter__(self):
+        global _depth
+
+        with _lock:
+            _depth += 1
+        _record_startup()
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _depth
+
+        super().__exit__(exc_type, exc_value, traceback)
+        with _lock:
+            _depth -= 1
+            outermost = _depth == 0
+        if outermost:
+            report()
+
+
+def enable(show_timings=False):
+    global enabled, show
+
+    enabled = True
+    show = show or show_timings
+
+
+def observe(observer):
+    # Observers have enter and exit called with every span. Observing turns
+    # on timings without reporting them.
+    global enabled
+
+    enabled = True
+    _observers.append(observer)
+
+
+def unobserve(observer):
+    _observers.remove(observer)
+
+
+def span(phase, **fields):
+    if not enabled:
+        return NULL_SPAN
+    return Span(phase, fields)
+
+
+def command(name):
+    if not enabled:
+        return NULL_SPAN
+    return CommandSpan('command', {'command': name})
+
+
+def record(phase, start, end, **fields):
+    event = {
+        'phase': phase,
+        'start_ms': round((start - STARTED) * 1000, 3),
+        'duration_ms': round((end - start) * 1000, 3),
+        'thread': threading.current_thread().name,
+    }
+    event.update(fields)
+    with _lock:
+        _events.append(event)
+
+
+def _process_age():
+    # Seconds since the interpreter started, from the start time the kernel
+    # records in clock ticks since boot. Only available on Linux.
+    try:
+        with open('/proc/self/stat') as f:
+            stat = f.read()
+        start_ticks = int(stat.rsplit(')', 1)[1].split()[19])
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf(
+            'SC_CLK_TCK'
+        )
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _record_startup():
+    global _startup_recorded
+
+    with _lock:
+        if _startup_recorded:
+            return
+        _startup_recorded = True
+
+    now = time.perf_counter()
+    age = _process_age()
+    if age is not None:
+        started = now - age
+        record('interpreter', started, min(STARTED, now))
+    # Importing vt and its dependencies up to the start of the first command
+    record('import', STARTED, now)
+
+
+def format_event(event):
+    details = ' '.join(
+        f'{key}={value}' for key, value in event.items() if key not in EVENT_KEYS
+    )
+    return (
+        f'{event["start_ms"]:10.1f} {event["duration_ms"]:10.1f}  '
+        f'{event["phase"]:<12} {details}'.rstrip()
+    )
+
+
+def write_report(events, out=None):
+    out = out or sys.stderr
+    out.write(f'{"start ms":>10} {"ms":>10}  {"phase":<12} details\n')
+    for event in sorted(events, key=lambda event: event['start_ms']):
+        out.write(format_event(event))
+        out.write('\n')
+    out.flush()
+
+
+def write_trace(events, path):
+    import json
+
+    try:
+        with open(path, 'a') as f:
+            for event in events:
+                f.write(json.dumps(event))
+                f.write('\n')
+    except OSError as e:
+        print(f'Could not write trace to {path}: {e}', file=sys.stderr)
+
+
+def report():
+    with _lock:
+        events = list(_events)
+        _events.clear()
+
+    if show:
+        write_report(events)
+    if TRACE_PATH:
+        write_trace(events, TRACE_PATH)
@@ -1,14 +1,108 @@
+import contextvars
+import gzip
+import hashlib
 import json
 import os
-
-import requests
-
-from .utils import VittlifyError, get_encoded_signature
+import random
+import threading
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+
+from . import timings
+from .bulk import BulkResult, run_bulk
+from .cache import CACHE_ENABLED, ResponseCache, get_cache_dir
+from .json_stream import CHUNK_SIZE
+from .serialization import accept_header, for_content_type
+from .session_auth import (
+    AUTH_MODE,
+    SESSION_AUTH,
+    Handshake,
+    SessionStore,
+    validate_auth_mode,
+)
+from .utils import (
+    VittlifyError,
+    get_encoded_digest_signature,
+    get_encoded_signature,
+    get_private_key_filename,
+)
 
 VITTLIFY_URL = os.environ.get('VT_URL') or 'http://127.0.0.1:8000/vittlify/'
 USERNAME = os.environ.get('VT_USERNAME') or os.environ.get('USER')
 PROXY = os.environ.get('VT_PROXY')
-REQUEST_TIMEOUT = 5
+CONNECT_TIMEOUT = float(os.environ.get('VT_CONNECT_TIMEOUT') or 3.05)
+READ_TIMEOUT = float(os.environ.get('VT_READ_TIMEOUT') or 5)
+REQUEST_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+POOL_CONNECTIONS = int(os.environ.get('VT_POOL_CONNECTIONS') or 1)
+POOL_SIZE = int(os.environ.get('VT_POOL_SIZE') or 10)
+
+# Number of items to request per page when reading item views. Unset means
+# each view is requested as a single response.
+PAGE_SIZE = int(os.environ.get('VT_PAGE_SIZE') or 0)
+DEFAULT_PAGE_SIZE = 100
+
+# Request bodies of at least COMPRESS_THRESHOLD bytes are gzipped when the
+# server accepts compressed requests. Responses are compressed by servers
+# that honour Accept-Encoding; set it to identity to turn that off.
+COMPRESS_REQUESTS = os.environ.get('VT_COMPRESS_REQUESTS', 'false').lower() == 'true'
+COMPRESS_THRESHOLD = int(os.environ.get('VT_COMPRESS_THRESHOLD') or 1024)
+COMPRESS_LEVEL = 6
+ACCEPT_ENCODING = os.environ.get('VT_ACCEPT_ENCODING') or 'gzip, deflate'
+
+# Decode item views one element at a time as they download instead of
+# building the whole response in memory first.
+STREAM_RESPONSES = os.environ.get('VT_STREAM_RESPONSES', 'false').lower() == 'true'
+
+# Failed connections, timeouts and these statuses are retried up to
+# MAX_RETRIES times, waiting a random time of up to RETRY_BACKOFF * 2 ** attempt
+# seconds (capped at RETRY_BACKOFF_MAX) between attempts. Every request a
+# command makes has to finish within COMMAND_DEADLINE seconds in total, 0
+# meaning no deadline.
+MAX_RETRIES = int(os.environ.get('VT_MAX_RETRIES') or 3)
+RETRY_BACKOFF = float(os.environ.get('VT_RETRY_BACKOFF') or 0.5)
+RETRY_BACKOFF_MAX = 8
+RETRY_STATUSES = (429, 502, 503, 504)
+# Any of those failures may happen after the server applied a mutation, so PUTs
+# and POSTs are only retried when the request never reached the server, unless
+# the server lists this capability to say it replays repeated Idempotency-Keys.
+IDEMPOTENCY_CAPABILITY = 'idempotency'
+COMMAND_DEADLINE = float(os.environ.get('VT_COMMAND_DEADLINE') or 30)
+
+# Version 1 requests wrap the JSON encoded data as a string in a JSON payload
+# next to its signature. Version 2 sends the data as the body and signs its
+# SHA-512 digest in a header. auto uses version 2 with servers that advertise
+# it.
+WIRE_FORMATS = ('auto', 'v1', 'v2')
+WIRE_FORMAT = (os.environ.get('VT_WIRE_FORMAT') or 'auto').lower()
+WIRE_VERSION_HEADER = 'X-Vittlify-Wire-Version'
+SIGNATURE_HEADER = 'X-Vittlify-Signature'
+SESSION_HEADER = 'X-Vittlify-Session'
+HMAC_HEADER = 'X-Vittlify-HMAC'
+
+# Servers that answer the capabilities endpoint with these statuses do not
+# have one and support no optional features.
+CAPABILITIES_UNSUPPORTED = (400, 404, 405)
+
+# Bulk commands send up to BATCH_SIZE operations per request to servers that
+# support batch requests.
+BATCH_REQUESTS = os.environ.get('VT_BATCH_REQUESTS', 'true').lower() == 'true'
+BATCH_SIZE = int(os.environ.get('VT_BATCH_SIZE') or 50)
+
+Operation = namedtuple('Operation', ['method', 'data'])
+
+_session = None
+_session_lock = threading.Lock()
+_response_cache = None
+_deadline = contextvars.ContextVar('vt_deadline', default=None)
+_auth_session = None
+_auth_lock = threading.Lock()
+_capabilities = None
+_capabilities_lock = threading.Lock()
+_capabilities_probe = None
+# Shopping lists seen in responses, by GUID, for completing their names
+_known_lists = {}
 
 
 def _get_proxy_dict(proxy):
@@ -27,46 +121,466 @@ def _get_proxy_dict(proxy):
     return proxy_dict
 
 
-def _send_request(method, data):
+def get_session():
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            # Includes importing requests
+            with timings.span('session'):
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                adapter = HTTPAdapter(
+                    pool_connections=POOL_CONNECTIONS,
+                    pool_maxsize=POOL_SIZE,
+                )
+
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers['Connection'] = 'keep-alive'
+                session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+                session.headers['Accept'] = accept_header()
+
+                proxies = _get_proxy_dict(PROXY)
+                if proxies:
+                    session.proxies.update(proxies)
+
+            _session = session
+    return _session
+
+
+def close_session():
+    global _session
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get_response_cache():
+    global _response_cache
+
+    with _session_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache(
+                get_cache_dir(), namespace=f'{VITTLIFY_URL}|{USERNAME}'
+            )
+    return _response_cache
+
+
+def get_session_store():
+    return SessionStore(
+        get_cache_dir(),
+        namespace=f'{VITTLIFY_URL}|{USERNAME}|{get_private_key_filename()}',
+    )
+
+
+def get_auth_session():
+    global _auth_session
+
+    with _auth_lock:
+        if _auth_session is None or _auth_session.expired():
+            store = get_session_store()
+            session = store.load()
+            if session is None or session.expired():
+                session = _start_auth_session()
+                store.save(session)
+            _auth_session = session
+    return _auth_session
+
+
+def clear_auth_session():
+    global _auth_session
+
+    with _auth_lock:
+        _auth_session = None
+        get_session_store().clear()
+
+
+def _start_auth_session():
+    handshake = Handshake()
+    data = {
+        'endpoint': 'session',
+        'username': USERNAME,
+        'public_key': handshake.public_key,
+    }
+    message = json.dumps(data)
+    encoded_sig = get_encoded_signature(message.encode('utf-8'))
+    payload = {'message': message, 'signature': encoded_sig.decode('utf-8')}
+
+    with timings.span('handshake'):
+        resp = _request('POST', {}, {'json': payload}, endpoint='session')
+
+    if resp.status_code in (401, 403, 404, 409):
+        raise VittlifyError(f'Could not start a session: {_decode(resp)}')
+
+    resp.raise_for_status()
+    return handshake.complete(_decode(resp))
+
+
+def _build_payload(method, data):
     data['username'] = USERNAME
     message = json.dumps(data)
+
+    if AUTH_MODE == SESSION_AUTH:
+        if method.lower() not in ('get', 'put', 'post'):
+            raise VittlifyError(f'Unsupported request method {method}')
+
+        payload = {'message': message}
+        payload.update(get_auth_session().authenticate(message.encode('utf-8')))
+        return payload
+
+    validate_auth_mode(AUTH_MODE)
     encoded_sig = get_encoded_signature(message.encode('utf-8'))
 
-    payload = {'message': message, 'signature': encoded_sig.decode('utf-8')}
+    if method.lower() not in ('get', 'put', 'post'):
+        raise VittlifyError(f'Unsupported request method {method}')
+
+    return {'message': message, 'signature': encoded_sig.decode('utf-8')}
 
-    if method.lower() == 'get':
-        resp = requests.get(
-            VITTLIFY_URL + 'vt/',
-            json=payload,
-            proxies=_get_proxy_dict(PROXY),
-            timeout=REQUEST_TIMEOUT,
+
+def _wire_version(data):
+    if WIRE_FORMAT not in WIRE_FORMATS:
+        raise VittlifyError(
+            f'Unknown wire format {WIRE_FORMAT}. '
+            f'Expected one of {", ".join(WIRE_FORMATS)}'
         )
-    elif method.lower() == 'put':
-        resp = requests.put(
-            VITTLIFY_URL + 'vt/',
-            json=payload,
-            proxies=_get_proxy_dict(PROXY),
-            timeout=REQUEST_TIMEOUT,
+
+    # Capabilities are requested the way every server understands
+    if WIRE_FORMAT == 'v1' or data.get('endpoint') == 'capabilities':
+        return 1
+    if WIRE_FORMAT == 'v2':
+        return 2
+
+    # Without the cache an answer found in the background would be lost when
+    # vt exits, so it is waited for once per process.
+    if not CACHE_ENABLED:
+        return 2 if _has_capability('v2') else 1
+
+    # Until the capabilities are known requests use version 1 rather than
+    # waiting for them, and they are asked for alongside this request.
+    capabilities = _cached_capabilities()
+    if capabilities is None:
+        _probe_capabilities()
+        return 1
+    return 2 if 'v2' in capabilities else 1
+
+
+def _build_body(method, data, headers):
+    data['username'] = USERNAME
+    if method.lower() not in ('get', 'put', 'post'):
+        raise VittlifyError(f'Unsupported request method {method}')
+
+    # The data is encoded once and servers can hash the body as it arrives
+    # rather than decoding it twice.
+    body = json.dumps(data).encode('utf-8')
+    digest = hashlib.sha512(body).digest()
+
+    headers[WIRE_VERSION_HEADER] = '2'
+    if AUTH_MODE == SESSION_AUTH:
+        auth = get_auth_session().authenticate(digest)
+        headers[SESSION_HEADER] = auth['session']
+        headers[HMAC_HEADER] = auth['hmac']
+    else:
+        validate_auth_mode(AUTH_MODE)
+        headers[SIGNATURE_HEADER] = get_encoded_digest_signature(digest).decode('utf-8')
+    return body
+
+
+def _request_body(payload, headers):
+    if isinstance(payload, bytes):
+        # Version 2 bodies are already encoded
+        headers['Content-Type'] = 'application/json'
+        body = payload
+        if not COMPRESS_REQUESTS or len(body) < COMPRESS_THRESHOLD:
+            return {'data': body}
+    else:
+        if not COMPRESS_REQUESTS:
+            return {'json': payload}
+
+        body = json.dumps(payload).encode('utf-8')
+        if len(body) < COMPRESS_THRESHOLD:
+            return {'json': payload}
+
+    headers['Content-Type'] = 'application/json'
+    headers['Content-Encoding'] = 'gzip'
+    return {'data': gzip.compress(body, compresslevel=COMPRESS_LEVEL)}
+
+
+def _serializer(resp):
+    return for_content_type(resp.headers.get('Content-Type'))
+
+
+def _decode(resp):
+    return _serializer(resp).load_response(resp)
+
+
+def _describe_response(span, resp, stream):
+    # Content-Length is the size on the wire, before any decompression.
+    # Streamed bodies without one have not been read yet.
+    received = resp.headers.get('Content-Length')
+    if received is not None:
+        received = int(received)
+    elif not stream:
+        received = len(resp.content)
+
+    span.update(
+        status=resp.status_code,
+        sent=len(resp.request.body or b''),
+        received=received,
+        # Time from sending the request to parsing the response headers,
+        # which covers DNS, connecting, TLS and the server's own time.
+        headers_ms=round(resp.elapsed.total_seconds() * 1000, 3),
+    )
+    server_timing = resp.headers.get('Server-Timing')
+    if server_timing:
+        span.update(server=server_timing)
+
+
+@contextmanager
+def command_deadline(seconds=None):
+    seconds = COMMAND_DEADLINE if seconds is None else seconds
+    token = _deadline.set(time.monotonic() + seconds if seconds else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _remaining():
+    expires = _deadline.get()
+    return None if expires is None else expires - time.monotonic()
+
+
+def _timeout():
+    remaining = _remaining()
+    if remaining is None:
+        return REQUEST_TIMEOUT
+    if remaining <= 0:
+        raise VittlifyError(
+            'Gave up waiting for the Vittlify server, deadline exceeded'
         )
-    elif method.lower() == 'post':
-        resp = requests.post(
-            VITTLIFY_URL + 'vt/',
-            json=payload,
-            proxies=_get_proxy_dict(PROXY),
-            timeout=REQUEST_TIMEOUT,
+    return tuple(min(timeout, remaining) for timeout in REQUEST_TIMEOUT)
+
+
+def _retry_delay(attempt, resp=None):
+    delay = random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2**attempt))
+
+    retry_after = resp.headers.get('Retry-After') if resp is not None else None
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, int(retry_after))
+    return delay
+
+
+def _never_sent(error):
+    # The connection could not be opened so the server never saw the request
+    from requests import exceptions
+
+    if isinstance(error, exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, exceptions.ConnectionError) or not error.args:
+        return False
+
+    from urllib3.exceptions import NewConnectionError
+
+    reason = getattr(error.args[0], 'reason', error.args[0])
+    return isinstance(reason, NewConnectionError)
+
+
+def _replays_mutations(endpoint):
+    # A repeated handshake only starts an unused session. Asking for the
+    # capabilities while starting one would need the session being started.
+    if endpoint == 'session':
+        return True
+    return _has_capability(IDEMPOTENCY_CAPABILITY)
+
+
+def _request(method, headers, body, stream=False, endpoint=None):
+    """Send a request, retrying failures that are safe to retry.
+
+    GETs do not change anything so every failure is retried. PUTs and POSTs
+    carry an Idempotency-Key but are only retried after failures that could
+    have reached the server when it replays the result of a repeated key
+    rather than applying the mutation again.
+    """
+    session = get_session()
+    from requests import exceptions
+
+    mutation = method.upper() in ('PUT', 'POST')
+    if mutation:
+        headers.setdefault('Idempotency-Key', uuid.uuid4().hex)
+
+    attempt = 0
+    while True:
+        resp = error = None
+        try:
+            with timings.span(
+                'request', method=method.upper(), endpoint=endpoint, attempt=attempt + 1
+            ) as span:
+                resp = session.request(
+                    method.upper(),
+                    VITTLIFY_URL + 'vt/',
+                    headers=headers,
+                    timeout=_timeout(),
+                    stream=stream,
+                    **body,
+                )
+                if timings.enabled:
+                    _describe_response(span, resp, stream)
+        except (exceptions.ConnectionError, exceptions.Timeout) as e:
+            error = e
+        else:
+            if resp.status_code not in RETRY_STATUSES:
+                return resp
+
+        delay = _retry_delay(attempt, resp)
+        remaining = _remaining()
+        if (
+            attempt >= MAX_RETRIES
+            or (remaining is not None and delay >= remaining)
+            or (
+                mutation and not _never_sent(error) and not _replays_mutations(endpoint)
+            )
+        ):
+            if error is not None:
+                raise error
+            return resp
+
+        if resp is not None:
+            resp.close()
+        with timings.span('retry wait', endpoint=endpoint, attempt=attempt + 1):
+            time.sleep(delay)
+        attempt += 1
+
+
+def _encode(method, data, headers):
+    if _wire_version(data) == 2:
+        return _request_body(_build_body(method, data, headers), headers)
+    return _request_body(_build_payload(method, data), headers)
+
+
+def _send(method, data, headers, stream=False):
+    endpoint = data.get('endpoint')
+    resp = _request(
+        method,
+        headers,
+        _encode(method, data, headers),
+        stream=stream,
+        endpoint=endpoint,
+    )
+
+    if resp.status_code == 401 and AUTH_MODE == SESSION_AUTH:
+        # The server no longer accepts the session so start a new one
+        resp.close()
+        clear_auth_session()
+        resp = _request(
+            method,
+            headers,
+            _encode(method, data, headers),
+            stream=stream,
+            endpoint=endpoint,
         )
+    return resp
+
+
+def _send_request(method, data):
+    cache = get_response_cache() if CACHE_ENABLED else None
+    cache_key = cache.key_for(data) if cache and method.lower() == 'get' else None
+    cached = cache.get(cache_key, fields=data.get('fields')) if cache_key else None
+
+    if cached is not None and cache.is_fresh(cache_key, cached):
+        with timings.span('cache hit', endpoint=data.get('endpoint')):
+            return cached['body']
+
+    headers = {}
+    if cached is not None and cached['etag']:
+        headers['If-None-Match'] = cached['etag']
+
+    requested = time.time()
+    resp = _send(method, data, headers)
+
+    if cached is not None and resp.status_code == 304:
+        cache.refresh(cache_key, cached, requested)
+        return cached['body']
 
     if resp.status_code in (404, 409):
-        raise VittlifyError(resp.json())
+        raise VittlifyError(_decode(resp))
 
     resp.raise_for_status()
-    return resp.json()
+    serializer = _serializer(resp)
+    with timings.span('decode', endpoint=data.get('endpoint'), format=serializer.name):
+        body = serializer.load_response(resp)
+
+    if cache_key:
+        cache.set(
+            cache_key,
+            body,
+            etag=resp.headers.get('ETag'),
+            requested=requested,
+            fields=data.get('fields'),
+        )
+    elif cache and method.lower() != 'get':
+        cache.invalidate_mutation(data)
+    return body
+
+
+def _iter_response(resp):
+    try:
+        yield from _serializer(resp).iter_items(resp.iter_content(CHUNK_SIZE))
+    finally:
+        resp.close()
+
+
+def _stream_request(method, data):
+    """Send a request and return an iterator over the items of its response.
+
+    The request is sent immediately so errors are raised here, but the body is
+    only read and decoded as the iterator is consumed. Streamed responses skip
+    the response cache since caching them would mean holding the whole body.
+    """
+    # Compressed responses are decompressed incrementally by iter_content.
+    # Only sending the request is retried, not reading the body.
+    resp = _send(method, data, {}, stream=True)
+
+    if resp.status_code in (404, 409):
+        raise VittlifyError(_decode(resp))
+
+    resp.raise_for_status()
+    return _iter_response(resp)
+
+
+def _remember_lists(shopping_lists):
+    for shopping_list in shopping_lists:
+        if isinstance(shopping_list, dict) and shopping_list.get('guid'):
+            _known_lists[shopping_list['guid']] = shopping_list
+
+
+def known_shopping_lists():
+    """Return the shopping lists seen so far without asking the server.
+
+    These are the lists from responses received by this process plus any
+    cached list of all lists, however old.
+    """
+    shopping_lists = dict(_known_lists)
+    if CACHE_ENABLED:
+        cache = get_response_cache()
+        cached = cache.get(cache.key_for({'endpoint': 'all lists'}))
+        if cached is not None and isinstance(cached['body'], list):
+            for shopping_list in cached['body']:
+                if isinstance(shopping_list, dict):
+                    shopping_lists.setdefault(shopping_list.get('guid'), shopping_list)
+    return list(shopping_lists.values())
 
 
 def get_all_shopping_lists():
     data = {'endpoint': 'all lists'}
 
-    return _send_request('GET', data)
+    shopping_lists = _send_request('GET', data)
+    _remember_lists(shopping_lists)
+    return shopping_lists
 
 
 def get_shopping_list_info(guid):
@@ -74,30 +588,123 @@ def get_shopping_list_info(guid):
         'endpoint': 'list',
         'guid': guid,
     }
-    return _send_request('GET', data)
+    shopping_list = _send_request('GET', data)
+    _remember_lists([shopping_list])
+    return shopping_list
+
+
+def _add_page_params(data, page=None, page_size=None, cursor=None):
+    for key, value in (('page', page), ('page_size', page_size), ('cursor', cursor)):
+        if value is not None:
+            data[key] = value
+    return data
 
 
-def get_shopping_list_items(guid):
+def _add_fields(data, fields=None):
+    # Servers that support projections only return these fields of each item,
+    # others ignore it and return whole items.
+    if fields is not None:
+        data['fields'] = list(fields)
+    return data
+
+
+def get_shopping_list_items(
+    guid, page=None, page_size=None, cursor=None, stream=False, fields=None
+):
     data = {
         'endpoint': 'list items',
         'guid': guid,
     }
-    return _send_request('GET', data)
+    _add_page_params(data, page=page, page_size=page_size, cursor=cursor)
+    _add_fields(data, fields)
+    return (_stream_request if stream else _send_request)('GET', data)
 
 
-def get_all_shopping_list_items(guid):
+def get_all_shopping_list_items(
+    guid, page=None, page_size=None, cursor=None, stream=False, fields=None
+):
     data = {
         'endpoint': 'list all items',
         'guid': guid,
     }
-    return _send_request('GET', data)
+    _add_page_params(data, page=page, page_size=page_size, cursor=cursor)
+    _add_fields(data, fields)
+    return (_stream_request if stream else _send_request)('GET', data)
 
 
-def get_completed():
+def get_completed(page=None, page_size=None, cursor=None, stream=False, fields=None):
     data = {
         'endpoint': 'completed',
     }
-    return _send_request('GET', data)
+    _add_page_params(data, page=page, page_size=page_size, cursor=cursor)
+    _add_fields(data, fields)
+    return (_stream_request if stream else _send_request)('GET', data)
+
+
+def split_page(body):
+    # Paged responses look like {"results": [...], "next": cursor}. Servers
+    # without paging support ignore the page parameters and return every item
+    # as a plain list, which is treated as the only page.
+    if isinstance(body, dict) and 'results' in body:
+        return body['results'], body.get('next')
+    return body, None
+
+
+def get_page(fetch, page=None, page_size=None):
+    page = page or 1
+    page_size = page_size or PAGE_SIZE or DEFAULT_PAGE_SIZE
+
+    body = fetch(page=page, page_size=page_size)
+    items, _ = split_page(body)
+
+    if not isinstance(body, dict):
+        items = items[(page - 1) * page_size : page * page_size]
+    return items
+
+
+def iter_pages(fetch, page_size=None, cursor=None, prefetch=True):
+    """Yield the items of each page returned by fetch, following next cursors.
+
+    With prefetch the request for the next page is sent as soon as a page
+    arrives so it downloads while the caller works through the current one.
+    """
+    executor = None
+
+    def fetch_page(cursor):
+        return split_page(
+            fetch(**_add_page_params({}, page_size=page_size, cursor=cursor))
+        )
+
+    try:
+        items, next_cursor = fetch_page(cursor)
+        while True:
+            pending = None
+            if next_cursor is not None and prefetch:
+                if executor is None:
+                    from concurrent.futures import ThreadPoolExecutor
+
+                    executor = ThreadPoolExecutor(max_workers=1)
+                pending = executor.submit(
+                    contextvars.copy_context().run, fetch_page, next_cursor
+                )
+
+            yield items
+
+            if next_cursor is None:
+                return
+            items, next_cursor = (
+                pending.result() if pending is not None else fetch_page(next_cursor)
+            )
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_items(fetch, page_size=None, cursor=None, prefetch=True):
+    for items in iter_pages(
+        fetch, page_size=page_size, cursor=cursor, prefetch=prefetch
+    ):
+        yield from items
 
 
 def get_item(guid):
@@ -108,15 +715,19 @@ def get_item(guid):
     return _send_request('GET', data)
 
 
-def complete_item(guid, uncomplete=False):
+def complete_operation(guid, uncomplete=False):
     data = {
         'endpoint': 'complete' if not uncomplete else 'uncomplete',
         'guid': guid,
     }
-    return _send_request('PUT', data)
+    return Operation('PUT', data)
 
 
-def modify_item(guid, comments, append=False, delete=False):
+def complete_item(guid, uncomplete=False):
+    return _send_request(*complete_operation(guid, uncomplete=uncomplete))
+
+
+def modify_operation(guid, comments, append=False, delete=False):
     data = {
         'endpoint': 'modify',
         'guid': guid,
@@ -124,27 +735,207 @@ def modify_item(guid, comments, append=False, delete=False):
         'append': append,
         'delete': delete,
     }
-    return _send_request('PUT', data)
+    return Operation('PUT', data)
 
 
-def add_item(guid, name, comments=''):
+def modify_item(guid, comments, append=False, delete=False):
+    return _send_request(
+        *modify_operation(guid, comments, append=append, delete=delete)
+    )
+
+
+def add_operation(guid, name, comments=''):
     data = {'endpoint': 'add item', 'guid': guid, 'name': name, 'comments': comments}
-    return _send_request('POST', data)
+    return Operation('POST', data)
 
 
-def move_item(guid, to_guid):
+def add_item(guid, name, comments=''):
+    return _send_request(*add_operation(guid, name, comments=comments))
+
+
+def move_operation(guid, to_guid):
     data = {
         'endpoint': 'move',
         'guid': guid,
         'to_list_guid': to_guid,
     }
-    return _send_request('PUT', data)
+    return Operation('PUT', data)
 
 
-def categorize_item(guid, category_name):
+def move_item(guid, to_guid):
+    return _send_request(*move_operation(guid, to_guid))
+
+
+def categorize_operation(guid, category_name):
     data = {
         'endpoint': 'categorize',
         'guid': guid,
         'category_name': category_name,
     }
-    return _send_request('PUT', data)
+    return Operation('PUT', data)
+
+
+def categorize_item(guid, category_name):
+    return _send_request(*categorize_operation(guid, category_name))
+
+
+def _capability_list(body):
+    capabilities = body.get('capabilities') if isinstance(body, dict) else None
+    if not isinstance(capabilities, list):
+        return ()
+    return tuple(name for name in capabilities if isinstance(name, str))
+
+
+def _cached_capabilities():
+    # The capabilities if they are known without asking the server, or None
+    global _capabilities
+
+    if _capabilities is None and CACHE_ENABLED:
+        cache = get_response_cache()
+        cache_key = cache.key_for({'endpoint': 'capabilities'})
+        cached = cache.get(cache_key)
+        if cached is not None and cache.is_fresh(cache_key, cached):
+            _capabilities = _capability_list(cached['body'])
+    return _capabilities
+
+
+def get_capabilities():
+    """Return the optional features the server advertises.
+
+    Servers without a capabilities endpoint support none of them. That answer
+    is cached like any other response so later runs do not ask again until it
+    expires, but other errors are raised and not remembered. Concurrent
+    callers wait for a single request.
+    """
+    global _capabilities
+
+    with _capabilities_lock:
+        if _cached_capabilities() is None:
+            requested = time.time()
+            resp = _send('GET', {'endpoint': 'capabilities'}, {})
+            if resp.status_code in CAPABILITIES_UNSUPPORTED:
+                resp.close()
+                body = {}
+            else:
+                resp.raise_for_status()
+                body = _decode(resp)
+
+            if CACHE_ENABLED:
+                cache = get_response_cache()
+                cache.set(
+                    cache.key_for({'endpoint': 'capabilities'}),
+                    body,
+                    requested=requested,
+                )
+            _capabilities = _capability_list(body)
+    return _capabilities
+
+
+def _has_capability(name):
+    # Capabilities are optional so a server that fails to list them is treated
+    # as supporting none.
+    from requests import exceptions
+
+    try:
+        return name in get_capabilities()
+    except (VittlifyError, exceptions.RequestException):
+        return False
+
+
+def _probe():
+    from requests import exceptions
+
+    try:
+        get_capabilities()
+    except (VittlifyError, exceptions.RequestException):
+        pass
+
+
+def _probe_capabilities():
+    """Ask for the capabilities in the background, once per process.
+
+    The thread is not a daemon so the answer is cached before vt exits, and it
+    shares the command deadline.
+    """
+    global _capabilities_probe
+
+    with _session_lock:
+        if _capabilities_probe is None:
+            _capabilities_probe = threading.Thread(
+                target=contextvars.copy_context().run,
+                args=(_probe,),
+                name='capabilities',
+            )
+            _capabilities_probe.start()
+    return _capabilities_probe
+
+
+def _operation_result(result):
+    status = result.get('status', 200)
+    body = result.get('body')
+
+    if status in (404, 409):
+        return None, VittlifyError(body)
+    if status >= 400:
+        return None, VittlifyError(f'Server responded with {status}: {body}')
+    return body, None
+
+
+def send_batch(operations):
+    """Send operations in a single request.
+
+    Returns a (value, error) pair for each operation, in order, where error is
+    the VittlifyError the operation would have raised on its own.
+    """
+    data = {
+        'endpoint': 'batch',
+        'operations': [
+            {'method': operation.method, 'data': operation.data}
+            for operation in operations
+        ],
+    }
+    body = _send_request('POST', data)
+
+    results = body.get('results') if isinstance(body, dict) else None
+    if not isinstance(results, list) or len(results) != len(operations):
+        raise VittlifyError('Server sent an invalid batch response')
+
+    if CACHE_ENABLED:
+        cache = get_response_cache()
+        for operation in operations:
+            cache.invalidate_mutation(operation.data)
+    return [_operation_result(result) for result in results]
+
+
+def run_bulk_requests(func, operation, targets, max_workers=None):
+    """Like run_bulk, but batch the requests when the server supports it.
+
+    operation builds the request func would send for a target. Batches of up
+    to BATCH_SIZE operations are sent concurrently. Without batch support
+    func is run for each target instead.
+    """
+    if len(targets) < 2 or not BATCH_REQUESTS or not _has_capability('batch'):
+        return run_bulk(func, targets, max_workers=max_workers)
+
+    chunks = [
+        targets[start : start + BATCH_SIZE]
+        for start in range(0, len(targets), BATCH_SIZE)
+    ]
+    batches = run_bulk(
+        lambda chunk: send_batch([operation(target) for target in chunk]),
+        chunks,
+        max_workers=max_workers,
+    )
+
+    results = []
+    for batch in batches:
+        if batch.error is not None:
+            results.extend(
+                BulkResult(target, None, batch.error) for target in batch.target
+            )
+        else:
+            results.extend(
+                BulkResult(target, value, error)
+                for target, (value, error) in zip(batch.target, batch.value)
+            )
+    return results
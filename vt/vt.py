@@ -2,12 +2,21 @@ from __future__ import print_function
 
 import os
 import sys
+from contextlib import nullcontext
 from enum import Enum
-
-import requests
-from blessings import Terminal
-
+from functools import partial
+
+from . import timings
+from .batch import run_batch
+from .bulk import run_concurrently
+from .guid_index import (
+    get_guid_index,
+    guid_abbrev_length,
+    remember_guids,
+    resolve_guid,
+)
 from .help import (
+    BATCH_HELP,
     CATEGORIES_HELP,
     CATEGORIZE_HELP,
     COMMENT_HELP,
@@ -16,37 +25,69 @@ from .help import (
     LIST_HELP,
     LISTS_HELP,
     MOVE_HELP,
+    SETTINGS_HELP,
+    SHELL_HELP,
     UNDONE_HELP,
 )
+from .output import (
+    CATEGORY_FIELDS,
+    ITEM_FIELDS,
+    LIST_FIELDS,
+    validate_format,
+    write_object,
+    write_objects,
+)
+from .profiling import profile_args, run_profiled
+from .render import RowFormatter, row_fields
+from .shell import run_shell
 from .utils import (
     VittlifyError,
     apply_strikethrough,
     format_row,
+    parse_count,
     parse_options,
+    positional_args,
     print_table,
+    term,
 )
 from .vittlify_request import (
+    PAGE_SIZE,
     PROXY,
+    STREAM_RESPONSES,
     VITTLIFY_URL,
     add_item,
     categorize_item,
+    categorize_operation,
+    command_deadline,
     complete_item,
+    complete_operation,
     get_all_shopping_list_items,
     get_all_shopping_lists,
     get_completed,
     get_item,
+    get_page,
     get_shopping_list_info,
     get_shopping_list_items,
+    iter_items,
     modify_item,
     move_item,
+    move_operation,
+    run_bulk_requests,
 )
 
-term = Terminal()
-
 SHOW_TRACEBACK = os.environ.get('VT_SHOW_TRACEBACK', 'false').lower() == 'true'
 DEFAULT_LIST = os.environ.get('VT_DEFAULT_LIST', '')
 
 
+def _request_exceptions():
+    # requests is only imported once a command talks to the server. Except
+    # clauses are evaluated lazily so this is only called while handling an
+    # exception.
+    import requests
+
+    return requests.exceptions
+
+
 class StrEnum(str, Enum):
     @classmethod
     def from_string(cls, str_type):
@@ -66,6 +107,15 @@ class Status(StrEnum):
     ALL = 'ALL'
 
 
+def _remembered(items):
+    # Keep only the GUIDs so streamed items can be released once written
+    guids = []
+    for item in items:
+        guids.append(item.get('guid'))
+        yield item
+    get_guid_index().remember(guids)
+
+
 def display_shopping_list(
     guid=None,
     extended=False,
@@ -74,54 +124,147 @@ def display_shopping_list(
     unfinished=False,
     include_category=False,
     no_wrap=False,
+    output_format=None,
+    limit=None,
+    page=None,
 ):
-    data = []
+    if output_format:
+        validate_format(output_format)
+
+    # Only the fields that will be shown are fetched. Recently completed items
+    # are never shown with categories since they have no single list. JSON
+    # output is the server's objects as they are.
+    if output_format in ('json', 'ndjson'):
+        fields = None
+    elif output_format:
+        fields = ITEM_FIELDS
+    else:
+        fields = row_fields(
+            include_comments=extended,
+            include_category=include_category and mode != Status.COMPLETED,
+        )
 
-    shopping_list = None
     if mode == Status.NOT_COMPLETED or unfinished:
-        shopping_list = get_shopping_list_info(guid)
-        title = shopping_list['name']
-        items = get_shopping_list_items(guid)
+        fetch_items = partial(get_shopping_list_items, guid, fields=fields)
     elif mode == Status.COMPLETED:
-        items = get_completed()
-        title = 'Recently Completed'
-    elif mode == Status.ALL:
-        shopping_list = get_shopping_list_info(guid)
-        title = shopping_list['name']
-        items = get_all_shopping_list_items(guid)
+        fetch_items = partial(get_completed, fields=fields)
+    else:
+        fetch_items = partial(get_all_shopping_list_items, guid, fields=fields)
+
+    page_options = None
+    if limit is not None or page is not None:
+        page_options = {
+            'page': parse_count(page, '--page') if page is not None else None,
+            'page_size': parse_count(limit, '--limit') if limit is not None else None,
+        }
+    stream = STREAM_RESPONSES and page_options is None
+
+    def load_items():
+        if page_options is not None:
+            return get_page(fetch_items, **page_options)
+        if stream:
+            return fetch_items(stream=True)
+        return iter_items(fetch_items, page_size=PAGE_SIZE or None)
+
+    if output_format:
+        # Machine readable output has no title so the list info is not needed
+        write_objects(_remembered(load_items()), output_format, ITEM_FIELDS)
+        return
+
+    # Streamed items are decoded lazily while the table is written
+    load_rows = load_items if stream else lambda: list(load_items())
 
-    for item in items:
-        data.append(
-            format_row(
-                item,
-                shopping_list,
-                include_comments=extended,
-                include_category=include_category,
-                no_wrap=no_wrap,
+    shopping_list = None
+    # The list info is only needed for the title and categories so it is
+    # fetched alongside the items rather than before them.
+    with timings.span('fetch', stream=stream):
+        if mode == Status.COMPLETED:
+            items = load_rows()
+            title = 'Recently Completed'
+        else:
+            shopping_list, items = run_concurrently(
+                lambda: get_shopping_list_info(guid),
+                load_rows,
             )
-        )
+            title = shopping_list['name']
 
+    if stream:
+        # GUIDs are only known once every item has been read so abbreviate
+        # them using the GUIDs seen before.
+        guid_length = guid_abbrev_length()
+        items = _remembered(items)
+    else:
+        guid_length = remember_guids(items)
+
+    formatter = RowFormatter(
+        shopping_list,
+        include_comments=extended,
+        include_category=include_category,
+        no_wrap=no_wrap,
+        guid_length=guid_length,
+    )
+    data = (formatter.format(item) for item in items)
+
+    # Items already in memory are all measured so columns fit every row.
+    # Only streamed tables size their columns from a sample.
+    if not stream:
+        with timings.span('format'):
+            data = list(data)
     print_table(data, title=title, quiet=quiet)
 
 
-def display_item(guid, no_wrap=False):
+def display_item(guid, no_wrap=False, output_format=None):
+    if output_format:
+        validate_format(output_format)
+
     item = get_item(guid)
-    print_table([format_row(item, None, include_comments=True, no_wrap=no_wrap)])
+    guid_length = remember_guids([item])
+
+    if output_format:
+        write_object(item, output_format, ITEM_FIELDS)
+        return
+
+    print_table(
+        [
+            format_row(
+                item,
+                None,
+                include_comments=True,
+                no_wrap=no_wrap,
+                guid_length=guid_length,
+            )
+        ]
+    )
+
 
+def display_all_shopping_lists(no_wrap=False, output_format=None):
+    if output_format:
+        validate_format(output_format)
 
-def display_all_shopping_lists(no_wrap=False):
     shopping_lists = get_all_shopping_lists()
-    data = []
-    for shopping_list in shopping_lists:
-        data.append(format_row(shopping_list, None, no_wrap=no_wrap))
+    guid_length = remember_guids(shopping_lists)
+
+    if output_format:
+        write_objects(shopping_lists, output_format, LIST_FIELDS)
+        return
+
+    formatter = RowFormatter(None, no_wrap=no_wrap, guid_length=guid_length)
+    data = [formatter.format(shopping_list) for shopping_list in shopping_lists]
 
     print_table(data, title='All Lists')
 
 
-def display_shopping_list_categories(guid):
+def display_shopping_list_categories(guid, output_format=None):
+    if output_format:
+        validate_format(output_format)
+
     shopping_list = get_shopping_list_info(guid)
     list_categories = shopping_list.get('categories')
 
+    if output_format:
+        write_objects(list_categories or [], output_format, CATEGORY_FIELDS)
+        return
+
     data = []
 
     if not list_categories:
@@ -136,15 +279,15 @@ def show(args):
     cmd = args.pop(0).lower()
     raw_options = args
     options = parse_options(raw_options)
+    positional = positional_args(raw_options)
+    format_options = (
+        {'output_format': options['output_format']}
+        if 'output_format' in options
+        else {}
+    )
 
     if cmd == 'list':
-        guid = None
-
-        for i in range(len(raw_options)):
-            if raw_options[i].startswith('-'):
-                continue
-            else:
-                guid = raw_options[i]
+        guid = positional[-1] if positional else None
 
         if not guid:
             guid = DEFAULT_LIST
@@ -153,54 +296,72 @@ def show(args):
             raise IndexError('Incorrect number of arguments')
 
         try:
-            display_shopping_list(guid=guid, **options)
+            display_shopping_list(guid=resolve_guid(guid), **options)
         except VittlifyError as e:
             print(term.red(f"{e}"))
 
     elif cmd == 'lists':
         try:
-            display_all_shopping_lists()
+            display_all_shopping_lists(**format_options)
         except VittlifyError as e:
             print(term.red(f"{e}"))
     elif cmd in ('show', 'item'):
-        guid = raw_options.pop(0)
+        guid = positional[0] if positional else raw_options[0]
 
         if not guid:
             raise IndexError('Incorrect number of arguments')
 
         try:
-            display_item(guid)
+            display_item(resolve_guid(guid), **format_options)
         except VittlifyError as e:
             print(term.red(f"{e}"))
 
 
+def report_bulk(results, success_message):
+    failures = [result for result in results if result.error is not None]
+
+    for result in results:
+        if result.error is None:
+            print(success_message(result))
+        elif len(results) > 1:
+            print(term.red(f'{result.target}: {result.error}'))
+
+    if failures:
+        if len(results) == 1:
+            raise failures[0].error
+        raise VittlifyError(f'{len(failures)} of {len(results)} items failed')
+
+
 def complete(args, uncomplete=False):
     raw_options = args
     options = parse_options(raw_options)
 
-    arg_count = 0
-    for val in args:
-        if not val.strip().startswith('-'):
-            arg_count += 1
+    guids = [resolve_guid(val) for val in positional_args(args)]
 
-    if not arg_count:
+    if not guids:
         display_shopping_list(mode=Status.COMPLETED, **options)
     else:
-        while args:
-            guid = args.pop(0)
-            resp = complete_item(guid, uncomplete=uncomplete)
-
-            if not uncomplete:
-                print(
-                    f'Marked {term.magenta}{apply_strikethrough(resp["name"])}{term.normal} as done.'
-                )
-            else:
-                print(f'Marked {term.magenta}{resp["name"]}{term.normal} undone.')
+        results = run_bulk_requests(
+            lambda guid: complete_item(guid, uncomplete=uncomplete),
+            lambda guid: complete_operation(guid, uncomplete=uncomplete),
+            guids,
+        )
+
+        if not uncomplete:
+            report_bulk(
+                results,
+                lambda result: f'Marked {term.magenta}{apply_strikethrough(result.value["name"])}{term.normal} as done.',
+            )
+        else:
+            report_bulk(
+                results,
+                lambda result: f'Marked {term.magenta}{result.value["name"]}{term.normal} undone.',
+            )
 
 
 def modify(args):
     options = parse_options(args)
-    guid = args.pop(0).lower()
+    guid = resolve_guid(args.pop(0).lower())
 
     comments = ' '.join([arg for arg in args if not arg.startswith('-') or ' ' in arg])
     modify_item(guid, comments, **options)
@@ -214,24 +375,38 @@ def add(args, no_wrap=False):
         else:
             raise IndexError
     else:
-        guid = args.pop(0).lower()
+        guid = resolve_guid(args.pop(0).lower())
     name = args.pop(0)
 
     item = add_item(guid, name)
-    print_table([format_row(item, no_wrap=no_wrap)])
+    guid_length = remember_guids([item])
+    print_table([format_row(item, no_wrap=no_wrap, guid_length=guid_length)])
 
 
 def move(args):
-    guid = args.pop(0).lower()
-    to_guid = args.pop(0).lower()
-    move_item(guid, to_guid)
-    print(
-        f'Moved item {term.blue}{guid}{term.normal} to list {term.blue}{to_guid}{term.normal}'
+    if len(args) < 2:
+        raise IndexError(
+            'Incorrect number of arguments. Expected at least 2, got %s' % len(args)
+        )
+
+    guids = [resolve_guid(guid.lower()) for guid in args[:-1]]
+    to_guid = resolve_guid(args[-1].lower())
+
+    results = run_bulk_requests(
+        lambda guid: move_item(guid, to_guid),
+        lambda guid: move_operation(guid, to_guid),
+        guids,
+    )
+    report_bulk(
+        results,
+        lambda result: f'Moved item {term.blue}{result.target}{term.normal} to list {term.blue}{to_guid}{term.normal}',
     )
 
 
 def categories(args):
-    guid = args.pop(0).lower() if len(args) > 0 else None
+    options = parse_options(args)
+    positional = positional_args(args)
+    guid = positional[0].lower() if positional else None
 
     if not guid:
         guid = DEFAULT_LIST
@@ -240,29 +415,62 @@ def categories(args):
         raise IndexError('Incorrect number of arguments')
 
     try:
-        display_shopping_list_categories(guid)
+        if 'output_format' in options:
+            display_shopping_list_categories(
+                resolve_guid(guid), output_format=options['output_format']
+            )
+        else:
+            display_shopping_list_categories(resolve_guid(guid))
     except VittlifyError as e:
         print(term.red(f"{e}"))
 
 
 def categorize(args):
-    if len(args) != 2:
+    if len(args) < 2:
         raise IndexError(
-            'Incorrect number of arguments. Expected 2, got %s' % len(args)
+            'Incorrect number of arguments. Expected at least 2, got %s' % len(args)
         )
 
-    guid = args.pop(0).lower()
-    category_name = args.pop(0).lower()
+    guids = [resolve_guid(guid.lower()) for guid in args[:-1]]
+    category_name = args[-1].lower()
 
     try:
-        item = categorize_item(guid, category_name)
-        print(
-            f'Set item {term.blue}{item["name"]}{term.normal} to category {term.blue}{category_name.title()}{term.normal}'
+        results = run_bulk_requests(
+            lambda guid: categorize_item(guid, category_name),
+            lambda guid: categorize_operation(guid, category_name),
+            guids,
+        )
+        report_bulk(
+            results,
+            lambda result: f'Set item {term.blue}{result.value["name"]}{term.normal} to category {term.blue}{category_name.title()}{term.normal}',
         )
     except VittlifyError as e:
         print(term.red(f"{e}"))
 
 
+def batch(args):
+    options = parse_options(args)
+    positional = positional_args(args)
+
+    jobs = parse_count(options.get('jobs', 1), '--jobs')
+
+    if positional:
+        try:
+            with open(positional[0]) as f:
+                failures = run_batch(run, f, jobs=jobs)
+        except OSError as e:
+            raise VittlifyError(f'Unable to read {positional[0]}: {e.strerror}')
+    else:
+        failures = run_batch(run, sys.stdin, jobs=jobs)
+
+    if failures:
+        raise VittlifyError(f'{failures} batch commands failed')
+
+
+def shell(args):
+    run_shell(run)
+
+
 def help(args):
     help_str = ''
 
@@ -284,6 +492,12 @@ def help(args):
         help_str = CATEGORIES_HELP
     elif args[0].lower() in ('categorize', 'label'):
         help_str = CATEGORIZE_HELP
+    elif args[0].lower() in ('batch',):
+        help_str = BATCH_HELP
+    elif args[0].lower() in ('shell',):
+        help_str = SHELL_HELP
+    elif args[0].lower() in ('settings',):
+        help_str = SETTINGS_HELP
     else:
         help_str = GENERAL_HELP
 
@@ -291,27 +505,46 @@ def help(args):
 
 
 def run(args):
+    if '--plain' in args:
+        args = [arg for arg in args if arg != '--plain']
+        term.set_plain(True)
+
+    if '--timings' in args:
+        args = [arg for arg in args if arg != '--timings']
+        timings.enable(show_timings=True)
+
     try:
-        if args[0].lower() in ('list', 'lists', 'item', 'show'):
-            show(args)
-        elif args[0].lower() in ('done', 'complete'):
-            complete(args[1:])
-        elif args[0].lower() in ('undone', 'uncomplete'):
-            complete(args[1:], uncomplete=True)
-        elif args[0].lower() in ('modify', 'edit', 'comment', 'comments'):
-            modify(args[1:])
-        elif args[0].lower() in ('add',):
-            add(args[1:])
-        elif args[0].lower() in ('move', 'mv'):
-            move(args[1:])
-        elif args[0].lower() in ('categories',):
-            categories(args[1:])
-        elif args[0].lower() in ('categorize', 'label'):
-            categorize(args[1:])
-        elif args[0].lower() in ('help',):
-            print(help(args[1:]))
-        else:
-            print(GENERAL_HELP)
+        # batch and shell give each command they run its own deadline
+        deadline = (
+            nullcontext()
+            if args[0].lower() in ('batch', 'shell')
+            else command_deadline()
+        )
+        with deadline, timings.command(args[0].lower()):
+            if args[0].lower() in ('list', 'lists', 'item', 'show'):
+                show(args)
+            elif args[0].lower() in ('done', 'complete'):
+                complete(args[1:])
+            elif args[0].lower() in ('undone', 'uncomplete'):
+                complete(args[1:], uncomplete=True)
+            elif args[0].lower() in ('modify', 'edit', 'comment', 'comments'):
+                modify(args[1:])
+            elif args[0].lower() in ('add',):
+                add(args[1:])
+            elif args[0].lower() in ('move', 'mv'):
+                move(args[1:])
+            elif args[0].lower() in ('categories',):
+                categories(args[1:])
+            elif args[0].lower() in ('categorize', 'label'):
+                categorize(args[1:])
+            elif args[0].lower() in ('batch',):
+                batch(args[1:])
+            elif args[0].lower() in ('shell',):
+                shell(args[1:])
+            elif args[0].lower() in ('help',):
+                print(help(args[1:]))
+            else:
+                print(GENERAL_HELP)
     except IndexError:
         print(term.red('Incorrect number of arguments provided'))
         if SHOW_TRACEBACK:
@@ -319,25 +552,39 @@ def run(args):
         else:
             print(GENERAL_HELP)
         sys.exit(1)
-    except requests.exceptions.ConnectionError:
+    except VittlifyError as e:
+        print(term.red(f"{e}"))
+        sys.exit(1)
+    except _request_exceptions().ConnectionError:
         print(term.red(f'Unable to connect to Vittlify instance at {VITTLIFY_URL}'))
         if PROXY:
             print(term.red(f'Attempted to use proxy at {PROXY}'))
         if SHOW_TRACEBACK:
             raise
         sys.exit(1)
-    except requests.exceptions.HTTPError as e:
+    except _request_exceptions().Timeout:
+        print(term.red(f'Timed out waiting for Vittlify instance at {VITTLIFY_URL}'))
+        if SHOW_TRACEBACK:
+            raise
+        sys.exit(1)
+    except _request_exceptions().HTTPError as e:
         print(term.red(f'Server responded with {e}'))
         if SHOW_TRACEBACK:
             raise
         sys.exit(1)
+
+
+def main():
+    try:
+        mode, args = profile_args(sys.argv[1:])
     except VittlifyError as e:
         print(term.red(f"{e}"))
         sys.exit(1)
 
-
-def main():
-    run(sys.argv[1:])
+    if mode:
+        run_profiled(run, args, mode)
+    else:
+        run(args)
 
 
 if __name__ == '__main__':